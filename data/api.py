@@ -3,43 +3,34 @@ api.py
 
 Provides a accessible protected backend API. JSON I/O only, CSRF protected.
 """
-import copy
 import json
 import os
-from copy import deepcopy
+import random
+import time
 
 # from flask_caching import cache
 import flask_wtf
-from flask import current_app, jsonify, request, send_from_directory
+from flask import abort, current_app, jsonify, request
 
-from server.helpers import default, get_neighbors
+from server.assets import AssetDirectory
+from server.helpers import get_neighbors
+from server.responses import EncodedJSON, encoded, respond
+from server.search import Query, SearchIndex
+from server.store import EpisodeStore
 
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-with open(os.path.join(BASE_DIR, 'data', 'data.json'), 'r', encoding='utf-8') as file:
-    data = json.load(file)
 
-with open(os.path.join(BASE_DIR, 'data', 'characters.json'), 'r', encoding='utf-8') as file:
-    character_data = json.load(file)
+# Every response is pre-encoded in the store (written by `build app --store`) and only read when it is served.
+store = EpisodeStore(os.getenv('EPISODE_STORE') or os.path.join(BASE_DIR, 'data', 'episodes.store'))
+search_index = SearchIndex(store) if 'search/meta' in store else None
+images = AssetDirectory(os.path.join(BASE_DIR, 'data', 'img'))
 
-# Cached preload character data
-character_list = dict()
 
-stats = {
-    'totals': {
-        'quote': 0,
-        'scene': 0,
-        'episode': 0,
-        'season': 0
-    }
-}
-
-stats['totals']['season'] += len(default(data, []))
-for season in data:
-    stats['totals']['episode'] += len(default(season.get('episodes'), []))
-    for episode in season['episodes']:
-        stats['totals']['scene'] += len(default(episode.get('scenes'), []))
-        for scene in default(episode.get('scenes'), []):
-            stats['totals']['quote'] += len(default(scene.get('quotes'), []))
+def respond_blob(name: str):
+    encoded: EncodedJSON = store.get(name)
+    if encoded is None:
+        abort(404)
+    return respond(encoded)
 
 
 @current_app.route('/api/csrf/')
@@ -54,12 +45,18 @@ def api_csrf():
 
 @current_app.route('/api/episode/<int:season>/<int:episode>/')
 def api_episode(season: int, episode: int):
-    return jsonify(data[season - 1]['episodes'][episode - 1])
+    """An episode's data, as JSON or with `format=columnar`, in the format decoded by src/columnar.js."""
+    if request.args.get('format') == 'columnar':
+        encoded = store.get(f'episode/{season}/{episode}/columnar')
+        if encoded is None:
+            abort(404)
+        return respond(encoded, 'application/octet-stream')
+    return respond_blob(f'episode/{season}/{episode}')
 
 
 @current_app.route('/api/stats/')
 def api_stats():
-    return jsonify(stats)
+    return respond_blob('stats')
 
 
 @current_app.route('/api/episodes/')
@@ -68,14 +65,7 @@ def api_episodes():
     Returns a list of episodes with basic information (no quotes).
     Used for the left side season bar.
     """
-    seasons = []
-    copy = deepcopy(data)
-    for season in copy:
-        for episode in season.get('episodes'):
-            if 'scenes' in episode.keys():
-                del episode['scenes']
-        seasons.append(season)
-    return jsonify(seasons)
+    return respond_blob('episodes')
 
 
 @current_app.route('/api/all/')
@@ -83,7 +73,7 @@ def api_data():
     """
     Season data route
     """
-    return jsonify(data)
+    return respond_blob('all')
 
 
 @current_app.route('/api/quote_surround')
@@ -91,38 +81,125 @@ def api_quote_neighbors():
     season, episode = int(request.args.get('season')), int(request.args.get('episode'))
     scene, quote = int(request.args.get('scene')), int(request.args.get('quote'))
 
-    quotes = data[season - 1]['episodes'][episode - 1]['scenes'][scene - 1]['quotes']
+    quotes = store.scene_quotes(season, episode, scene)
+    if quotes is None:
+        abort(404)
     top, below = get_neighbors(quotes, quote - 1, int(request.args.get('distance', 2)))
     return jsonify({'above': top, 'below': below})
 
 
+def respond_quote(quote_id: int):
+    if not 0 <= quote_id < store.quote_count:
+        abort(404)
+    return respond(encoded(store.quote(quote_id)))
+
+
+@current_app.route('/api/quote/<int:quote_id>/')
+def api_quote(quote_id: int):
+    """A single quote by its global ID, with its location."""
+    return respond_quote(quote_id)
+
+
+@current_app.route('/api/quote/<int:season>/<int:episode>/<int:scene>/<int:quote>/')
+def api_quote_permalink(season: int, episode: int, scene: int, quote: int):
+    """A single quote by its location (all one-indexed), with its global ID."""
+    quote_id = store.quote_id(season, episode, scene, quote)
+    if quote_id is None:
+        abort(404)
+    return respond_quote(quote_id)
+
+
+@current_app.route('/api/quote/<int:quote_id>/surround/')
+def api_quote_surround(quote_id: int):
+    """
+    The quotes either side of a quote by its global ID. Unlike /api/quote_surround, this runs on into the neighbouring
+    scenes & episodes; each quote carries its own location.
+    """
+    if not 0 <= quote_id < store.quote_count:
+        abort(404)
+    distance = min(max(request.args.get('distance', 2, type=int), 0), 50)
+    return respond(store.neighbors(quote_id, distance))
+
+
+@current_app.route('/api/quote/random/')
+def api_quote_random():
+    return current_app.response_class(store.quote(random.randrange(store.quote_count)), mimetype='application/json')
+
+
 @current_app.route('/api/characters/')
 def api_character_list():
-    _data = copy.deepcopy(character_data)
-    for key in _data.keys():
-        del _data[key]['quotes']
-    return jsonify(_data)
+    return respond_blob('characters')
 
 
 @current_app.route('/api/character/<character>/')
 def api_character_all(character: str):
-    _data = copy.deepcopy(character_data[character])
-    _data['quotes'] = _data['quotes'][:10]
-    return jsonify(_data)
+    return respond_blob(f'character/{character}')
 
 
 @current_app.route('/api/character/<character>/quotes/')
 def api_character_quotes(character: str):
-    quotes = character_data[character]['quotes']
+    """
+    A character's quotes, optionally only those from a `season` or from scenes shared `with` another character.
+
+    Given a `cursor` (a quote ID, zero to start) and/or `limit` (at most 100), returns that page of quotes and the cursor
+    of the next (null once there are no more). Otherwise returns a one-indexed `page` of 10 quotes, or every quote.
+    """
+    season = request.args.get('season', type=int)
+    co_speaker = request.args.get('with')
+
+    if 'cursor' in request.args or 'limit' in request.args:
+        cursor = max(request.args.get('cursor', 0, type=int), 0)
+        limit = min(max(request.args.get('limit', 10, type=int), 1), 100)
+        page = store.character_quotes(character, cursor, limit, season=season, co_speaker=co_speaker)
+        if page is None:
+            abort(404)
+        quote_ids, next_cursor = page
+        return respond(encoded(b'{"next":' + json.dumps(next_cursor).encode('utf-8') + b',"quotes":' +
+                               store.quote_list(quote_ids) + b'}'))
 
     # Compute pagination if argument is available. Static 10 results per page, one-indexed.
     if 'page' in request.args.keys():
-        index: int = (int(request.args['page']) - 1) * 10
-        return jsonify(quotes[index: index + 10])
+        skip = (int(request.args['page']) - 1) * 10
+        page = store.character_quotes(character, 0, 10 if skip >= 0 else 0, skip=max(skip, 0), season=season,
+                                      co_speaker=co_speaker)
     else:
-        return jsonify(quotes)
+        page = store.character_quotes(character, 0, store.quote_count, season=season, co_speaker=co_speaker)
+    if page is None:
+        abort(404)
+    return respond(encoded(store.quote_list(page[0])))
+
+
+@current_app.route('/api/search/')
+def api_search():
+    """
+    Full-text quote search, ranked and paginated.
+
+    Takes the query as `q` ("quoted" words must appear together), with optional `speaker`, `season` and `episode`
+    filters, a one-indexed `page` and `per_page` (at most 50) results per page.
+    """
+    if search_index is None:
+        abort(404)
+
+    text = request.args.get('q', '')
+    page = max(request.args.get('page', 1, type=int), 1)
+    per_page = min(max(request.args.get('per_page', 10, type=int), 1), 50)
+    query = Query.parse(text, speaker=request.args.get('speaker'),
+                        season=request.args.get('season', type=int), episode=request.args.get('episode', type=int))
+
+    start = time.perf_counter()
+    results = search_index.search(query, (page - 1) * per_page, per_page)
+    return jsonify({
+        'query': text,
+        'total': results.total,
+        'page': page,
+        'perPage': per_page,
+        'took': round((time.perf_counter() - start) * 1000, 2),
+        'facets': results.facets,
+        'results': [{**json.loads(store.quote(doc)), 'score': round(score, 4)} for doc, score in results.hits]
+    })
 
 
 @current_app.route('/static/img/<path:filename>')
 def custom_static(filename):
-    return send_from_directory('./data/img/', filename)
+    """Images, also served under their content-hashed names (listed in assets.json) with long-lived caching."""
+    return images.serve(filename)
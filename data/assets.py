@@ -0,0 +1,63 @@
+"""
+assets.py
+
+Serves a directory of static files published with `--assets` (see normalization/assets.py).
+
+Every file is also available under a content-hashed name, which never changes content and so is cached for good.
+Files with precompressed siblings are served in the best encoding the client accepts.
+"""
+import json
+import mimetypes
+import os
+from typing import Dict, Optional
+
+from flask import Response, request, send_from_directory
+
+ASSET_MANIFEST_JSON = 'assets.json'
+ENCODING_SUFFIXES = {'gzip': '.gz', 'br': '.br'}
+IMMUTABLE = 'public, max-age=31536000, immutable'
+
+
+class AssetDirectory:
+    def __init__(self, root: str) -> None:
+        self.root = root
+        self.manifest_path = os.path.join(root, ASSET_MANIFEST_JSON)
+        self.manifest_mtime: Optional[int] = None
+        self.files: Dict[str, dict] = {}
+        self.hashed: Dict[str, str] = {}  # hashed name -> name
+
+    def refresh(self) -> None:
+        """Reloads the manifest whenever it has been rewritten, so a rebuild is picked up without a restart."""
+        try:
+            mtime = os.stat(self.manifest_path).st_mtime_ns
+        except FileNotFoundError:
+            mtime = None
+        if mtime == self.manifest_mtime:
+            return
+
+        files: Dict[str, dict] = {}
+        if mtime is not None:
+            with open(self.manifest_path, 'r', encoding='utf-8') as manifest_file:
+                files = json.load(manifest_file)['files']
+        self.files = files
+        self.hashed = {entry['url']: name for name, entry in files.items()}
+        self.manifest_mtime = mtime
+
+    def serve(self, filename: str) -> Response:
+        self.refresh()
+        entry = self.files.get(self.hashed.get(filename, filename))
+        encodings = entry['encodings'] if entry is not None else []
+
+        # Encodings are listed alphabetically, so brotli is preferred over gzip when both are accepted equally.
+        encoding = request.accept_encodings.best_match(encodings)
+        if encoding is None:
+            response = send_from_directory(self.root, filename)
+        else:
+            response = send_from_directory(self.root, filename + ENCODING_SUFFIXES[encoding],
+                                           mimetype=mimetypes.guess_type(filename)[0])
+            response.headers['Content-Encoding'] = encoding
+        if len(encodings) > 0:
+            response.vary.add('Accept-Encoding')
+        if filename in self.hashed:
+            response.headers['Cache-Control'] = IMMUTABLE
+        return response
@@ -0,0 +1,203 @@
+import json
+import os
+import random
+import threading
+import time
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from manifest import hash_bytes
+
+# Batch requests are retried on these, as well as on connection errors.
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+def quote_records(season_episode_data: Iterable[Tuple[int, int, dict]]) -> Iterator[dict]:
+    """
+    Flattens episodes into one search record per quote.
+
+    The objectID is made from the quote's position alone, so a quote keeps its ID between builds and only records
+    whose content actually changed need pushing.
+    """
+    for season, episode, episode_data in season_episode_data:
+        for scene_num, scene in enumerate(episode_data['scenes'], start=1):
+            for quote_num, quote in enumerate(scene['quotes'], start=1):
+                characters = list(quote['characters'].keys()) if quote['isAnnotated'] else [quote['character']]
+                yield {
+                    'objectID': f'{season}-{episode}-{scene_num}-{quote_num}',
+                    'season': season,
+                    'episode_rel': episode,
+                    'section_rel': scene_num,
+                    'quote_rel': quote_num,
+                    'speaker': quote['speaker'],
+                    'text': quote['text'],
+                    'isAnnotated': quote['isAnnotated'],
+                    'characters': characters
+                }
+
+
+def encode_record(record: dict) -> bytes:
+    return json.dumps(record, separators=(',', ':'), sort_keys=True, ensure_ascii=False).encode('utf-8')
+
+
+class ExportState:
+    """
+    The digest of every record as of an export (or as acknowledged by the index), which the next export is diffed
+    against. Stored as JSON beside the exported chunks.
+    """
+    VERSION = 1
+
+    def __init__(self, path: str, digests: Optional[Dict[str, str]] = None) -> None:
+        self.path = path
+        self.digests: Dict[str, str] = digests if digests is not None else {}
+        self.lock = threading.Lock()
+
+    @classmethod
+    def load(cls, path: str) -> 'ExportState':
+        """Loads the state from disk, starting empty (so every record is new) if it is missing or outdated."""
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as state_file:
+                try:
+                    data = json.load(state_file)
+                except ValueError:
+                    data = {}
+            if data.get('version') == cls.VERSION:
+                return cls(path, data['records'])
+        return cls(path)
+
+    def save(self) -> None:
+        with self.lock:
+            with open(self.path + '.part', 'w', encoding='utf-8') as state_file:
+                json.dump({'version': self.VERSION, 'records': self.digests}, state_file, separators=(',', ':'),
+                          sort_keys=True)
+            os.replace(self.path + '.part', self.path)
+
+    def apply(self, operations: List[dict], digests: Dict[str, str]) -> None:
+        """Marks a set of batch operations as delivered."""
+        with self.lock:
+            for operation in operations:
+                object_id = operation['body']['objectID']
+                if operation['action'] == 'deleteObject':
+                    self.digests.pop(object_id, None)
+                else:
+                    self.digests[object_id] = digests[object_id]
+
+
+class RecordDiff(NamedTuple):
+    """Batch operations (in Algolia's batch format) bringing an index from one export to the next."""
+    operations: List[dict]
+    added: int
+    updated: int
+    deleted: int
+    unchanged: int
+
+
+def diff_records(records: List[Tuple[dict, bytes]], previous: Dict[str, str]) -> Tuple[RecordDiff, Dict[str, str]]:
+    """
+    Compares encoded records against the digests of a previous export.
+
+    Returns the operations needed to update the index, along with the digest of every current record.
+    """
+    digests: Dict[str, str] = {}
+    operations: List[dict] = []
+    added, updated = 0, 0
+    for record, encoded in records:
+        object_id = record['objectID']
+        digest = hash_bytes(encoded)
+        digests[object_id] = digest
+
+        previous_digest = previous.get(object_id)
+        if previous_digest != digest:
+            operations.append({'action': 'updateObject', 'body': record})
+            if previous_digest is None:
+                added += 1
+            else:
+                updated += 1
+
+    deleted = [object_id for object_id in previous.keys() if object_id not in digests]
+    operations.extend({'action': 'deleteObject', 'body': {'objectID': object_id}} for object_id in deleted)
+
+    unchanged = len(digests) - added - updated
+    return RecordDiff(operations, added, updated, len(deleted), unchanged), digests
+
+
+def write_chunks(lines: Iterable[bytes], directory: str, prefix: str, chunk_size: int) -> List[str]:
+    """
+    Writes lines as NDJSON files of at most `chunk_size` lines each, named `<prefix>-0000.ndjson` onwards.
+
+    Chunks left over from a previous, larger export are removed. Returns the filenames written.
+    """
+    filenames: List[str] = []
+    chunk_file = None
+    count = 0
+    try:
+        for line in lines:
+            if chunk_file is None or count == chunk_size:
+                if chunk_file is not None:
+                    chunk_file.close()
+                    os.replace(chunk_file.name, chunk_file.name[:-len('.part')])
+                filenames.append(f'{prefix}-{len(filenames):04}.ndjson')
+                chunk_file = open(os.path.join(directory, filenames[-1] + '.part'), 'wb')
+                count = 0
+            chunk_file.write(line)
+            chunk_file.write(b'\n')
+            count += 1
+    finally:
+        if chunk_file is not None:
+            chunk_file.close()
+            os.replace(chunk_file.name, chunk_file.name[:-len('.part')])
+
+    for filename in os.listdir(directory):
+        if filename.startswith(prefix + '-') and filename.endswith('.ndjson') and filename not in filenames:
+            os.remove(os.path.join(directory, filename))
+    return filenames
+
+
+class AlgoliaClient:
+    """
+    Sends batch operations to an Algolia index, sharing one pooled session between threads.
+
+    `api_url` may point at any server implementing the batch route, which is how uploads are exercised without
+    touching a real index. Throttled or failed batches are retried with exponential backoff.
+    """
+
+    def __init__(self, app_id: Optional[str], api_key: Optional[str], api_url: str, concurrency: int = 4,
+                 retries: int = 3, backoff: float = 0.5, timeout: float = 30) -> None:
+        self.api_url = api_url.rstrip('/')
+        self.retries = retries
+        self.backoff = backoff
+        self.timeout = timeout
+
+        adapter = HTTPAdapter(pool_connections=concurrency, pool_maxsize=concurrency)
+        self.session = requests.Session()
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.session.headers.update({
+            'X-Algolia-Application-Id': app_id or '',
+            'X-Algolia-API-Key': api_key or ''
+        })
+
+    def close(self) -> None:
+        self.session.close()
+
+    def batch(self, index: str, operations: List[dict]) -> dict:
+        """Sends one batch of operations, returning the response (holding the taskID)."""
+        url = f'{self.api_url}/1/indexes/{requests.utils.quote(index, safe="")}/batch'
+        body = json.dumps({'requests': operations}, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+
+        attempt = 0
+        while True:
+            try:
+                response = self.session.post(url, data=body, timeout=self.timeout,
+                                             headers={'Content-Type': 'application/json'})
+                if response.status_code not in RETRY_STATUSES or attempt >= self.retries:
+                    response.raise_for_status()
+                    return response.json()
+            except (requests.ConnectionError, requests.Timeout):
+                if attempt >= self.retries:
+                    raise
+
+            time.sleep(self.backoff * (2 ** attempt) * (1 + random.random()))
+            attempt += 1
@@ -0,0 +1,128 @@
+import gzip
+import json
+import os
+from typing import Callable, Dict, Iterable, NamedTuple
+
+from manifest import hash_bytes
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Only formats that compress well get precompressed siblings; images already are compressed.
+COMPRESSIBLE = ['.json', '.bin']
+ASSET_MANIFEST_JSON = 'assets.json'
+ENCODING_SUFFIXES = {'gzip': '.gz', 'br': '.br'}
+
+
+def compressors() -> Dict[str, Callable[[bytes], bytes]]:
+    """Every available compressor, by the HTTP Content-Encoding it produces. Brotli is only used if installed."""
+    available = {'gzip': lambda data: gzip.compress(data, compresslevel=9, mtime=0)}
+    if brotli is not None:
+        available['br'] = lambda data: brotli.compress(data, quality=11)
+    return available
+
+
+class PublishResult(NamedTuple):
+    published: int
+    unchanged: int
+    removed: int
+
+
+class AssetManifest:
+    """
+    The content hash of every published file in a directory, and the immutable, hashed URL each is also available at.
+
+    Stored as `assets.json` at the root of the directory, mapping each file's path (relative to it) to its hash, size,
+    modification time, hashed path & the precompressed encodings written beside both. A file whose size and
+    modification time are unchanged is not re-read, and one whose content hash is unchanged is not recompressed.
+    """
+    VERSION = 1
+
+    def __init__(self, root: str) -> None:
+        self.root = root
+        self.path = os.path.join(root, ASSET_MANIFEST_JSON)
+        self.files: Dict[str, dict] = {}
+
+        if os.path.exists(self.path):
+            with open(self.path, 'r', encoding='utf-8') as manifest_file:
+                try:
+                    data = json.load(manifest_file)
+                except ValueError:
+                    data = {}
+            if data.get('version') == self.VERSION:
+                self.files = data['files']
+
+    def save(self) -> None:
+        with open(self.path + '.part', 'w', encoding='utf-8') as manifest_file:
+            json.dump({'version': self.VERSION, 'files': self.files}, manifest_file, indent=1, sort_keys=True)
+        os.replace(self.path + '.part', self.path)
+
+    def _remove(self, name: str, entry: dict) -> None:
+        """Removes the hashed copy of a file and every precompressed sibling, leaving the file itself."""
+        paths = [entry['url']]
+        for encoding in entry['encodings']:
+            suffix = ENCODING_SUFFIXES[encoding]
+            paths += [name + suffix, entry['url'] + suffix]
+        for path in paths:
+            if os.path.exists(os.path.join(self.root, path)):
+                os.remove(os.path.join(self.root, path))
+
+    def publish(self, files: Iterable[str], precompress: bool = True) -> PublishResult:
+        """
+        Brings the hashed copies & precompressed siblings of the given files (absolute paths under the root) up to date.
+
+        Files published before but not given now have their hashed copies & siblings removed.
+        """
+        encodings = compressors() if precompress else {}
+        published, unchanged = 0, 0
+        seen: Dict[str, dict] = {}
+        for path in files:
+            name = os.path.relpath(path, self.root).replace(os.sep, '/')
+            stat = os.stat(path)
+            entry = self.files.get(name)
+            wanted = sorted(encodings.keys()) if os.path.splitext(name)[1] in COMPRESSIBLE else []
+            current = entry is not None and entry['encodings'] == wanted \
+                and os.path.exists(os.path.join(self.root, entry['url']))
+
+            if current and entry['size'] == stat.st_size and entry['mtime'] == stat.st_mtime_ns:
+                seen[name] = entry
+                unchanged += 1
+                continue
+
+            with open(path, 'rb') as file:
+                data = file.read()
+            digest = hash_bytes(data)
+            # Rewritten, but with the same content, so only the modification time needs updating.
+            if current and entry['hash'] == digest:
+                seen[name] = {**entry, 'mtime': stat.st_mtime_ns}
+                unchanged += 1
+                continue
+
+            if entry is not None:
+                self._remove(name, entry)
+            stem, extension = os.path.splitext(name)
+            url = f'{stem}.{digest[:12]}{extension}'
+
+            write_file(os.path.join(self.root, url), data)
+            for encoding in wanted:
+                compressed = encodings[encoding](data)
+                write_file(path + ENCODING_SUFFIXES[encoding], compressed)
+                write_file(os.path.join(self.root, url + ENCODING_SUFFIXES[encoding]), compressed)
+
+            seen[name] = {'hash': digest, 'size': stat.st_size, 'mtime': stat.st_mtime_ns, 'url': url,
+                          'encodings': wanted}
+            published += 1
+
+        removed = [name for name in self.files.keys() if name not in seen]
+        for name in removed:
+            self._remove(name, self.files[name])
+        self.files = seen
+        return PublishResult(published, unchanged, len(removed))
+
+
+def write_file(path: str, data: bytes) -> None:
+    with open(path + '.part', 'wb') as file:
+        file.write(data)
+    os.replace(path + '.part', path)
@@ -0,0 +1,266 @@
+"""
+benchmarks.py
+
+The benchmark suite behind `bench`, timing the pipeline at three levels:
+
+    micro   the hot helpers (clean_string, valuify, fuzzy matching & merging) over the real corpus' strings
+    stages  each CLI stage, run as its own process against a copy of the corpus, scaled up by repeating transcripts
+    api     the routes of data/api.py through the Flask test client, served from the store the stages built
+
+Results are the best of several timed runs, in seconds, and are compared against a stored baseline of the same names;
+a baseline result that a run of its suite & scale no longer produces fails like a regression.
+"""
+import importlib
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import time
+import timeit
+from typing import Callable, Dict, List, NamedTuple, Optional, Set, Tuple
+
+from rich.table import Table
+
+BASELINE_VERSION = 1
+SUITES = ['micro', 'stages', 'api']
+
+# Every input of the pipeline a corpus needs, relative to its data directory; everything else is built by the stages.
+CORPUS_FILES = ['truth/speaker_mapping.xml', 'truth/characters.xml', 'truth/meta.json', 'characters/identifiers.xml',
+                'episode_descriptions.json', 'character_descriptions.json']
+
+# Each stage, by its name in profile reports, and the arguments that run it from scratch.
+STAGES: List[Tuple[str, List[str]]] = [
+    ('truth', ['truth', '--force']),
+    ('merge', ['merge']),
+    ('ids', ['ids']),
+    ('compile', ['compile', '--force']),
+    ('build app', ['build', 'app', '--path', '{build}', '--make-dir', '--store', '{store}', '--force'])
+]
+
+API_ROUTES: List[Tuple[str, str]] = [
+    ('episode', '/api/episode/3/7/'),
+    ('episodes', '/api/episodes/'),
+    ('characters', '/api/characters/'),
+    ('character', '/api/character/michael/'),
+    ('character quotes', '/api/character/michael/quotes/?page=2'),
+    ('character cursor', '/api/character/dwight/quotes/?cursor=0&limit=100&with=jim'),
+    ('quote surround', '/api/quote/1000/surround/?distance=10'),
+    ('scene surround', '/api/quote_surround?season=2&episode=1&scene=3&quote=2'),
+    ('search', '/api/search/?q=%22that%27s+what+she+said%22'),
+]
+
+
+class Result(NamedTuple):
+    name: str
+    seconds: float
+
+
+def result_group(name: str) -> str:
+    """The suite & scale a result was measured in, like `api@10x` (or only `micro`, which has no scale)."""
+    suite, _, benchmark = name.partition('/')
+    return suite + ('@' + benchmark.rpartition('@')[2] if '@' in benchmark else '')
+
+
+def best_of(function: Callable[[], object], repeat: int) -> float:
+    """The best time of a single call, calling it as many times per run as takes at least 0.2 seconds."""
+    timer = timeit.Timer(function)
+    number, _ = timer.autorange()
+    return min(timer.repeat(repeat=repeat, number=number)) / number
+
+
+def micro_benchmarks(strings: List[str], speakers: List[str], repeat: int) -> List[Result]:
+    """
+    Times the helpers every stage leans on: clean_string over every raw string, valuify over every distinct speaker,
+    a `similar` lookup for a spread of speakers & merging the valuified speakers as `similar` does.
+    """
+    from helpers import get_close_matches_indexes, marked_item_merge, valuify
+    from normalize import clean_string
+
+    queries = speakers[::max(len(speakers) // 20, 1)]
+    identifiers = [valuify(speaker) for speaker in speakers]
+    counts = list(range(1, len(identifiers) + 1))
+
+    def clean() -> None:
+        for s in strings:
+            clean_string(s)
+
+    def identify() -> None:
+        for speaker in speakers:
+            valuify(speaker)
+
+    def match() -> None:
+        for query in queries:
+            get_close_matches_indexes(query, speakers, n=5, cutoff=0.6)
+
+    return [
+        Result('micro/clean_string', best_of(clean, repeat)),
+        Result('micro/valuify', best_of(identify, repeat)),
+        Result('micro/get_close_matches_indexes', best_of(match, repeat)),
+        Result('micro/marked_item_merge', best_of(lambda: marked_item_merge(identifiers, counts), repeat)),
+    ]
+
+
+def build_corpus(source: str, target: str, scale: int) -> None:
+    """
+    Copies the pipeline's inputs from one data directory to another, with every raw transcript repeated `scale` times
+    over, as extra scenes of the same episode. Inputs not yet built (as in a synthetic corpus) are left to the stages.
+    """
+    for name in CORPUS_FILES:
+        if not os.path.exists(os.path.join(source, name)):
+            continue
+        os.makedirs(os.path.dirname(os.path.join(target, name)), exist_ok=True)
+        shutil.copyfile(os.path.join(source, name), os.path.join(target, name))
+
+    raw_dir, target_raw_dir = os.path.join(source, 'raw'), os.path.join(target, 'raw')
+    os.makedirs(target_raw_dir, exist_ok=True)
+    for raw_file in os.listdir(raw_dir):
+        with open(os.path.join(raw_dir, raw_file), 'r', encoding='utf-8') as file:
+            transcript = file.read().strip()
+        with open(os.path.join(target_raw_dir, raw_file), 'w', encoding='utf-8') as file:
+            file.write('\n-\n'.join([transcript] * scale) + '\n')
+
+
+def run_stage(script: str, data_dir: str, name: str, args: List[str], jobs: int) -> float:
+    """Runs a stage against a data directory in a fresh process, returning its wall time from the profile report."""
+    profile_path = os.path.join(data_dir, 'bench_profile.json')
+    if os.path.exists(profile_path):
+        os.remove(profile_path)
+    command = [sys.executable, script, '-j', str(jobs), '--profile', '--profile-output', profile_path, *args]
+    process = subprocess.run(command, cwd=os.path.dirname(script), stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+                             env={**os.environ, 'NORMALIZATION_DATA_DIR': data_dir}, encoding='utf-8',
+                             errors='replace')
+    if process.returncode != 0:
+        raise RuntimeError(f'`{" ".join(args)}` exited with {process.returncode}:\n{process.stderr[-2000:]}')
+
+    with open(profile_path, 'r', encoding='utf-8') as profile_file:
+        report = json.load(profile_file)
+    os.remove(profile_path)
+    return report['stages'][name]['wall']
+
+
+def stage_benchmarks(script: str, data_dir: str, scale: int, jobs: int, repeat: int) -> List[Result]:
+    """
+    Times every stage in order, each run `repeat` times (later stages build on the output of the last run), leaving
+    the episode store built at `store/` within the data directory.
+    """
+    paths = {'build': os.path.join(data_dir, 'build'), 'store': os.path.join(data_dir, 'store')}
+    os.makedirs(paths['store'], exist_ok=True)
+
+    results = []
+    for name, args in STAGES:
+        args = [arg.format(**paths) for arg in args]
+        results.append(Result(f'stages/{name}@{scale}x', min(run_stage(script, data_dir, name, args, jobs)
+                                                              for _ in range(repeat))))
+    return results
+
+
+def load_api(store_path: str):
+    """
+    Imports data/api.py as the server would, serving the given store, and returns a test client for it.
+
+    Returns None if the `server` package (data/ as deployed, found through PYTHONPATH) or its dependencies can't be
+    imported here.
+    """
+    try:
+        from flask import Flask
+    except ImportError:
+        return None
+
+    os.environ['EPISODE_STORE'] = store_path
+    app = Flask(__name__)
+    app.config['WTF_CSRF_ENABLED'] = False
+    # Routes are registered on import, so a fresh import is needed for every app (& store).
+    sys.modules.pop('server.api', None)
+    with app.app_context():
+        try:
+            importlib.import_module('server.api')
+        except ImportError:
+            return None
+    return app.test_client()
+
+
+def api_benchmarks(client, scale: int, repeat: int) -> Tuple[List[Result], List[Tuple[str, str, int]]]:
+    """
+    Times every route, along with the name, URL & status of each that didn't answer 200: broken on the real corpus,
+    though on a synthetic one they're only routes to episodes & characters it doesn't have.
+    """
+    results, failed = [], []
+    for name, url in API_ROUTES:
+        status = client.get(url).status_code
+        if status != 200:
+            failed.append((f'api/{name}@{scale}x', url, status))
+            continue
+        results.append(Result(f'api/{name}@{scale}x', best_of(lambda: client.get(url), repeat)))
+    return results, failed
+
+
+def environment(jobs: int) -> dict:
+    return {'python': platform.python_version(), 'platform': platform.platform(), 'cpus': os.cpu_count(),
+            'jobs': jobs}
+
+
+def load_baseline(path: str) -> Optional[dict]:
+    """Reads a stored baseline, if there is one from this version."""
+    if not os.path.exists(path):
+        return None
+    with open(path, 'r', encoding='utf-8') as baseline_file:
+        try:
+            baseline = json.load(baseline_file)
+        except ValueError:
+            return None
+    return baseline if baseline.get('version') == BASELINE_VERSION else None
+
+
+def save_baseline(path: str, results: List[Result], jobs: int, previous: Optional[dict] = None) -> None:
+    """Stores results as the baseline, keeping any results of the previous baseline that weren't measured again."""
+    merged: Dict[str, float] = dict(previous['results']) if previous is not None else {}
+    merged.update((result.name, result.seconds) for result in results)
+    baseline = {'version': BASELINE_VERSION, 'saved': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                'environment': environment(jobs), 'results': dict(sorted(merged.items()))}
+    with open(path + '.part', 'w', encoding='utf-8') as baseline_file:
+        json.dump(baseline, baseline_file, indent=1)
+    os.replace(path + '.part', path)
+
+
+def format_seconds(seconds: float) -> str:
+    if seconds < 1e-3:
+        return f'{seconds * 1e6:.1f}us'
+    if seconds < 1:
+        return f'{seconds * 1e3:.1f}ms'
+    return f'{seconds:.2f}s'
+
+
+def compare(results: List[Result], baseline: Optional[dict], threshold: float, groups: Set[str],
+            skipped: Set[str]) -> Tuple[Table, List[str], List[str]]:
+    """
+    Tabulates results against the baseline, with the names of those slower than it by more than the threshold and of
+    the baseline's results missing from the measured groups (see result_group), other than those deliberately skipped.
+    """
+    table = Table('Benchmark', 'Time', 'Baseline', 'Change', 'Status', title='Benchmarks')
+    previous = baseline['results'] if baseline is not None else {}
+    if baseline is not None:
+        table.caption = f'Against the baseline saved {baseline["saved"]}, failing beyond {threshold:+.0%}'
+
+    regressions = []
+    for name, seconds in results:
+        if name not in previous:
+            table.add_row(name, format_seconds(seconds), '', '', '[dim]new[/dim]')
+            continue
+        change = seconds / previous[name] - 1
+        if change > threshold:
+            regressions.append(name)
+            status = '[red]regressed[/red]'
+        elif change < -threshold:
+            status = '[green]improved[/green]'
+        else:
+            status = 'ok'
+        table.add_row(name, format_seconds(seconds), format_seconds(previous[name]), f'{change:+.1%}', status)
+
+    measured = {result.name for result in results}
+    missing = [name for name in previous
+               if result_group(name) in groups and name not in measured and name not in skipped]
+    for name in missing:
+        table.add_row(name, '', format_seconds(previous[name]), '', '[red]missing[/red]')
+    return table, regressions, missing
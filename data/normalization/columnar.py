@@ -0,0 +1,139 @@
+"""
+columnar.py
+
+A compact, columnar encoding of an episode's data, decoded by src/columnar.js in the frontend.
+
+The file is a 4 byte magic, the length of the header as a little-endian uint32 and the header itself (UTF-8 JSON,
+space padded to a multiple of 4 bytes). The header holds the episode's small fields as-is, the counts of scenes, quotes
+& character references and a table of every distinct string (speakers, character identifiers & names). Quotes given
+global IDs (as in the episode store) are consecutive within an episode, so only the first is kept, as `firstQuote`.
+
+The columns follow, all little-endian and each naturally aligned:
+    uint16[scenes]          scene_lengths       number of quotes in each scene
+    uint16[quotes]          text_lengths        length of each quote's UTF-8 encoded text
+    uint16[quotes]          speakers            string code of each quote's speaker
+    uint16[references]      character_ids       string code of each character identifier
+    uint16[references]      character_names     string code of each annotated character's name, NO_STRING otherwise
+    uint8[quotes]           character_counts    number of character references of each quote
+    uint8[quotes]           flags               FLAG_ANNOTATED
+    uint8[...]              text                every quote's text, UTF-8 encoded back to back
+
+Lengths are stored rather than offsets as they are narrower and compress far better.
+"""
+import json
+import struct
+from array import array
+from itertools import accumulate
+from typing import Dict, List, Optional, Tuple
+
+MAGIC = b'OFC1'
+HEADER = struct.Struct('<4sI')
+NO_STRING = 0xFFFF
+FLAG_ANNOTATED = 1
+
+COLUMNS: List[Tuple[str, str]] = [
+    ('scene_lengths', 'H'), ('text_lengths', 'H'), ('speakers', 'H'), ('character_ids', 'H'),
+    ('character_names', 'H'), ('character_counts', 'B'), ('flags', 'B'), ('text', 'B')
+]
+
+
+def encode_episode(episode_data: dict) -> bytes:
+    """Encodes episode data (as written by `build app`) into the columnar format."""
+    strings: Dict[str, int] = {}
+    columns: Dict[str, array] = {name: array(format) for name, format in COLUMNS}
+
+    def intern(value: str) -> int:
+        return strings.setdefault(value, len(strings))
+
+    quote_count = 0
+    for scene in episode_data['scenes']:
+        columns['scene_lengths'].append(len(scene['quotes']))
+        for quote in scene['quotes']:
+            columns['speakers'].append(intern(quote['speaker']))
+            columns['flags'].append(FLAG_ANNOTATED if quote['isAnnotated'] else 0)
+            if 'characters' in quote:
+                for character_id, name in quote['characters'].items():
+                    columns['character_ids'].append(intern(character_id))
+                    columns['character_names'].append(intern(name))
+                columns['character_counts'].append(len(quote['characters']))
+            else:
+                columns['character_ids'].append(intern(quote['character']))
+                columns['character_names'].append(NO_STRING)
+                columns['character_counts'].append(1)
+
+            text = quote['text'].encode('utf-8')
+            if len(text) > 0xFFFF:
+                raise ValueError(f'Quote text is too long to encode ({len(text)} bytes).')
+            columns['text_lengths'].append(len(text))
+            columns['text'].frombytes(text)
+            quote_count += 1
+
+    if len(strings) >= NO_STRING:
+        raise ValueError(f'Too many distinct strings ({len(strings)}) for a single episode.')
+
+    header = {key: value for key, value in episode_data.items() if key != 'scenes'}
+    header['columnar'] = {
+        'scenes': len(episode_data['scenes']),
+        'quotes': quote_count,
+        'references': len(columns['character_ids']),
+        'strings': list(strings.keys())
+    }
+    if quote_count > 0 and 'id' in episode_data['scenes'][0]['quotes'][0]:
+        header['columnar']['firstQuote'] = next(scene['quotes'][0]['id'] for scene in episode_data['scenes']
+                                                if len(scene['quotes']) > 0)
+    encoded_header = json.dumps(header, separators=(',', ':')).encode('utf-8')
+    encoded_header += b' ' * (-len(encoded_header) % 4)
+
+    return HEADER.pack(MAGIC, len(encoded_header)) + encoded_header + b''.join(
+        columns[name].tobytes() for name, _ in COLUMNS)
+
+
+def decode_episode(data: bytes) -> dict:
+    """Decodes a columnar episode back into exactly the data it was encoded from."""
+    magic, header_length = HEADER.unpack_from(data)
+    if magic != MAGIC:
+        raise ValueError('Not a columnar episode file.')
+    episode_data = json.loads(data[HEADER.size:HEADER.size + header_length])
+    meta = episode_data.pop('columnar')
+    strings: List[str] = meta['strings']
+    first_quote: Optional[int] = meta.get('firstQuote')
+
+    lengths = {'scene_lengths': meta['scenes'], 'text_lengths': meta['quotes'], 'speakers': meta['quotes'],
+               'character_ids': meta['references'], 'character_names': meta['references'],
+               'character_counts': meta['quotes'], 'flags': meta['quotes']}
+    view = memoryview(data)
+    position = HEADER.size + header_length
+    columns: Dict[str, memoryview] = {}
+    for name, format in COLUMNS[:-1]:
+        size = lengths[name] * struct.calcsize(format)
+        columns[name] = view[position:position + size].cast(format)
+        position += size
+    text = view[position:]
+
+    speakers, flags = columns['speakers'].tolist(), columns['flags'].tolist()
+    character_ids, character_names = columns['character_ids'].tolist(), columns['character_names'].tolist()
+    text_offsets = [0, *accumulate(columns['text_lengths'])]
+    character_offsets = [0, *accumulate(columns['character_counts'])]
+
+    def decode_quote(index: int) -> dict:
+        quote = {'speaker': strings[speakers[index]],
+                 'text': str(text[text_offsets[index]:text_offsets[index + 1]], 'utf-8'),
+                 'isAnnotated': flags[index] & FLAG_ANNOTATED != 0}
+        start = character_offsets[index]
+        if character_names[start] == NO_STRING:
+            quote['character'] = strings[character_ids[start]]
+        else:
+            quote['characters'] = {strings[character_ids[reference]]: strings[character_names[reference]]
+                                   for reference in range(start, character_offsets[index + 1])}
+        if first_quote is not None:
+            quote['id'] = first_quote + index
+        return quote
+
+    scenes: List[dict] = []
+    start = 0
+    for scene_length in columns['scene_lengths']:
+        scenes.append({'quotes': [decode_quote(index) for index in range(start, start + scene_length)]})
+        start += scene_length
+
+    episode_data['scenes'] = scenes
+    return episode_data
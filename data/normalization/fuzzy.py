@@ -0,0 +1,219 @@
+import heapq
+import json
+import os
+from collections import Counter, OrderedDict
+from difflib import SequenceMatcher
+from typing import Dict, List, NamedTuple, Optional, Set, Tuple
+
+from helpers import marked_item_merge, valuify
+from lxml import etree
+from manifest import hash_bytes
+from normalize import clean_string
+
+
+def trigrams(text: str) -> Set[str]:
+    """The case-insensitive trigrams of a string, padded so that short names and word starts still produce some."""
+    padded = f'  {text.lower()} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class TrigramIndex:
+    """A trigram index over speaker names, used to decide which names are worth scoring with SequenceMatcher first."""
+    __slots__ = ('names', 'counts', 'postings')
+
+    def __init__(self, names: List[str], counts: List[str], postings: Optional[Dict[str, List[int]]] = None) -> None:
+        self.names = names
+        self.counts = counts
+        if postings is None:
+            postings = {}
+            for index, name in enumerate(names):
+                for trigram in trigrams(name):
+                    postings.setdefault(trigram, []).append(index)
+        self.postings = postings
+
+    def to_dict(self) -> dict:
+        return {'names': self.names, 'counts': self.counts, 'postings': self.postings}
+
+    @classmethod
+    def from_dict(cls, data: dict) -> 'TrigramIndex':
+        return cls(data['names'], data['counts'], data['postings'])
+
+    def candidates(self, query: str) -> List[int]:
+        """Every name's index, those sharing the most trigrams with the query first."""
+        shared = Counter()
+        for trigram in trigrams(query):
+            shared.update(self.postings.get(trigram, ()))
+        ranked = [index for index, _ in shared.most_common()]
+        return ranked + [index for index in range(len(self.names)) if index not in shared]
+
+    def search(self, query: str, n: int) -> List[int]:
+        """
+        Returns the indexes of the `n` names most similar to the query, best first.
+
+        Gives exactly the same results as get_close_matches_indexes with no cutoff, but since the likeliest names are
+        scored first, most of the rest can be ruled out by SequenceMatcher's cheap upper bounds alone.
+        """
+        matcher = SequenceMatcher()
+        matcher.set_seq2(query)
+        best: List[Tuple[float, int]] = []  # A min-heap of the best (ratio, index) pairs so far
+        for index in self.candidates(query):
+            matcher.set_seq1(self.names[index])
+            if len(best) < n:
+                heapq.heappush(best, (matcher.ratio(), index))
+                continue
+
+            floor = best[0][0]
+            if matcher.real_quick_ratio() < floor or matcher.quick_ratio() < floor:
+                continue
+            scored = (matcher.ratio(), index)
+            if scored > best[0]:
+                heapq.heapreplace(best, scored)
+
+        return [index for _, index in sorted(best, reverse=True)]
+
+
+class SimilarIndexCache:
+    """
+    Trigram indexes over a speaker mapping file, persisted alongside a hash of the file they were built from.
+
+    Each combination of searched element (Source or Destination) and merging is indexed separately, and only when
+    first asked for.
+    """
+    VERSION = 1
+
+    def __init__(self, path: str, mapping_path: str) -> None:
+        self.path = path
+        self.mapping_path = mapping_path
+        self.key: Optional[str] = None
+        self.indexes: Dict[str, TrigramIndex] = {}
+        self.stamp = None
+
+    def _stat(self):
+        stat = os.stat(self.mapping_path)
+        return stat.st_size, stat.st_mtime_ns
+
+    def refresh(self) -> bool:
+        """Makes sure the indexes reflect the mapping file, returning True if they had to be reloaded."""
+        if self.stamp == self._stat():
+            return False
+
+        self.stamp = self._stat()
+        with open(self.mapping_path, 'rb') as mapping_file:
+            key = hash_bytes(mapping_file.read())
+        if key == self.key:
+            return False
+
+        self.key, self.indexes = key, {}
+        if os.path.exists(self.path):
+            with open(self.path, 'r', encoding='utf-8') as cache_file:
+                try:
+                    data = json.load(cache_file)
+                except ValueError:
+                    data = {}
+            if data.get('version') == self.VERSION and data.get('key') == key:
+                self.indexes = {name: TrigramIndex.from_dict(index) for name, index in data['indexes'].items()}
+        return True
+
+    def save(self) -> None:
+        with open(self.path, 'w', encoding='utf-8') as cache_file:
+            json.dump({'version': self.VERSION, 'key': self.key,
+                       'indexes': {name: index.to_dict() for name, index in self.indexes.items()}}, cache_file)
+
+    def get(self, mapping_type: str = 'Source', merge: bool = True) -> TrigramIndex:
+        self.refresh()
+        name = f'{mapping_type}:{"merged" if merge else "all"}'
+        if name not in self.indexes:
+            with open(self.mapping_path, 'r') as mapping_file:
+                root: etree.ElementBase = etree.parse(mapping_file)
+
+            counts = list(map(int, root.xpath('//SpeakerMappings/Mapping/@count')))
+            speakers = root.xpath(f"//SpeakerMappings/Mapping/{mapping_type}/text()")
+            if merge:
+                speakers, counts = marked_item_merge(speakers, counts)  # Merge identical speakers together
+            self.indexes[name] = TrigramIndex(list(speakers), [str(count) for count in counts])
+            self.save()
+        return self.indexes[name]
+
+
+def normalize_speaker(name: str) -> str:
+    """The form speakers are compared in: ASCII, slugged and without numbering (Woman #4 -> woman)."""
+    cleaned = clean_string(name).strip()
+    try:
+        return valuify(cleaned)
+    except AttributeError:
+        # Too short to be slugged, such as single letters
+        return cleaned.lower()
+
+
+class SpeakerCluster(NamedTuple):
+    """A group of speakers that look like the same one, suggesting the most common of them."""
+    suggested: str
+    count: int
+    members: List[Tuple[str, int, float]]  # (speaker, count, similarity to the suggested speaker)
+
+
+def cluster_speakers(counts: Dict[str, int], threshold: float = 0.85, max_block: int = 100) -> List[SpeakerCluster]:
+    """
+    Groups speakers whose normalized names are at least `threshold` similar, most common groups first.
+
+    Rather than comparing every pair, names are only compared with those they share a normalized prefix or enough
+    trigrams with. Trigrams shared by more than `max_block` names say little about either, so they are not used.
+    Groups are transitive: if A is like B and B is like C, all three are grouped.
+    """
+    # Speakers normalizing to the same name are trivially grouped; everything else works on the unique names.
+    normalized: Dict[str, List[str]] = OrderedDict()
+    for speaker in counts.keys():
+        normalized.setdefault(normalize_speaker(speaker), []).append(speaker)
+    keys = list(normalized.keys())
+
+    parent = list(range(len(keys)))
+
+    def find(i: int) -> int:
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    blocks: Dict[str, List[int]] = {}
+    key_trigrams = [trigrams(key) for key in keys]
+    for index, key in enumerate(keys):
+        blocks.setdefault('prefix:' + key[:3], []).append(index)
+        for trigram in key_trigrams[index]:
+            blocks.setdefault(trigram, []).append(index)
+
+    matcher = SequenceMatcher()
+    for index, key in enumerate(keys):
+        shared = Counter()
+        for block in ['prefix:' + key[:3], *key_trigrams[index]]:
+            members = blocks[block]
+            if len(members) <= max_block:
+                shared.update(other for other in members if other > index)
+
+        matcher.set_seq2(key)
+        for other, common in shared.items():
+            # Similar names share most of the shorter name's trigrams
+            if find(index) == find(other) or common < min(len(key_trigrams[index]), len(key_trigrams[other])) / 2:
+                continue
+            matcher.set_seq1(keys[other])
+            if matcher.real_quick_ratio() >= threshold and matcher.quick_ratio() >= threshold \
+                    and matcher.ratio() >= threshold:
+                parent[find(other)] = find(index)
+
+    groups: Dict[int, List[str]] = OrderedDict()
+    for index, key in enumerate(keys):
+        groups.setdefault(find(index), []).extend(normalized[key])
+
+    clusters: List[SpeakerCluster] = []
+    for speakers in groups.values():
+        if len(speakers) < 2:
+            continue
+        speakers.sort(key=lambda speaker: (-counts[speaker], speaker))
+        suggested = speakers[0]
+        suggested_key = normalize_speaker(suggested)
+        members = [(speaker, counts[speaker],
+                    round(SequenceMatcher(None, normalize_speaker(speaker), suggested_key).ratio(), 3))
+                   for speaker in speakers]
+        clusters.append(SpeakerCluster(suggested, sum(counts[speaker] for speaker in speakers), members))
+
+    clusters.sort(key=lambda cluster: (-cluster.count, cluster.suggested))
+    return clusters
@@ -11,7 +11,11 @@ import unidecode
 
 
 def char_filter(s: str) -> Iterator[str]:
-    """Returns a generator of characters that are properly converted from their unicode character into their ASCII equivalent."""
+    """
+    Returns a generator of characters that are properly converted from their unicode character into their ASCII equivalent.
+
+    This is the reference for normalize.clean_string, which produces the same output far faster.
+    """
     latin = re.compile('[a-zA-Z]+')
     for char in unicodedata.normalize('NFC', s):
         decoded = unidecode.unidecode(char)
@@ -21,9 +25,20 @@ def char_filter(s: str) -> Iterator[str]:
             yield decoded
 
 
-def clean_string(s: str) -> str:
-    """Returns a clean string, devoid of ugly Unicode characters."""
-    return "".join(char_filter(s))
+def valuify(value: str) -> str:
+    """
+    Simplifies character names into slug-like identifiers.
+
+    Woman #4 -> woman
+    Woman From Buffalo -> woman-from-buffalo
+    Edward R. Meow -> edward-r-meow
+    """
+    value = re.sub(r'\s+', '-', value.lower().strip())
+    value = re.sub(r'#\d+', '', value)
+    value = re.sub(r'\d+(?:st|nd|rd|th)', '', value)
+    value = re.match(r'^-*(.+[^-])-*$', value).group(1)
+    value = re.sub(r'[.\[\],;\'\"]', '', value)
+    return value
 
 
 def get_close_matches_indexes(word, possibilities, n=3, cutoff=0.6):
@@ -47,10 +62,10 @@ def get_close_matches_indexes(word, possibilities, n=3, cutoff=0.6):
     s.set_seq2(word)
     for idx, x in enumerate(possibilities):
         s.set_seq1(x)
-        if s.real_quick_ratio() >= cutoff and \
-                s.quick_ratio() >= cutoff and \
-                s.ratio() >= cutoff:
-            result.append((s.ratio(), idx))
+        if s.real_quick_ratio() >= cutoff and s.quick_ratio() >= cutoff:
+            ratio = s.ratio()
+            if ratio >= cutoff:
+                result.append((ratio, idx))
 
     # Move the best scorers to head of list
     result = _nlargest(n, result)
@@ -0,0 +1,355 @@
+import io
+import json
+import os
+import subprocess
+import tempfile
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple
+
+from manifest import BuildManifest, hash_strings
+
+try:
+    from PIL import Image, ImageCms, ImageFilter
+except ImportError:
+    Image = None
+
+BACKENDS = ['magick', 'pillow']
+# Bumped whenever a backend's output changes for the same arguments, so the outputs it made before are rebuilt.
+BACKEND_REVISIONS: Dict[str, str] = {'magick': '', 'pillow': '2'}
+# Formats responsive variants are produced in, with their MIME type & the quality each is encoded at.
+VARIANT_FORMATS: Dict[str, Tuple[str, int]] = {'webp': ('image/webp', 80), 'avif': ('image/avif', 60)}
+VARIANT_WIDTHS = [160, 320, 640, 960]
+VARIANT_MANIFEST_JSON = 'variants.json'
+
+
+class ImageOperation(NamedTuple):
+    """A single derived image: where it comes from, where it goes, what it is and the `magick` command producing it."""
+    input: str
+    output: str
+    kind: str
+    args: List[str]
+
+
+class OperationResult(NamedTuple):
+    operation: ImageOperation
+    skipped: bool
+    duration: float
+    error: Optional[Exception]
+
+
+def get_fullsize_args(input_path: str, output_path: str) -> List[str]:
+    return ['magick',
+            input_path,
+            '-gravity', 'Center',
+            '-crop', '1:1+0+0',
+            '+repage',
+            '-quality', '95',
+            '-interlace', 'none',
+            '-colorspace', 'sRGB',
+            '-strip',
+            output_path]
+
+
+def get_thumbnailing_args(input_path: str, output_path: str, geometry: str = '156') -> List[str]:
+    return [
+        'magick',
+        input_path,
+        '-gravity', 'Center',
+        '-crop', '1:1+0+0',
+        '+repage',
+        '-filter', 'Triangle',
+        '-define', 'filter:support=2',
+        '-thumbnail', geometry,
+        '-unsharp', '0.25x0.25+8+0.065',
+        '-dither', 'None',
+        '-posterize', '136',
+        '-quality', '82',
+        '-define', 'jpeg:fancy-upsampling=off',
+        '-define', 'png:compression-filter=5',
+        '-define', 'png:compression-level=9',
+        '-define', 'png:compression-strategy=1',
+        '-define', 'png:exclude-chunk=all',
+        '-interlace', 'none',
+        '-colorspace', 'sRGB',
+        '-strip',
+        output_path,
+    ]
+
+
+def get_variant_args(input_path: str, output_path: str, width: int) -> List[str]:
+    extension = os.path.splitext(output_path)[1][1:]
+    return ['magick',
+            input_path,
+            '-gravity', 'Center',
+            '-crop', '1:1+0+0',
+            '+repage',
+            '-filter', 'Lanczos',
+            '-resize', f'{width}x{width}',
+            '-quality', str(VARIANT_FORMATS[extension][1]),
+            '-colorspace', 'sRGB',
+            '-strip',
+            output_path]
+
+
+def fullsize_operation(input_path: str, output_path: str) -> ImageOperation:
+    return ImageOperation(input_path, output_path, 'full', get_fullsize_args(input_path, output_path))
+
+
+def thumbnail_operation(input_path: str, output_path: str) -> ImageOperation:
+    return ImageOperation(input_path, output_path, 'thumbnail', get_thumbnailing_args(input_path, output_path))
+
+
+def variant_operation(input_path: str, output_path: str, width: int) -> ImageOperation:
+    return ImageOperation(input_path, output_path, 'variant', get_variant_args(input_path, output_path, width))
+
+
+def variant_width(operation: ImageOperation) -> int:
+    return int(operation.args[operation.args.index('-resize') + 1].split('x')[0])
+
+
+def image_side(path: str) -> int:
+    """The side of the centered square every output is cropped to, read from the image's header alone."""
+    if Image is not None:
+        with Image.open(path) as image:
+            return min(image.size)
+    identified = subprocess.run(['magick', 'identify', '-format', '%w %h', f'{path}[0]'], capture_output=True,
+                                text=True, check=True)
+    return min(int(value) for value in identified.stdout.split())
+
+
+def variant_operations(input_path: str, output_dir: str, name: str, widths: List[int], formats: List[str]) \
+        -> List[ImageOperation]:
+    """
+    The responsive variants of an image, named like `full-320w.webp`, for every width & format.
+
+    Images are never upscaled: widths beyond the source are replaced by a single variant at the source's own width.
+    """
+    side = image_side(input_path)
+    ladder = sorted({min(width, side) for width in widths})
+    return [variant_operation(input_path, os.path.join(output_dir, f'{name}-{width}w.{extension}'), width)
+            for extension in formats for width in ladder]
+
+
+def retarget(operation: ImageOperation, root: str, new_root: str) -> ImageOperation:
+    """Returns the same operation with its output moved from one output directory to another."""
+    output = os.path.join(new_root, os.path.relpath(operation.output, root))
+    if operation.kind == 'full':
+        return fullsize_operation(operation.input, output)
+    if operation.kind == 'variant':
+        return variant_operation(operation.input, output, variant_width(operation))
+    return thumbnail_operation(operation.input, output)
+
+
+def operation_digest(operation: ImageOperation, backend: str = 'magick') -> str:
+    return hash_strings(backend + BACKEND_REVISIONS[backend], *operation.args)
+
+
+def is_up_to_date(operation: ImageOperation, manifest: BuildManifest, backend: str = 'magick') -> bool:
+    """True if the output is newer than its input and was produced by the same backend with the same arguments."""
+    if not manifest.is_fresh('media', operation.output, operation_digest(operation, backend), [operation.output]):
+        return False
+    return os.stat(operation.output).st_mtime_ns >= os.stat(operation.input).st_mtime_ns
+
+
+def run_magick(operations: List[ImageOperation], suppress: bool = True) -> None:
+    sp_kwargs = {'capture_output': True, 'text': True} if suppress else {}
+    for operation in operations:
+        subprocess.run(operation.args, **sp_kwargs, check=True)
+
+
+def posterize(image: 'Image.Image', levels: int) -> 'Image.Image':
+    """Reduces every channel to the given number of evenly spaced levels, like ImageMagick's -posterize."""
+    step = 255 / (levels - 1)
+    table = [round(round(value / step) * step) for value in range(256)]
+    return image.point(table * len(image.getbands()))
+
+
+def to_srgb(image: 'Image.Image') -> 'Image.Image':
+    """
+    Converts an image's pixels into sRGB through its embedded ICC profile, as `-colorspace sRGB` does, dropping alpha.
+
+    Images without a profile (or with one that can't be used) are taken to be sRGB already.
+    """
+    icc_profile = image.info.get('icc_profile')
+    if icc_profile:
+        mode = image.mode if image.mode in ('RGB', 'CMYK', 'L') else 'RGB'
+        try:
+            source_profile = ImageCms.ImageCmsProfile(io.BytesIO(icc_profile))
+            return ImageCms.profileToProfile(image.convert(mode), source_profile, ImageCms.createProfile('sRGB'),
+                                             outputMode='RGB')
+        except (OSError, ImageCms.PyCMSError):
+            pass
+    return image.convert('RGB')
+
+
+def run_pillow(operations: List[ImageOperation], suppress: bool = True) -> None:
+    """
+    Produces every given operation (all sharing one input) in-process, decoding the source image only once.
+
+    Mirrors get_fullsize_args, get_thumbnailing_args and get_variant_args: a centered 1:1 crop in sRGB with metadata
+    stripped, saved at quality 95, thumbnailed with a triangle filter, unsharpened, posterized to 136 levels and saved
+    at quality 82, or resized with a Lanczos filter and saved at its format's quality.
+    """
+    if Image is None:
+        raise RuntimeError('The pillow backend requires Pillow to be installed.')
+
+    with Image.open(operations[0].input) as source:
+        image = to_srgb(source)
+
+    side = min(image.size)
+    left, top = (image.width - side) // 2, (image.height - side) // 2
+    cropped = image.crop((left, top, left + side, top + side))
+
+    thumbnails: Dict[int, 'Image.Image'] = {}
+    resized: Dict[int, 'Image.Image'] = {}
+    for operation in operations:
+        if operation.kind == 'full':
+            cropped.save(operation.output, 'JPEG', quality=95, progressive=False)
+            continue
+
+        if operation.kind == 'variant':
+            width = variant_width(operation)
+            # Every format of a width shares one resize.
+            if width not in resized:
+                resized[width] = cropped.resize((width, width), Image.LANCZOS) if width != side else cropped
+            extension = os.path.splitext(operation.output)[1][1:]
+            resized[width].save(operation.output, extension.upper(), quality=VARIANT_FORMATS[extension][1])
+            continue
+
+        size = int(operation.args[operation.args.index('-thumbnail') + 1])
+        if size not in thumbnails:
+            thumbnail = cropped.resize((size, size), Image.BILINEAR)
+            thumbnail = thumbnail.filter(ImageFilter.UnsharpMask(radius=0.25, percent=800, threshold=17))
+            thumbnails[size] = posterize(thumbnail, 136)
+        thumbnails[size].save(operation.output, 'JPEG', quality=82, progressive=False)
+
+
+RUNNERS: Dict[str, Callable[[List[ImageOperation], bool], None]] = {'magick': run_magick, 'pillow': run_pillow}
+
+
+def run_operations(operations: List[ImageOperation], manifest: BuildManifest, jobs: int = 1, force: bool = False,
+                   suppress: bool = True, backend: str = 'magick',
+                   on_complete: Optional[Callable[[OperationResult], None]] = None) -> List[OperationResult]:
+    """
+    Runs every operation that is not already up to date, `jobs` at a time.
+
+    The pillow backend runs all operations sharing an input together so that each source is only decoded once; the
+    magick backend runs every operation on its own. Successful operations are recorded in the manifest so the next
+    run can skip them. Results are returned in the order the operations were given; `on_complete` is called as each
+    one finishes, in completion order.
+    """
+    runner = RUNNERS[backend]
+    results: List[Optional[OperationResult]] = [None] * len(operations)
+
+    groups: Dict[str, List[int]] = OrderedDict()
+    for index, operation in enumerate(operations):
+        key = operation.input if backend == 'pillow' else operation.output
+        groups.setdefault(key, []).append(index)
+
+    def execute(indexes: List[int]) -> List[Tuple[int, OperationResult]]:
+        pending: List[int] = []
+        group_results: List[Tuple[int, OperationResult]] = []
+        for index in indexes:
+            if force or not is_up_to_date(operations[index], manifest, backend):
+                pending.append(index)
+            else:
+                group_results.append((index, OperationResult(operations[index], True, 0.0, None)))
+        if len(pending) == 0:
+            return group_results
+
+        start = time.perf_counter()
+        error: Optional[Exception] = None
+        try:
+            runner([operations[index] for index in pending], suppress)
+        except Exception as e:
+            error = e
+        duration = (time.perf_counter() - start) / len(pending)
+
+        for index in pending:
+            operation = operations[index]
+            if error is None:
+                manifest.record('media', operation.output, operation_digest(operation, backend))
+            else:
+                manifest.discard('media', operation.output)
+            group_results.append((index, OperationResult(operation, False, duration, error)))
+        return group_results
+
+    with ThreadPoolExecutor(max_workers=max(jobs, 1)) as pool:
+        futures = [pool.submit(execute, indexes) for indexes in groups.values()]
+        for future in as_completed(futures):
+            for index, result in future.result():
+                results[index] = result
+                if on_complete is not None:
+                    on_complete(result)
+
+    return results
+
+
+def write_variant_manifest(root: str, operations: List[ImageOperation]) -> dict:
+    """
+    Lists every variant produced, for the frontend to build `srcset` attributes from.
+
+    Written as `variants.json` at the root of the output directory, mapping each image's directory (`01/02`,
+    `michael`) and name (`full`, `face`) to its variants, smallest first, with their path, MIME type, dimensions &
+    size in bytes.
+    """
+    images: Dict[str, Dict[str, List[dict]]] = {}
+    for operation in operations:
+        if operation.kind != 'variant' or not os.path.exists(operation.output):
+            continue
+        url = os.path.relpath(operation.output, root).replace(os.sep, '/')
+        directory, filename = url.rsplit('/', 1)
+        name = filename.rsplit('-', 1)[0]
+        width = variant_width(operation)
+        images.setdefault(directory, {}).setdefault(name, []).append({
+            'url': url,
+            'type': VARIANT_FORMATS[os.path.splitext(filename)[1][1:]][0],
+            'width': width,
+            'height': width,
+            'size': os.stat(operation.output).st_size
+        })
+
+    for variants in images.values():
+        for name in variants:
+            variants[name].sort(key=lambda variant: (variant['type'], variant['width']))
+
+    manifest = {'version': 1, 'images': images}
+    with open(os.path.join(root, VARIANT_MANIFEST_JSON), 'w', encoding='utf-8') as manifest_file:
+        json.dump(manifest, manifest_file, separators=(',', ':'), sort_keys=True)
+    return manifest
+
+
+class BackendReport(NamedTuple):
+    backend: str
+    elapsed: float
+    completed: int
+    failed: int
+    sizes: Dict[str, int]
+
+
+def compare_backends(operations: List[ImageOperation], root: str, jobs: int = 1, suppress: bool = True) \
+        -> List[BackendReport]:
+    """Runs the same operations through every backend into scratch directories, reporting time and output size."""
+    reports: List[BackendReport] = []
+    for backend in BACKENDS:
+        with tempfile.TemporaryDirectory() as temp_dir:
+            retargeted = [retarget(operation, root, temp_dir) for operation in operations]
+            for operation in retargeted:
+                os.makedirs(os.path.dirname(operation.output), exist_ok=True)
+
+            # A throwaway manifest; nothing is ever skipped or saved.
+            manifest = BuildManifest(os.path.join(temp_dir, 'manifest.json'))
+            start = time.perf_counter()
+            results = run_operations(retargeted, manifest, jobs=jobs, force=True, suppress=suppress, backend=backend)
+            elapsed = time.perf_counter() - start
+
+            sizes: Dict[str, int] = OrderedDict()
+            completed = [result for result in results if result.error is None]
+            for result in completed:
+                kind = result.operation.kind
+                sizes[kind] = sizes.get(kind, 0) + os.stat(result.operation.output).st_size
+
+            reports.append(BackendReport(backend, elapsed, len(completed), len(results) - len(completed), sizes))
+    return reports
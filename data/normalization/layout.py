@@ -0,0 +1,110 @@
+"""
+layout.py
+
+The seasons & episodes of a show, discovered from the filenames of its raw transcripts instead of assumed.
+
+Each season is stored as the sorted numbers of the episodes it has, so specials (season zero), split episodes numbered
+apart or extra seasons are only more entries; never holes in a grid or indexes out of its range. `truth` writes the
+layout as `layout.json` beside the truth files for every later stage, and `build app` copies it into the application
+data, where the frontend reads it (see src/store.js).
+"""
+import json
+import os
+import re
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+LAYOUT_JSON = 'layout.json'
+EPISODE_NAME = re.compile(r'(\d+)-(\d+)')
+
+
+class LayoutError(ValueError):
+    pass
+
+
+def episode_key(filename: str) -> Tuple[int, int]:
+    """Parses the season and episode numbers out of an episode filename like `3-07.xml`."""
+    match = EPISODE_NAME.match(os.path.basename(filename))
+    if match is None:
+        raise LayoutError(f'"{filename}" is not named like an episode (`<season>-<episode>`).')
+    return int(match.group(1)), int(match.group(2))
+
+
+class Layout:
+    """Every season of a show, in order, with the numbers of the episodes each has."""
+    VERSION = 1
+
+    def __init__(self, seasons: Dict[int, List[int]]) -> None:
+        self.seasons: Dict[int, List[int]] = OrderedDict(
+            (season, sorted(episodes)) for season, episodes in sorted(seasons.items()))
+
+    @classmethod
+    def discover(cls, filenames: Iterable[str]) -> 'Layout':
+        """Finds the layout of a directory of episode files, refusing two files numbered as the same episode."""
+        seen: Dict[Tuple[int, int], str] = {}
+        for filename in filenames:
+            key = episode_key(filename)
+            if key in seen:
+                raise LayoutError(f'"{filename}" and "{seen[key]}" are both season {key[0]}, episode {key[1]}.')
+            seen[key] = filename
+        return cls.from_episodes(seen.keys())
+
+    @classmethod
+    def from_episodes(cls, episodes: Iterable[Tuple[int, int]]) -> 'Layout':
+        seasons: Dict[int, List[int]] = {}
+        for season, episode in episodes:
+            seasons.setdefault(season, []).append(episode)
+        return cls(seasons)
+
+    @classmethod
+    def load(cls, path: str) -> Optional['Layout']:
+        """Reads a layout written by `save`, if there is one from this version."""
+        if not os.path.exists(path):
+            return None
+        with open(path, 'r', encoding='utf-8') as layout_file:
+            try:
+                data = json.load(layout_file)
+            except ValueError:
+                return None
+        if data.get('version') != cls.VERSION:
+            return None
+        return cls({season['season']: season['episodes'] for season in data['seasons']})
+
+    def to_json(self) -> dict:
+        return {'version': self.VERSION,
+                'seasons': [{'season': season, 'episodes': episodes} for season, episodes in self.seasons.items()]}
+
+    def save(self, path: str) -> None:
+        with open(path + '.part', 'w', encoding='utf-8') as layout_file:
+            json.dump(self.to_json(), layout_file)
+        os.replace(path + '.part', path)
+
+    def episodes(self) -> List[Tuple[int, int]]:
+        """Every episode's season & episode number, in series order."""
+        return [(season, episode) for season, episodes in self.seasons.items() for episode in episodes]
+
+    def __len__(self) -> int:
+        return sum(len(episodes) for episodes in self.seasons.values())
+
+    def __contains__(self, key: Tuple[int, int]) -> bool:
+        season, episode = key
+        return episode in self.seasons.get(season, [])
+
+    def group(self, values: Dict[Tuple[int, int], Any]) -> List[List[Any]]:
+        """Groups a value for each episode by season, in series order, leaving out episodes without one."""
+        return [[values[(season, episode)] for episode in episodes if (season, episode) in values]
+                for season, episodes in self.seasons.items()]
+
+
+def episode_description(descriptions: Any, season: int, episode: int) -> Optional[dict]:
+    """
+    An episode's title & description from `episode_descriptions.json`, or None if it has none.
+
+    The file is either a grid of seasons' episodes (one-indexed by position) or, for shows with specials or gaps, a
+    mapping of season numbers to mappings of episode numbers.
+    """
+    if isinstance(descriptions, dict):
+        return descriptions.get(str(season), {}).get(str(episode))
+    if 1 <= season <= len(descriptions) and 1 <= episode <= len(descriptions[season - 1]):
+        return descriptions[season - 1][episode - 1]
+    return None
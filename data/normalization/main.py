@@ -1,22 +1,46 @@
-import copy
+import gzip
 import imghdr
 import json
 import logging
 import os
 import re
-import shutil
+import struct
 import subprocess
+import sys
+import tempfile
+import time
+from array import array
 from collections import Counter, OrderedDict
-from typing import Any, Dict, List, Optional, Tuple, Union
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Any, Dict, List, NamedTuple, Optional, Set, Tuple, Union
 
+from algolia import AlgoliaClient, ExportState, diff_records, encode_record, quote_records, write_chunks
+from assets import AssetManifest, brotli
+import benchmarks
 import click
-import requests
-import rich.progress
+from columnar import decode_episode, encode_episode
 from dotenv import load_dotenv
-from helpers import clean_string, get_close_matches_indexes, marked_item_merge
+from fuzzy import SimilarIndexCache, cluster_speakers
+from helpers import char_filter, valuify
+from imaging import (BACKENDS, VARIANT_FORMATS, VARIANT_MANIFEST_JSON, VARIANT_WIDTHS, ImageOperation, OperationResult,
+                     compare_backends, fullsize_operation, run_operations, thumbnail_operation, variant_operations,
+                     write_variant_manifest)
+from layout import LAYOUT_JSON, Layout, LayoutError, episode_description, episode_key
 from lxml import etree
+from manifest import BuildManifest, hash_bytes, hash_strings
+from normalize import clean_string
+from parallel import map_tasks, resolve_jobs
+from profiling import (Profiler, activate, count_file, load_report, phase, save_report, slowest_table, summary_table,
+                       timed)
+from rich.console import Console
 from rich.logging import RichHandler
 from rich.progress import MofNCompleteColumn, Progress, SpinnerColumn, TimeElapsedColumn, track
+from rich.table import Table
+from search_index import build_search_blobs
+from speakers import SpeakerResolution, SpeakerTable, close_mapping, parse_speaker_mapping, quote_json
+from synthetic import DEFAULT_OPTIONS, SYNTHETIC_JSON, CorpusOptions, generate_corpus
+from tmdb import API_URL as TMDB_API_URL, StillManifest, TMDBClient
+from transcripts import TranscriptError, parse_transcript, transcript_strings, write_truth
 
 load_dotenv()
 
@@ -26,18 +50,23 @@ logger = logging.getLogger('normalization.main')
 logger.setLevel(logging.DEBUG)
 
 CUR_DIR = os.path.dirname(os.path.abspath(__file__))
-TRUTH_DIR = os.path.join(CUR_DIR, 'truth')
-CHARACTERS_DIR = os.path.join(CUR_DIR, 'characters')
+# Every input & output of the pipeline lives here; overridden to run stages against another corpus, as `bench` does.
+DATA_DIR = os.path.abspath(os.getenv('NORMALIZATION_DATA_DIR') or CUR_DIR)
+TRUTH_DIR = os.path.join(DATA_DIR, 'truth')
+CHARACTERS_DIR = os.path.join(DATA_DIR, 'characters')
 EPISODES_DIR = os.path.join(TRUTH_DIR, 'episodes')
-COMPILE_DIR = os.path.join(CUR_DIR, 'compile')
-RAW_DIR = os.path.join(CUR_DIR, 'raw')
-BUILD_DIR = os.path.join(CUR_DIR, 'build')
-IMG_DIR = os.path.join(CUR_DIR, 'img')
+COMPILE_DIR = os.path.join(DATA_DIR, 'compile')
+RAW_DIR = os.path.join(DATA_DIR, 'raw')
+BUILD_DIR = os.path.join(DATA_DIR, 'build')
+IMG_DIR = os.path.join(DATA_DIR, 'img')
 IMG_EPISODES_DIR = os.path.join(IMG_DIR, 'episodes')
 IMG_CHARACTERS_DIR = os.path.join(IMG_DIR, 'characters')
 
 RAW_FILES = os.listdir(RAW_DIR)
-EPISODE_COUNTS = [6, 22, 23, 14, 26, 24, 24, 24, 23]
+
+# The episode store format, see data/store.py
+STORE_MAGIC = b'OFFSTORE'
+STORE_VERSION = 3
 
 
 def abslistdir(path: str) -> List[str]:
@@ -45,8 +74,34 @@ def abslistdir(path: str) -> List[str]:
 
 
 @click.group()
-def cli():
-    pass
+@click.option('-j', '--jobs', type=int, default=1,
+              help='Number of workers for per-episode stages and image operations. Zero uses every available core.')
+@click.option('--profile', is_flag=True,
+              help='Time every stage & episode, writing a JSON report and comparing it against the previous one.')
+@click.option('--profile-output', type=click.Path(dir_okay=False), default=lambda: ConstantPaths.PROFILE,
+              help='Where the profile report is written.')
+@click.pass_context
+def cli(ctx: click.Context, jobs: int, profile: bool, profile_output: str):
+    ctx.obj = {'jobs': resolve_jobs(jobs)}
+
+    if profile:
+        profiler = Profiler(' '.join([ctx.info_name, *sys.argv[1:]]), ctx.obj['jobs'])
+        activate(profiler, cli)
+        ctx.call_on_close(lambda: write_profile(profiler, profile_output))
+
+
+def write_profile(profiler: Profiler, path: str) -> None:
+    """Writes the profile report, summarizing it against the report it replaces."""
+    report = profiler.report()
+    previous = load_report(path)
+    save_report(report, path)
+
+    console = Console()
+    console.print(summary_table(report, previous))
+    slowest = slowest_table(report)
+    if slowest is not None:
+        console.print(slowest)
+    logger.info(f'Profile report written to "{path}".')
 
 
 @cli.group()
@@ -62,6 +117,13 @@ class Constants:
     META_JSON = 'meta.json'
     EPISODE_DESCRIPTION_JSON = 'episode_descriptions.json'
     CHARACTER_DESCRIPTION_JSON = 'character_descriptions.json'
+    BUILD_MANIFEST_JSON = '.build_manifest.json'
+    SPEAKER_TABLE_JSON = '.speaker_table.json'
+    SIMILAR_INDEX_JSON = '.similar_index.json'
+    EPISODE_STORE = 'episodes.store'
+    STILLS_MANIFEST_JSON = 'stills.json'
+    PROFILE_JSON = 'profile.json'
+    BENCHMARK_BASELINE_JSON = 'benchmark_baseline.json'
 
 
 class ConstantPaths:
@@ -70,64 +132,116 @@ class ConstantPaths:
     IDENTIFIERS = os.path.join(CHARACTERS_DIR, Constants.IDENTIFIERS_XML)
     CHARACTERS = os.path.join(TRUTH_DIR, Constants.CHARACTERS_XML)
     META = os.path.join(TRUTH_DIR, Constants.META_JSON)
-    EP_DESC = os.path.join(CUR_DIR, Constants.EPISODE_DESCRIPTION_JSON)
-    CHAR_DESC = os.path.join(CUR_DIR, Constants.CHARACTER_DESCRIPTION_JSON)
+    EP_DESC = os.path.join(DATA_DIR, Constants.EPISODE_DESCRIPTION_JSON)
+    CHAR_DESC = os.path.join(DATA_DIR, Constants.CHARACTER_DESCRIPTION_JSON)
+    BUILD_MANIFEST = os.path.join(DATA_DIR, Constants.BUILD_MANIFEST_JSON)
+    SPEAKER_TABLE = os.path.join(DATA_DIR, Constants.SPEAKER_TABLE_JSON)
+    SIMILAR_INDEX = os.path.join(DATA_DIR, Constants.SIMILAR_INDEX_JSON)
+    STILLS_MANIFEST = os.path.join(IMG_EPISODES_DIR, Constants.STILLS_MANIFEST_JSON)
+    PROFILE = os.path.join(DATA_DIR, Constants.PROFILE_JSON)
+    LAYOUT = os.path.join(TRUTH_DIR, LAYOUT_JSON)
+    BENCHMARK_BASELINE = os.path.join(CUR_DIR, Constants.BENCHMARK_BASELINE_JSON)
+
+
+def discover_layout() -> Layout:
+    """The layout of the raw files as they are now."""
+    try:
+        return Layout.discover(RAW_FILES)
+    except LayoutError as error:
+        raise click.ClickException(str(error))
+
+
+def load_layout() -> Layout:
+    """The layout written by `truth`, or else the one of the raw files as they are now."""
+    layout = Layout.load(ConstantPaths.LAYOUT)
+    if layout is None:
+        logger.debug('No layout file written yet; the layout of the raw files will be used.')
+        layout = discover_layout()
+    return layout
+
+
+def image_episodes() -> List[Tuple[int, int]]:
+    """
+    Every episode to fetch or build stills for: those of the layout, along with any that already have a folder of
+    stills. Stills are numbered the way TMDB numbers episodes, which can count episodes the raw transcripts merge or
+    lack (such as 4-08 & 5-18), so those are kept rather than dropped with the layout.
+    """
+    episodes = set(load_layout().episodes())
+    if os.path.exists(IMG_EPISODES_DIR):
+        for season in filter(str.isdigit, os.listdir(IMG_EPISODES_DIR)):
+            episodes.update((int(season), int(episode))
+                            for episode in os.listdir(os.path.join(IMG_EPISODES_DIR, season)) if episode.isdigit())
+    return sorted(episodes)
+
+
+def describe_episode(episode_desc: Any, season: int, episode: int) -> dict:
+    """An episode's title & description, or placeholders for an episode without any (such as a special)."""
+    description = episode_description(episode_desc, season, episode)
+    if description is None:
+        return {'title': f'Season {season}, Episode {episode}', 'description': ''}
+    return description
+
+
+def truth_episode(raw_file: str) -> Counter:
+    """Processes a single raw file into its truth file, returning the speakers seen in it."""
+    raw_path = os.path.join(RAW_DIR, raw_file)
+    truth_path = os.path.join(EPISODES_DIR, raw_file.replace('txt', 'xml'))
+    count_file(raw_path)
+    speakers = write_truth(timed(parse_transcript(raw_path), 'parse'), truth_path)
+    count_file(truth_path, written=True)
+    return speakers
 
 
 @cli.command('truth')
-def truth():
+@click.option('--force', is_flag=True, help='Rebuild every truth file, even if its raw file has not changed.')
+@click.pass_obj
+def truth(obj: dict, force: bool):
     """Step 1: Builds raw files into truth files."""
     logger.info("Processing all raw files into normalized truth files.")
 
+    layout = discover_layout()
+    manifest = BuildManifest.load(ConstantPaths.BUILD_MANIFEST)
+
+    # Speaker counts are only complete when every file is processed, which a new mapping file needs.
+    if not force and not os.path.exists(ConstantPaths.SPEAKER_MAPPING):
+        logger.debug('Speaker mapping file is missing; all raw files will be processed.')
+        force = True
+
+    digests: Dict[str, str] = {}
+    for raw_file in sorted(RAW_FILES, key=episode_key):
+        digest = manifest.hash_file(os.path.join(RAW_DIR, raw_file))
+        truth_path = os.path.join(EPISODES_DIR, raw_file.replace('txt', 'xml'))
+        if force or not manifest.is_fresh('truth', raw_file, digest, [truth_path]):
+            digests[raw_file] = digest
+
+    if not os.path.exists(EPISODES_DIR):
+        os.makedirs(EPISODES_DIR)
+        logger.info('`truth/episodes` directory created.')
+
+    # Every later stage takes the seasons & episodes there are from here.
+    layout.save(ConstantPaths.LAYOUT)
+    logger.debug(f'Layout of {len(layout.seasons)} seasons & {len(layout)} episodes written.')
+
+    skipped: int = len(RAW_FILES) - len(digests)
     speakers = Counter()
-    for raw_file in RAW_FILES:
-        raw_path = os.path.join(RAW_DIR, raw_file)
-
-        truth_filename = raw_file.replace('txt', 'xml')
-
-        with open(raw_path, 'r', encoding='utf-8') as file:
-            raw_data = file.read()
-
-            root = etree.Element('SceneList')
-            try:
-                for section_num, raw_section in enumerate(re.split('^-', raw_data, flags=re.MULTILINE), start=1):
-                    sceneElement = etree.SubElement(root, 'Scene')
-
-                    scene_data = list(raw_section.strip().split('\n'))
-                    if scene_data[0].startswith('!'):
-                        # Notate that scene is deleted on Scene Element Attributes
-                        sceneElement.attrib['deleted'] = re.search(r'!(\d+)', scene_data.pop(0)).group(1)
-
-                    # Process quotes in each scene
-                    for quote in scene_data:
-                        quoteElement = etree.SubElement(sceneElement, 'Quote')
-                        speaker, text = quote.split('|', 1)
-                        speaker, text = clean_string(speaker), clean_string(text)
-                        speakers[speaker] += 1
-
-                        if len(speaker) <= 1:
-                            raise Exception("Speaker text had less than two characters.")
-                        elif len(text) <= 1:
-                            raise Exception("Quote text had less than two characters.")
-
-                        rootSpeakerElement = etree.SubElement(quoteElement, 'Speaker')
-                        rootSpeakerElement.text = speaker
-                        textElement = etree.SubElement(quoteElement, "Text")
-                        textElement.text = text
-            except Exception:
-                logger.exception(f'Skipped {raw_file}: Malformed data.')
-                if quote:
-                    logger.info(
-                            f'Last quote seen "{quote if type(quote) is str else "|".join(quote)}" in section {section_num}')
-            else:
-                truth_path = os.path.join(EPISODES_DIR, truth_filename)
-                with open(truth_path, 'w') as truth_file:
-                    etree.indent(root, space=" " * 4)
-                    truth_file.write(etree.tostring(root, encoding=str, pretty_print=True))
+    for result in map_tasks(truth_episode, digests.keys(), obj['jobs'], 'Processing raw files...'):
+        if isinstance(result.error, TranscriptError):
+            logger.error(f'Skipped {result.item}: {result.error}')
+            manifest.discard('truth', result.item)
+        elif result.error is not None:
+            logger.error(f'Skipped {result.item}: Malformed data.', exc_info=result.error)
+            manifest.discard('truth', result.item)
+        else:
+            speakers.update(result.value)
+            manifest.record('truth', result.item, digests[result.item])
+
+    manifest.prune('truth', RAW_FILES)
+    manifest.save()
+    logger.debug(f'{len(RAW_FILES) - skipped} raw files processed, {skipped} unchanged files skipped.')
 
     logger.debug(f"{len(speakers)} unique speakers identified.")
 
-    if not os.path.exists(speaker_mapping_path):
+    if not os.path.exists(ConstantPaths.SPEAKER_MAPPING):
         root = etree.Element("SpeakerMappings")
 
         for speaker, count in sorted(speakers.items(), key=lambda item: item[1], reverse=True):
@@ -144,30 +258,39 @@ def truth():
         logger.warning('Skipped exporting speakers; delete "speaker_mapping.xml" prior to export next time.')
 
 
+def truth_speakers(truth_filename: str) -> Counter:
+    """Counts the speakers of every quote in a truth file."""
+    truth_path = os.path.join(EPISODES_DIR, truth_filename)
+    count_file(truth_path)
+    with open(truth_path, 'r') as truth_file, phase('parse'):
+        root = etree.parse(truth_file)
+    return Counter(root.xpath('//SceneList/Scene/Quote/Speaker/text()'))
+
+
 @cli.command('merge')
-def merge():
+@click.pass_obj
+def merge(obj: dict):
     """Step 2: Merge all Speaker Mappings from source into one file."""
     speaker_list = Counter()
 
-    truth_files: List[str] = os.listdir(EPISODES_DIR)
+    truth_files: List[str] = sorted(os.listdir(EPISODES_DIR), key=episode_key)
     logger.debug(f"{len(truth_files)} truth files available.")
 
-    for truth_filename in track(truth_files):
-        truth_path = os.path.join(EPISODES_DIR, truth_filename)
-        with open(truth_path, 'r') as truth_file:
-            root = etree.parse(truth_file)
-            for speaker in root.xpath('//SceneList/Scene/Quote/Speaker/text()'):
-                speaker_list[speaker] += 1
+    for result in map_tasks(truth_speakers, truth_files, obj['jobs'], 'Reading truth files...'):
+        if result.error is not None:
+            logger.error(f'Failed while processing `{result.item}`', exc_info=result.error)
+        else:
+            speaker_list.update(result.value)
 
     logger.debug('Speakers acquired from Truth files.')
 
-    speaker_mapping = OrderedDict()
-    with open(ConstantPaths.SPEAKER_MAPPING, 'r') as speaker_mapping_file:
-        root_mapping_element: etree.ElementBase = etree.parse(speaker_mapping_file)
-        for mappingElement in root_mapping_element.xpath('//SpeakerMappings/Mapping'):
-            source, destination = mappingElement.xpath('.//Source/text()')[0], \
-                                  mappingElement.xpath('.//Destination/text()')[0]
-            speaker_mapping[source] = destination
+    speaker_mapping, _ = parse_speaker_mapping(ConstantPaths.SPEAKER_MAPPING)
+    closure, cycles = close_mapping(speaker_mapping)
+    if len(cycles) > 0:
+        for cycle in cycles:
+            logger.error(f'Speaker mapping cycle: {" -> ".join(cycle + cycle[:1])}')
+        logger.error('Speaker mappings could not be merged; break the cycles above and try again.')
+        return
 
     logger.debug('Mappings loaded.')
 
@@ -175,12 +298,8 @@ def merge():
     seen = set()
 
     logger.debug('Merging Speaker Mappings...')
-    for speaker in track(speaker_list.keys(), 'Merging Map...'):
-        while speaker_mapping.get(speaker) is not None:
-            if speaker_mapping.get(speaker) == speaker:
-                break
-            else:
-                speaker = speaker_mapping[speaker]
+    for speaker in speaker_list.keys():
+        speaker = closure.get(speaker, speaker)
 
         if speaker not in seen:
             seen.add(speaker)
@@ -194,22 +313,6 @@ def merge():
         character_file.write(etree.tostring(root, encoding=str, pretty_print=True))
 
 
-def valuify(value: str) -> str:
-    """
-    Simplifies character names into slug-like identifiers.
-
-    Woman #4 -> woman
-    Woman From Buffalo -> woman-from-buffalo
-    Edward R. Meow -> edward-r-meow
-    """
-    value = re.sub(r'\s+', '-', value.lower().strip())
-    value = re.sub(r'#\d+', '', value)
-    value = re.sub(r'\d+(?:st|nd|rd|th)', '', value)
-    value = re.match(r'^-*(.+[^-])-*$', value).group(1)
-    value = re.sub(r'[.\[\],;\'\"]', '', value)
-    return value
-
-
 @cli.command('ids')
 def ids():
     """Step 3: Builds an XML file for identifying character id mappings"""
@@ -275,7 +378,9 @@ def ids():
             speaker_element.attrib['annotated'] = "true"
             annotated_text_element = etree.SubElement(speaker_element, 'AnnotatedText')
             characters_element = etree.SubElement(speaker_element, 'Characters')
-            annotated_text_element.text = speaker_name
+            # Each character's name is marked out, as hand-annotated speakers are: {Jim} & {Pam}
+            annotated_text_element.text = ''.join(f'{{{part}}}' if part in split_text else part
+                                                  for part in re.split(f'({split_pattern})', speaker_name))
             for sub_character in split_text:
                 subcharacter_element = etree.SubElement(characters_element, 'Character')
                 subcharacter_element.text = valuify(sub_character)
@@ -341,151 +446,264 @@ def meta() -> None:
 
 @cli.command('run_all')
 @click.option('--confirm', is_flag=True, help='Force confirm through the confirmation prompt')
-def run_all(confirm: bool) -> None:
+@click.option('--force', is_flag=True, help='Rebuild every truth file, even if its raw file has not changed.')
+@click.pass_context
+def run_all(ctx: click.Context, confirm: bool, force: bool) -> None:
     """Runs all commands in order one after another."""
     logger.warning('`all` command running...')
     if confirm or click.confirm("This command can be very destructive to unstaged/uncommitted data, are you sure?"):
         logger.debug('Running `truth`')
-        truth()
+        ctx.invoke(truth, force=force)
         logger.debug('Running `merge`')
-        merge()
+        ctx.invoke(merge)
         logger.debug('Running `ids`')
-        ids()
+        ctx.invoke(ids)
         logger.debug('Running `meta`')
-        meta()
+        ctx.invoke(meta)
     else:
         logger.info('Canceled.')
 
 
 @cli.command('similar')
-@click.argument('text')
+@click.argument('text', required=False)
 @click.option('-d', '--destination', is_flag=True, help='Search Destination mapping instead of Source.')
 @click.option('-n', '--results', type=int, default=5, help='Specify the number of results to be returned.')
 @click.option('--no-merge', is_flag=True, help='Don\'t merge similar items together to make things easier.')
 @click.option('-r', '--reversed', is_flag=True,
               help='Reverse the results direction to help readability in the console.')
-def similar(text: str, destination: Optional[bool], results: int, reversed: bool, no_merge: bool) -> None:
+@click.option('-i', '--interactive', is_flag=True,
+              help='Keep reading queries from the console, reloading the index whenever the mappings change.')
+def similar(text: Optional[str], destination: Optional[bool], results: int, reversed: bool, no_merge: bool,
+            interactive: bool) -> None:
     """Locates the most similar character name in speaker mappings. Searches <Source> by default."""
-    with open(ConstantPaths.SPEAKER_MAPPING, 'r') as mapping_file:
-        root: etree.ElementBase = etree.parse(mapping_file)
+    if text is None and not interactive:
+        raise click.UsageError('A search text is required unless running with --interactive.')
 
     mapping_type: str = "Source"
     if destination:
         mapping_type = "Destination"
 
-    counts: Union[List[int], List[str]] = list(
-            map(int, root.xpath('//SpeakerMappings/Mapping/@count')))  # Parse counts into integers for merge
-    speakers = root.xpath(f"//SpeakerMappings/Mapping/{mapping_type}/text()")
-    if not no_merge: speakers, counts = marked_item_merge(speakers, counts)  # Merge identical speakers together
-    if results == -1:
-        results = len(speakers)
+    cache = SimilarIndexCache(ConstantPaths.SIMILAR_INDEX, ConstantPaths.SPEAKER_MAPPING)
+    cache.refresh()
 
-    result_indexes: List[int] = get_close_matches_indexes(text, speakers, results, 0)
-    results = [f'{speakers[i]} ({counts[i]})' for i in result_indexes]
-    results = [f'{i}. {item}' for i, item in enumerate(results, start=1)]
-    if reversed: results.reverse()
+    def search(query: str) -> None:
+        index = cache.get(mapping_type, not no_merge)
+        count = len(index.names) if results == -1 else results
 
-    print('\n'.join(results))
+        lines = [f'{index.names[i]} ({index.counts[i]})' for i in index.search(query, count)]
+        lines = [f'{i}. {item}' for i, item in enumerate(lines, start=1)]
+        if reversed: lines.reverse()
+        print('\n'.join(lines))
 
+    if text is not None:
+        search(text)
+    if not interactive:
+        return
 
-@cli.command('compile')
-def compile() -> None:
-    logger.debug('Final compile started.')
-
-    if not os.path.exists(COMPILE_DIR):
-        os.makedirs(COMPILE_DIR)
-        logger.debug('Compile directory created.')
-
-    speaker_mapping: Dict[str, str] = OrderedDict()
-    logger.debug('Parsing speaker mappings...')
-    with open(ConstantPaths.SPEAKER_MAPPING, 'r') as speaker_mapping_file:
-        speaker_mapping_root: etree.ElementBase = etree.parse(speaker_mapping_file)
-        for mapping_element in speaker_mapping_root.xpath('//SpeakerMappings/Mapping'):
-            source = mapping_element.xpath('./Source/text()')[0]
-            destination = mapping_element.xpath('./Destination/text()')[0]
+    while True:
+        try:
+            query = input(f'{mapping_type}> ').strip()
+        except (EOFError, KeyboardInterrupt):
+            print()
+            break
+        if query == '':
+            break
+        if cache.refresh():
+            logger.debug('Speaker mappings changed; index reloaded.')
+        search(query)
+
+
+@cli.command('cluster')
+@click.option('-o', '--output', type=click.Path(dir_okay=False), default=None,
+              help='Where to write the report. Defaults to clusters.json beside the speaker mapping.')
+@click.option('-t', '--threshold', type=float, default=0.85, help='How similar two speakers must be to be grouped.')
+@click.option('-a', '--all', 'include_all', is_flag=True,
+              help='Include groups whose speakers already all map to the same destination.')
+def cluster(output: Optional[str], threshold: float, include_all: bool) -> None:
+    """Groups similar <Source> speakers in speaker mappings into candidate merges for review."""
+    with open(ConstantPaths.SPEAKER_MAPPING, 'r') as mapping_file:
+        root: etree.ElementBase = etree.parse(mapping_file)
 
-            if source in speaker_mapping.keys():
-                logger.warning(f'Key Source `{source}` overwritten.')
+    counts = Counter()
+    destinations: Dict[str, str] = {}
+    for mapping_element in root.xpath('//SpeakerMappings/Mapping'):
+        source = mapping_element.xpath('./Source/text()')[0]
+        counts[source] += int(mapping_element.attrib.get('count', 0))
+        destinations[source] = mapping_element.xpath('./Destination/text()')[0]
+    logger.debug(f'Clustering {len(counts)} speakers...')
+
+    start = time.perf_counter()
+    clusters = cluster_speakers(counts, threshold)
+    if not include_all:
+        clusters = [cluster for cluster in clusters
+                    if len({destinations[speaker] for speaker, _, _ in cluster.members}) > 1]
+    logger.debug(f'{len(clusters)} groups found in {time.perf_counter() - start:.2f}s.')
+
+    report = [{
+        'suggested': cluster.suggested,
+        'count': cluster.count,
+        'members': [{'source': speaker, 'destination': destinations[speaker], 'count': count, 'similarity': score}
+                    for speaker, count, score in cluster.members]
+    } for cluster in clusters]
+
+    output = output or os.path.join(TRUTH_DIR, 'clusters.json')
+    with open(output, 'w') as report_file:
+        json.dump(report, report_file, indent=4, ensure_ascii=False)
+    logger.info(f'Candidate merges written to `{os.path.relpath(output, os.getcwd())}`.')
+
+
+def load_speaker_table() -> SpeakerTable:
+    """Loads the speaker resolution table, only parsing the speaker mapping & identifiers if either has changed."""
+    return SpeakerTable.load(ConstantPaths.SPEAKER_TABLE, ConstantPaths.SPEAKER_MAPPING, ConstantPaths.IDENTIFIERS)
+
+
+# A scene's deleted scene number (if any) and its quotes, each quote's text paired with its resolved speaker.
+SceneRecord = Tuple[Optional[int], List[Tuple[str, SpeakerResolution]]]
+
+
+def read_compiled_scenes(file_path: str) -> List[SceneRecord]:
+    """Reads the scenes of a compiled episode file."""
+    count_file(file_path)
+    with open(file_path, 'r') as ep_file, phase('parse'):
+        episode_root: etree.ElementBase = etree.parse(ep_file)
+
+    scenes: List[SceneRecord] = []
+    for scene in episode_root.xpath('./Scene'):
+        deleted = int(scene.attrib['deleted_scene']) if scene.attrib.get('deleted') == 'true' else None
+        quotes = []
+        for quote in scene.xpath('./Quote'):
+            speaker_text = quote.find('Speaker/SpeakerText')
+            characters = tuple((character.text, character.attrib.get('type'))
+                               for character in quote.xpath('./Speaker/Characters/Character'))
+            resolution = SpeakerResolution(speaker_text.text, speaker_text.attrib['annotated'] == 'true', characters)
+            quotes.append((quote.find('QuoteText').text, resolution))
+        scenes.append((deleted, quotes))
+    return scenes
+
+
+def read_truth_scenes(file_path: str, table: SpeakerTable, scenes: List[SceneRecord]) -> List[str]:
+    """
+    Reads & resolves the scenes of a truth episode file, returning the truth speakers seen.
 
-            speaker_mapping[source] = destination
-    logger.debug(f'{len(speaker_mapping.keys())} speaker mappings parsed.')
+    Scenes are appended to the given list as they are read, so everything before an unresolvable speaker is kept.
+    """
+    count_file(file_path)
+    with open(file_path, 'r') as ep_file, phase('parse'):
+        episode_root: etree.ElementBase = etree.parse(ep_file)
+
+    episode_speakers = set()
+    for truth_scene in episode_root.xpath('//SceneList/Scene'):
+        deleted = truth_scene.attrib.get('deleted')
+        quotes = []
+        scenes.append((int(deleted) if deleted else None, quotes))
+        for truth_quote in truth_scene.xpath('./Quote'):
+            truth_speaker: str = truth_quote.find('Speaker').text
+            episode_speakers.add(truth_speaker)
+            quotes.append((truth_quote.find('Text').text, table.resolve(truth_speaker)))
+    return sorted(episode_speakers)
+
+
+def write_compiled_scenes(scenes: List[SceneRecord], output_path: str) -> None:
+    """Writes scenes out in the same form as the compile stage does."""
+    compile_root = etree.Element('SceneList')
+    for deleted, quotes in scenes:
+        compile_scene = etree.SubElement(compile_root, 'Scene')
+        if deleted is not None:
+            compile_scene.attrib['deleted'] = 'true'
+            compile_scene.attrib['deleted_scene'] = str(deleted)
+
+        for text, resolution in quotes:
+            compile_quote = etree.SubElement(compile_scene, 'Quote')
+            etree.SubElement(compile_quote, 'QuoteText').text = text
+            speaker_element = etree.SubElement(compile_quote, 'Speaker')
+            speaker_text_element = etree.SubElement(speaker_element, 'SpeakerText')
+            speaker_text_element.attrib['annotated'] = 'true' if resolution.annotated else 'false'
+            speaker_text_element.text = resolution.text
 
-    character_mappings: Dict[str, etree.ElementBase] = OrderedDict()
-    logger.debug('Acquiring character identification mappings...')
-    with open(ConstantPaths.IDENTIFIERS, 'r') as identifier_file:
-        speaker_list_root: etree.ElementBase = etree.parse(identifier_file)
+            characters_element = etree.SubElement(speaker_element, 'Characters')
+            for character_id, character_type in resolution.characters:
+                character_element = etree.SubElement(characters_element, 'Character')
+                if character_type is not None:
+                    character_element.attrib['type'] = character_type
+                character_element.text = character_id
 
-        for speaker in speaker_list_root.xpath('//SpeakerList/Speaker'):
-            raw_text = speaker.find('RawText').text
-            character_mappings[raw_text] = speaker
+    with open(output_path, 'w') as compile_file, phase('serialize'):
+        etree.indent(compile_root, space=" " * 4)
+        compile_file.write(etree.tostring(compile_root, encoding=str, pretty_print=True))
+    count_file(output_path, written=True)
 
-    episode_files = os.listdir(EPISODES_DIR)
-    logger.debug(f'Beginning processing for {len(episode_files)} episode files.')
 
-    for file in track(episode_files, 'Compiling Episodes'):
-        file_path = os.path.join(EPISODES_DIR, file)
-        output_path = os.path.join(COMPILE_DIR, file)
+# The speaker table used by compile_episode, loaded once per worker process by init_compile_worker.
+compile_table: Optional[SpeakerTable] = None
 
-        compile_root = etree.Element('SceneList')
 
-        try:
-            with open(file_path, 'r') as ep_file:
-                episode_root: etree.ElementBase = etree.parse(ep_file)
+def init_compile_worker() -> None:
+    global compile_table
+    compile_table = load_speaker_table()
 
-                for truth_scene in episode_root.xpath('//SceneList/Scene'):
-                    compile_scene = etree.SubElement(compile_root, 'Scene')
 
-                    # Deleted scene marker handling
-                    if truth_scene.attrib.get("deleted", False):
-                        compile_scene.attrib["deleted"] = "true"
-                        compile_scene.attrib["deleted_scene"] = str(int(truth_scene.attrib["deleted"]))
+def compile_episode(file: str) -> List[str]:
+    """Compiles a single truth file, returning the truth speakers seen in it."""
+    scenes: List[SceneRecord] = []
+    try:
+        return read_truth_scenes(os.path.join(EPISODES_DIR, file), compile_table, scenes)
+    finally:
+        # Whatever was compiled is written out, even if the episode failed part way through.
+        write_compiled_scenes(scenes, os.path.join(COMPILE_DIR, file))
 
-                    for truth_quote in truth_scene.xpath('./Quote'):
-                        truth_speaker: str = truth_quote.find('Speaker').text
-                        truth_text: str = truth_quote.find('Text').text
 
-                        # parent compiled Quote element
-                        compile_quote = etree.SubElement(compile_scene, 'Quote')
+@cli.command('compile')
+@click.option('--force', is_flag=True, help='Recompile every episode, even if its inputs have not changed.')
+@click.pass_obj
+def compile(obj: dict, force: bool) -> None:
+    logger.debug('Final compile started.')
 
-                        # The text actually said in the quote
-                        quote_text_element = etree.SubElement(compile_quote, 'QuoteText')
-                        quote_text_element.text = truth_text
+    if not os.path.exists(COMPILE_DIR):
+        os.makedirs(COMPILE_DIR)
+        logger.debug('Compile directory created.')
 
-                        # Speaker Parent Element
-                        speaker_element = etree.SubElement(compile_quote, 'Speaker')
+    logger.debug('Loading speaker mappings & identifiers...')
+    table = load_speaker_table()
+    for source in table.duplicates:
+        logger.warning(f'Key Source `{source}` overwritten.')
+    logger.debug(f'{len(table.mapping)} speaker mappings loaded.')
 
-                        # This is the (possibly annotated) list of characters referenced by this quote's raw speaker.
-                        character_mapping: etree.ElementBase = character_mappings[speaker_mapping[truth_speaker]]
-                        is_annotated = character_mapping.attrib.get("annotated", "false") == "true"
+    manifest = BuildManifest.load(ConstantPaths.BUILD_MANIFEST)
+    manifest.artifact(ConstantPaths.SPEAKER_MAPPING)
+    manifest.artifact(ConstantPaths.IDENTIFIERS)
 
-                        # Speaker Text - the text displayed, annotated or not, that shows who exactly is speaking
-                        speaker_text_element = etree.SubElement(speaker_element, "SpeakerText")
-                        speaker_text_element.attrib["annotated"] = "true" if is_annotated else "false"
-                        if is_annotated:
-                            speaker_text_element.text = character_mapping.find('AnnotatedText').text
-                        else:
-                            speaker_text_element.text = character_mapping.find('RawText').text
+    speaker_fingerprints = table.fingerprints()
 
-                        # The constituent referenced characters in the SpeakerText element
-                        characters_element = etree.SubElement(speaker_element, 'Characters')
-                        has_multiple = character_mapping.find("Characters") is not None
+    def episode_digest(truth_digest: str, episode_speakers: List[str]) -> str:
+        return hash_strings(truth_digest, *(speaker_fingerprints.get(speaker, '') for speaker in episode_speakers))
 
-                        if has_multiple:
-                            for character in character_mapping.xpath('./Characters/Character'):
-                                characters_element.append(copy.deepcopy(
-                                        character
-                                ))
-                        else:
-                            characters_element.append(copy.deepcopy(
-                                    character_mapping.find('Character')
-                            ))
-        except Exception as e:
-            logger.error(f"Failed while processing `{file}`", exc_info=e)
+    episode_files = sorted(os.listdir(EPISODES_DIR), key=episode_key)
+    logger.debug(f'Beginning processing for {len(episode_files)} episode files.')
 
-        with open(output_path, 'w') as compile_file:
-            etree.indent(compile_root, space=" " * 4)
-            compile_file.write(etree.tostring(compile_root, encoding=str, pretty_print=True))
+    truth_digests: Dict[str, str] = {}
+    for file in episode_files:
+        truth_digest = manifest.hash_file(os.path.join(EPISODES_DIR, file))
+        record = manifest.get('compile', file)
+        if not force and record is not None:
+            digest = episode_digest(truth_digest, record['speakers'])
+            if manifest.is_fresh('compile', file, digest, [os.path.join(COMPILE_DIR, file)]):
+                continue
+        truth_digests[file] = truth_digest
+
+    skipped: int = len(episode_files) - len(truth_digests)
+    for result in map_tasks(compile_episode, truth_digests.keys(), obj['jobs'], 'Compiling Episodes',
+                            initializer=init_compile_worker):
+        # Failed episodes are never recorded, so they are retried on the next run.
+        if result.error is not None:
+            logger.error(f"Failed while processing `{result.item}`", exc_info=result.error)
+            manifest.discard('compile', result.item)
+        else:
+            digest = episode_digest(truth_digests[result.item], result.value)
+            manifest.record('compile', result.item, digest, speakers=result.value)
 
+    manifest.prune('compile', episode_files)
+    manifest.save()
+    logger.debug(f'{len(episode_files) - skipped} episodes compiled, {skipped} unchanged episodes skipped.')
     logger.info('Completed episode data compiling.')
 
 
@@ -519,125 +737,540 @@ def meta_update() -> None:
 def check(verbose: bool) -> None:
     """Check all files for errors or possible errors in output."""
 
-    with open(ConstantPaths.IDENTIFIERS, 'r') as identifier_file:
-        identifiers = etree.parse(identifier_file)
+    table = load_speaker_table()
 
     # Check that identifier RawText does not contain brackets
     logger.debug('Checking RawText for issues.')
-    for raw_text in identifiers.xpath('//SpeakerList/Speaker/RawText/text()'):
+    for raw_text in table.identifiers.keys():
         if '{' in raw_text or '}' in raw_text:
             logger.warning(f'Character `{raw_text}` contains a bracket in the <RawText> element.')
 
     # Check that each character has AnnotatedText if annotated = true, same with reverse
     logger.debug('Checking AnnotatedText elements for issues.')
-    for character in identifiers.xpath('//SpeakerList/Speaker'):
-        annotate_state: str = character.attrib.get("annotated")
-        speaker_name: str = character.find('RawText').text
+    for speaker_name, identifier in table.identifiers.items():
+        annotate_state: Optional[str] = identifier.annotation
 
         if annotate_state is None:
             logger.warning(f'Missing annotation on `{speaker_name}`')
         elif annotate_state == "true":
-            if character.find('AnnotatedText') is None:
+            if identifier.annotated_text is None:
                 logger.warning(f'Missing AnnotatedText on `{speaker_name}`')
         elif annotate_state == "false":
-            if character.find('AnnotatedText') is not None:
+            if identifier.annotated_text is not None:
                 logger.warning(f'False annotation on `{speaker_name}`')
         else:
             logger.warning(f"Unexpected annotation state `{annotate_state}` on `{speaker_name}`")
 
+    # Check that every speaker mapping resolves, as compiling would fail on any that don't
+    logger.debug('Checking speaker mappings for issues.')
+    for source in table.duplicates:
+        logger.warning(f'Key Source `{source}` overwritten.')
+    for cycle in table.cycles:
+        logger.error(f'Speaker mapping cycle: {" -> ".join(cycle + cycle[:1])}')
+    for source, destination in table.unresolved():
+        if destination in table.identifiers:
+            logger.warning(f'Mapping `{source}` -> `{destination}` has an incomplete identifier.')
+        elif verbose:
+            logger.warning(f'Mapping `{source}` -> `{destination}` has no identifier.')
+    if not verbose:
+        missing = sum(destination not in table.identifiers for _, destination in table.unresolved())
+        if missing > 0:
+            logger.warning(f'{missing} speaker mappings have no identifier. Use --verbose to list them.')
+
     # TODO: Check for values in meta.json that are null
     # TODO: Check for values in meta.json that are not referenced anywhere in identifiers.xml
     # TODO: Check for character IDs in identifiers.xml that don't look correct (voice--on-phone)
 
 
-@cli.command('images')
-def images() -> None:
-    """Requests all images from episoes as available on themoviedb.org"""
+@cli.command('clean-bench')
+@click.option('-n', '--repeat', type=int, default=5, help='Number of timed passes over the corpus, the best is kept.')
+def clean_bench(repeat: int) -> None:
+    """Check clean_string against the reference char_filter over every raw transcript & time both."""
+    strings = transcript_strings(os.path.join(RAW_DIR, raw_file) for raw_file in sorted(RAW_FILES, key=episode_key))
+    logger.info(f'{len(strings)} strings ({sum(map(len, strings))} characters) read from {len(RAW_FILES)} transcripts.')
+
+    def reference(s: str) -> str:
+        return ''.join(char_filter(s))
+
+    mismatches = [s for s in strings if clean_string(s).encode('utf-8') != reference(s).encode('utf-8')]
+    for s in mismatches[:10]:
+        logger.error(f'Mismatch on {s!r}: {clean_string(s)!r} != {reference(s)!r}')
+
+    timings: List[Tuple[str, float]] = []
+    for name, function in [('char_filter', reference), ('clean_string', clean_string)]:
+        best = None
+        for _ in range(repeat):
+            start = time.perf_counter()
+            for s in strings:
+                function(s)
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        timings.append((name, best))
+
+    table = Table('Implementation', 'Time', 'Per String', 'Speedup')
+    for name, elapsed in timings:
+        table.add_row(name, f'{elapsed * 1000:.1f}ms', f'{elapsed / len(strings) * 1e6:.2f}us',
+                      f'{timings[0][1] / elapsed:.1f}x')
+    Console().print(table)
+
+    if len(mismatches) > 0:
+        raise click.ClickException(f'{len(mismatches)} strings cleaned differently from the reference.')
+    logger.info('Every string was cleaned identically to the reference.')
+
+
+@cli.command('bench')
+@click.option('-s', '--suite', 'suites', type=click.Choice(benchmarks.SUITES), multiple=True,
+              help='Which benchmarks to run; every suite by default. May be given more than once.')
+@click.option('--scale', 'scales', type=int, multiple=True, default=[1, 10], show_default=True,
+              help='Run stages & routes on the corpus repeated this many times over. May be given more than once.')
+@click.option('-n', '--repeat', type=int, default=3, help='Number of timed runs of each benchmark, the best is kept.')
+@click.option('--baseline', type=click.Path(dir_okay=False), default=lambda: ConstantPaths.BENCHMARK_BASELINE,
+              help='The stored results compared against.')
+@click.option('--save', is_flag=True, help='Store these results as the baseline instead of failing on regressions.')
+@click.option('-t', '--threshold', type=float, default=0.2, show_default=True,
+              help='How much slower than its baseline a benchmark may be before it fails, as a fraction.')
+@click.pass_obj
+def bench(obj: dict, suites: Tuple[str, ...], scales: Tuple[int, ...], repeat: int, baseline: str, save: bool,
+          threshold: float) -> None:
+    """Time the helpers, stages & API routes, failing on regressions against the stored baseline."""
+    suites = suites or tuple(benchmarks.SUITES)
+    results: List[benchmarks.Result] = []
+    # The suites & scales actually measured, and results left out on purpose; see benchmarks.compare
+    groups: Set[str] = set()
+    skipped: Set[str] = set()
+    broken: List[str] = []
+    synthetic = os.path.exists(os.path.join(DATA_DIR, SYNTHETIC_JSON))
+
+    if 'micro' in suites and not os.path.exists(ConstantPaths.CHARACTERS):
+        logger.warning('There is no `characters.xml` to take speakers from, skipping the micro benchmarks.')
+    elif 'micro' in suites:
+        groups.add('micro')
+        logger.info('Running micro benchmarks...')
+        strings = transcript_strings(os.path.join(RAW_DIR, raw_file) for raw_file in sorted(RAW_FILES, key=episode_key))
+        with open(ConstantPaths.CHARACTERS, 'r') as characters_file:
+            speakers: List[str] = etree.parse(characters_file).xpath('//CharacterList/Character/text()')
+        results.extend(benchmarks.micro_benchmarks(strings, speakers, repeat))
+
+    if 'stages' in suites or 'api' in suites:
+        for scale in scales:
+            with tempfile.TemporaryDirectory(prefix=f'bench-{scale}x-') as corpus_dir:
+                logger.info(f'Building the {scale}x corpus...')
+                benchmarks.build_corpus(DATA_DIR, corpus_dir, scale)
+
+                # The routes are served from the store the stages build, so they're always run.
+                logger.info(f'Running every stage on the {scale}x corpus...')
+                stage_results = benchmarks.stage_benchmarks(os.path.abspath(__file__), corpus_dir, scale,
+                                                            obj['jobs'], repeat if 'stages' in suites else 1)
+                if 'stages' in suites:
+                    groups.add(f'stages@{scale}x')
+                    results.extend(stage_results)
+
+                if 'api' in suites:
+                    client = benchmarks.load_api(os.path.join(corpus_dir, 'store', Constants.EPISODE_STORE))
+                    if client is None:
+                        logger.warning('The `server` package could not be imported, skipping the API benchmarks.')
+                    else:
+                        logger.info(f'Requesting every route on the {scale}x corpus...')
+                        groups.add(f'api@{scale}x')
+                        api_results, failed = benchmarks.api_benchmarks(client, scale, repeat)
+                        results.extend(api_results)
+                        for name, url, status in failed:
+                            if synthetic:
+                                logger.warning(f'Skipped {url}, it does not resolve in this synthetic corpus.')
+                                skipped.add(name)
+                            else:
+                                logger.error(f'{url} answered {status}.')
+                                broken.append(url)
+
+    previous = benchmarks.load_baseline(baseline)
+    if previous is not None and previous['environment'] != benchmarks.environment(obj['jobs']):
+        logger.warning(f'The baseline was measured in another environment: {previous["environment"]}')
+    table, regressions, missing = benchmarks.compare(results, previous, threshold, groups, skipped)
+    Console().print(table)
+
+    if len(broken) > 0:
+        raise click.ClickException(f'{len(broken)} routes failed: {", ".join(broken)}')
+    if save:
+        benchmarks.save_baseline(baseline, results, obj['jobs'], previous)
+        logger.info(f'Baseline written to "{baseline}".')
+        return
+
+    failures = []
+    if len(regressions) > 0:
+        failures.append(f'{len(regressions)} benchmarks regressed beyond {threshold:.0%}: {", ".join(regressions)}')
+    if len(missing) > 0:
+        failures.append(f'{len(missing)} benchmarks of the baseline were not measured: {", ".join(missing)}')
+    if len(failures) > 0:
+        raise click.ClickException('; '.join(failures))
+
+
+@cli.command('synthesize')
+@click.argument('output', type=click.Path(file_okay=False))
+@click.option('--seasons', type=int, default=DEFAULT_OPTIONS.seasons, show_default=True, help='Number of seasons.')
+@click.option('--episodes', type=int, default=DEFAULT_OPTIONS.episodes, show_default=True,
+              help='Number of episodes in each season.')
+@click.option('--scenes', type=float, default=DEFAULT_OPTIONS.scenes, show_default=True,
+              help='Mean number of scenes in an episode.')
+@click.option('--quotes', type=float, default=DEFAULT_OPTIONS.quotes, show_default=True,
+              help='Mean number of quotes in a scene.')
+@click.option('--words', type=float, default=DEFAULT_OPTIONS.words, show_default=True,
+              help='Mean number of words in a quote.')
+@click.option('--speakers', type=int, default=DEFAULT_OPTIONS.speakers, show_default=True,
+              help='Number of distinct speakers.')
+@click.option('--zipf', type=float, default=DEFAULT_OPTIONS.zipf, show_default=True,
+              help='Exponent of the distribution of lines between speakers; higher gives the main cast more lines.')
+@click.option('--compound', type=float, default=DEFAULT_OPTIONS.compound, show_default=True,
+              help='Fraction of quotes spoken by two speakers at once, like `Jim & Pam`.')
+@click.option('--deleted', type=float, default=DEFAULT_OPTIONS.deleted, show_default=True,
+              help='Number of deleted scenes per scene of an episode.')
+@click.option('--noise', type=float, default=DEFAULT_OPTIONS.noise, show_default=True,
+              help='Fraction of quotes given non-ASCII characters for clean_string to normalize.')
+@click.option('--seed', type=int, default=DEFAULT_OPTIONS.seed, show_default=True, help='Seed of the generator.')
+@click.option('--force', is_flag=True, help='Write into the output directory even if it already holds transcripts.')
+def synthesize(output: str, force: bool, **options) -> None:
+    """Generate a synthetic corpus of raw transcripts to run the pipeline on, with NORMALIZATION_DATA_DIR."""
+    if not force and os.path.exists(os.path.join(output, 'raw')) and len(os.listdir(os.path.join(output, 'raw'))) > 0:
+        raise click.ClickException(f'"{output}" already holds raw transcripts; use --force to overwrite them.')
+
+    start = time.perf_counter()
+    episode_count, quote_count = generate_corpus(output, CorpusOptions(**options))
+    logger.info(f'{episode_count} episodes with {quote_count} quotes written to "{output}" '
+                f'in {time.perf_counter() - start:.1f}s.')
+    logger.info(f'Build it with `NORMALIZATION_DATA_DIR={output} python main.py run_all --confirm`, '
+                f'then `compile` & `build app`.')
+
+
+def fetch_episode_stills(client: TMDBClient, manifest: StillManifest, base_url: str, tv_id: int,
+                         season: int, episode: int) -> Tuple[int, int]:
+    """Downloads every still available for an episode, returning the number of stills downloaded and skipped."""
+    s, e = season, episode
+    downloaded, skipped = 0, 0
+
+    episode_dir_path = os.path.join(IMG_EPISODES_DIR, f'{s:02}', f'{e:02}')
+    if not os.path.exists(episode_dir_path):
+        logger.debug('Creating directory: {}'.format(
+                os.path.relpath(episode_dir_path, IMG_DIR)
+        ))
+        os.makedirs(episode_dir_path, exist_ok=True)
+
+    logger.debug(f'Acquiring images for S{s}E{e}')
+    stills = client.episode_stills(tv_id, s, e)
+
+    if len(stills) < 1:
+        logger.warning(f'No stills found for S{s}E{e}')
+        return downloaded, skipped
+
+    logger.debug(f'{len(stills)} stills received for S{s}E{e}.')
+    for i, still in enumerate(stills, start=1):
+        file_extension = still['file_path'].split('.')[-1]
+        image_path = os.path.join(episode_dir_path, f'{i:02}.{file_extension}')
+        still_url = base_url + still['file_path']
+
+        if manifest.is_current(image_path, still['file_path']):
+            skipped += 1
+            continue
+
+        # Images downloaded before the manifest existed are checked against the server once, then recorded.
+        if os.path.exists(image_path):
+            content_length, etag = client.head(still_url)
+            existing_file_size = os.stat(image_path).st_size
+            if content_length == existing_file_size:
+                logger.debug(f'Skipping already downloaded file ({content_length / (1024):.2f} KB).')
+                manifest.record(image_path, still['file_path'], existing_file_size, etag)
+                skipped += 1
+                continue
+            else:
+                logger.warning(
+                        'Image at {} will be overwritten.'.format(os.path.relpath(image_path, IMG_DIR)))
 
-    API_KEY = os.getenv('THEMOVIEDB_API_KEY')
+        logger.debug(
+                'Downloading {}x{} image @ {}'.format(still['width'], still['height'], still['file_path']))
 
-    API_URL = 'https://api.themoviedb.org/3'
-    GET_CONFIGURAITON = API_URL + '/configuration'
-    GET_EPISODE_IMAGES = API_URL + '/tv/{tv_id}/season/{season_number}/episode/{episode_number}/images'
+        size, etag = client.download(still_url, image_path)
+        manifest.record(image_path, still['file_path'], size, etag)
+        downloaded += 1
+        logger.debug('Image downloaded to {}'.format(
+                os.path.relpath(image_path, IMG_DIR)
+        ))
+
+    return downloaded, skipped
+
+
+@cli.command('images')
+@click.option('-c', '--concurrency', type=int, default=8, help='Number of episodes fetched at once.')
+@click.option('--rate', type=float, default=40, help='Maximum requests per second. Zero disables rate limiting.')
+@click.option('--retries', type=int, default=3, help='Retries for failed or throttled requests, with backoff.')
+@click.option('--api-url', type=str, default=lambda: os.getenv('THEMOVIEDB_API_URL', TMDB_API_URL),
+              help='Base URL of the themoviedb.org API, or a stand-in server implementing the same routes.')
+def images(concurrency: int, rate: float, retries: int, api_url: str) -> None:
+    """Requests all images from episoes as available on themoviedb.org"""
 
     the_office = 2316
+    client = TMDBClient(os.getenv('THEMOVIEDB_API_KEY'), api_url, concurrency=concurrency, rate=rate,
+                        retries=retries)
+    manifest = StillManifest(ConstantPaths.STILLS_MANIFEST)
 
     # Get image still sizes & base url
-    configuration = requests.get(GET_CONFIGURAITON, {'api_key': API_KEY}).json()
-    IMG_BASE_URL = configuration['images']['secure_base_url']
+    configuration = client.configuration()
     STILL_SIZE = 'original'
+    base_url = configuration['images']['secure_base_url'] + STILL_SIZE
 
-    with rich.progress.Progress() as progress:
-        season_task = progress.add_task('Overall', total=sum(EPISODE_COUNTS))
-        episode_task = progress.add_task('Season ?')
-
-        for season in range(9):
-            s = season + 1
-            progress.update(episode_task, description=f'Season {s}', total=EPISODE_COUNTS[season], completed=0)
-
-            for episode in range(EPISODE_COUNTS[season]):
-                e = episode + 1
-
-                episode_dir_path = os.path.join(IMG_EPISODES_DIR, f'{s:02}', f'{e:02}')
-                if not os.path.exists(episode_dir_path):
-                    logger.debug('Creating directory: {}'.format(
-                            os.path.relpath(IMG_DIR, episode_dir_path)
-                    ))
-                    os.makedirs(episode_dir_path)
-
-                logger.debug(f'Acquiring images for S{s}E{e}')
-                request_url = GET_EPISODE_IMAGES.format(tv_id=the_office,
-                                                        season_number=season + 1,
-                                                        episode_number=episode + 1)
-                logger.debug(request_url)
-                episode_images = requests.get(request_url, params={'api_key': API_KEY}).json()
-
-                if len(episode_images['stills']) < 1:
-                    logger.warning(f'No stills found for S{s}E{e}')
-                else:
-                    stills = episode_images['stills']
-                    logger.debug(f'{len(stills)} stills received for S{s}E{e}.')
-
-                    for i, still in enumerate(stills, start=1):
-                        file_extension = still['file_path'].split('.')[-1]
-                        image_path = os.path.join(episode_dir_path, f'{i:02}.{file_extension}')
-                        still_url = IMG_BASE_URL + STILL_SIZE + still["file_path"]
-
-                        if os.path.exists(image_path):
-                            head_response = requests.head(still_url)
-
-                            content_length = int(head_response.headers['Content-Length'])
-                            existing_file_size = os.stat(image_path).st_size
-                            if content_length == existing_file_size:
-                                logger.debug(f'Skipping already downloaded file ({content_length / (1024):.2f} KB).')
-                                continue
-                            else:
-                                logger.warning(
-                                        'Image at {} will be overwritten.'.format(os.path.relpath(IMG_DIR, image_path)))
-
-                        logger.debug(
-                                'Downloading {}x{} image @ {}'.format(still['width'], still['height'], still['file_path']))
-
-                        img_rsp = requests.get(still_url, stream=True)
-                        if img_rsp.status_code == 200:
-                            with open(image_path, 'wb') as f:
-                                img_rsp.raw.decode_content = True
-                                shutil.copyfileobj(img_rsp.raw, f)
-                            logger.debug('Image downloaded to {}'.format(
-                                    os.path.relpath(IMG_DIR, image_path)
-                            ))
-                        else:
-                            logger.warning('Failed to download image!')
+    all_episodes: List[Tuple[int, int]] = image_episodes()
+    downloaded, skipped, failed = 0, 0, 0
+
+    try:
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            futures = {pool.submit(fetch_episode_stills, client, manifest, base_url, the_office, season, episode):
+                           (season, episode) for season, episode in all_episodes}
+
+            for future in track(as_completed(futures), 'Fetching episode stills...', total=len(futures)):
+                season, episode = futures[future]
+                try:
+                    episode_downloaded, episode_skipped = future.result()
+                    downloaded += episode_downloaded
+                    skipped += episode_skipped
+                except Exception as e:
+                    logger.error(f'Failed to fetch images for S{season}E{episode}', exc_info=e)
+                    failed += 1
+    finally:
+        # Whatever completed is kept, so an interrupted run resumes where it left off.
+        manifest.save()
+        client.close()
+
+    logger.info(f'{downloaded} stills downloaded, {skipped} already up to date, {failed} episodes failed.')
+
+
+class AppContext(NamedTuple):
+    """The descriptions, output path & (when building from truth files) speaker table used by build_episode."""
+    episode_desc: Any
+    character_desc: dict
+    path: str
+    table: Optional[SpeakerTable]
+    write_compile: bool
+
+
+# Loaded once per worker process by init_app_worker.
+app_context: Optional[AppContext] = None
+
+
+def init_app_worker(path: str, from_truth: bool = False, write_compile: bool = False) -> None:
+    global app_context
+    with open(ConstantPaths.EP_DESC, 'r') as episode_desc_file:
+        episode_desc = json.loads(episode_desc_file.read())
+
+    with open(ConstantPaths.CHAR_DESC, 'r') as character_desc_file:
+        character_desc = json.loads(character_desc_file.read())
 
-                progress.update(episode_task, advance=1)
-                progress.update(season_task, advance=1)
+    table = load_speaker_table() if from_truth else None
+    app_context = AppContext(episode_desc, character_desc, path, table, write_compile)
+
+
+def build_episode(episodeFile: str) -> Tuple[dict, List[str], List[str]]:
+    """
+    Builds and writes the application data for a single episode, from its compiled file or straight from its truth
+    file when the speaker table is loaded.
+
+    Returns the episode data along with any character identifiers that have no description, and the truth speakers
+    seen when building from a truth file.
+    """
+    context = app_context
+    seasonNum, episodeNum = episode_key(episodeFile)
+    description = describe_episode(context.episode_desc, seasonNum, episodeNum)
+    missing_characters: List[str] = []
+
+    episode_speakers: List[str] = []
+    if context.table is None:
+        scenes = read_compiled_scenes(os.path.join(COMPILE_DIR, episodeFile))
+    else:
+        scenes = []
+        episode_speakers = read_truth_scenes(os.path.join(EPISODES_DIR, episodeFile), context.table, scenes)
+        if context.write_compile:
+            write_compiled_scenes(scenes, os.path.join(COMPILE_DIR, episodeFile))
+
+    # Count character appearances
+    characters = Counter()
+    for _, quotes in scenes:
+        for _, resolution in quotes:
+            for character_id, character_type in resolution.characters:
+                if character_type in ['main', 'recurring']:
+                    characters[character_id] += 1
+
+    episode_characters: Dict[str, Dict[str, Union[str, int]]] = {}
+    for character_id, count in sorted(characters.items(), key=lambda item: item[1], reverse=True):
+        if character_id in context.character_desc.keys():
+            character_name = context.character_desc[character_id]['name']
+        else:
+            character_name = f'\"{character_id.capitalize()}\"'
+            missing_characters.append(character_id)
+
+        episode_characters[character_id] = {
+            'name': character_name,
+            'appearances': count
+        }
+
+    episode_data = {
+        'title': description['title'],
+        'description': description['description'],
+        'characters': episode_characters,
+        'seasonNumber': seasonNum,
+        'episodeNumber': episodeNum,
+        "scenes": [{'quotes': [quote_json(text, resolution) for text, resolution in quotes]}
+                   for _, quotes in scenes]
+    }
+
+    season_directory = os.path.join(context.path, f'{seasonNum:02}')
+    os.makedirs(season_directory, exist_ok=True)
+    episode_path = os.path.join(season_directory, f'{episodeNum:02}.json')
+    with open(episode_path, 'w') as episode_file, phase('serialize'):
+        json.dump(episode_data, episode_file)
+    count_file(episode_path, written=True)
+
+    return episode_data, missing_characters, episode_speakers
+
+
+def write_episode_store(path: str, season_episode_data: List[Tuple[int, int, dict]], character_data: dict) -> None:
+    """
+    Writes every API response into a single episode store file, as read by data/store.py (which describes the format).
+    """
+    def encode(value: Any) -> bytes:
+        # Matches Flask's jsonify defaults so responses are unchanged.
+        return json.dumps(value, separators=(',', ':'), sort_keys=True).encode('utf-8')
+
+    blobs: Dict[str, bytes] = OrderedDict()
+    seasons: Dict[int, List[dict]] = OrderedDict()
+    # Posting lists of every character's quote IDs & scenes, plus their first few quotes in full.
+    character_ids: Dict[str, array] = {character_id: array('I') for character_id in character_data.keys()}
+    character_scenes: Dict[str, array] = {character_id: array('I') for character_id in character_data.keys()}
+    character_quotes: Dict[str, List[dict]] = {character_id: [] for character_id in character_data.keys()}
+    stats = {'totals': {'quote': 0, 'scene': 0, 'episode': 0, 'season': 0}}
+
+    # Every quote is given a global ID in series order; see data/store.py for how they are looked up.
+    encoded_quotes: List[bytes] = []
+    quote_locations, scene_starts = array('H'), array('I')
+    episode_scenes: List[List[int]] = []
+
+    for season, episode, episode_data in season_episode_data:
+        episode_scenes.append([season, episode, len(scene_starts), len(episode_data['scenes'])])
+        scenes: List[dict] = []
+        for scene_num, scene in enumerate(episode_data['scenes'], start=1):
+            scene_starts.append(len(encoded_quotes))
+            quotes: List[dict] = []
+            for quote_num, quote in enumerate(scene['quotes'], start=1):
+                quote = {**quote, 'id': len(encoded_quotes)}
+                quotes.append(quote)
+                located_quote = {**quote, 'season': season, 'episode': episode, 'scene': scene_num, 'quote': quote_num}
+                encoded_quotes.append(encode(located_quote))
+                quote_locations.extend((season, episode, scene_num, quote_num))
+
+                speakers = quote['characters'].keys() if quote['isAnnotated'] else [quote['character']]
+                for character_id in speakers:
+                    if character_id in character_ids:
+                        character_ids[character_id].append(quote['id'])
+                        scenes_spoken = character_scenes[character_id]
+                        if len(scenes_spoken) == 0 or scenes_spoken[-1] != len(scene_starts) - 1:
+                            scenes_spoken.append(len(scene_starts) - 1)
+                        if len(character_quotes[character_id]) < 10:
+                            character_quotes[character_id].append(located_quote)
+            scenes.append({**scene, 'quotes': quotes})
+
+        episode_data = {**episode_data, 'scenes': scenes}
+        seasons.setdefault(season, []).append(episode_data)
+        blobs[f'episode/{season}/{episode}'] = encode(episode_data)
+        blobs[f'episode/{season}/{episode}/columnar'] = encode_episode(episode_data)
+
+        stats['totals']['episode'] += 1
+        stats['totals']['scene'] += len(scenes)
+        stats['totals']['quote'] += sum(len(scene['quotes']) for scene in scenes)
+    stats['totals']['season'] = len(seasons)
+    scene_starts.append(len(encoded_quotes))
+
+    quote_offsets = array('I', [0])
+    for encoded_quote in encoded_quotes:
+        quote_offsets.append(quote_offsets[-1] + len(encoded_quote))
+    blobs['quotes/meta'] = encode({'count': len(encoded_quotes), 'episodes': episode_scenes})
+    blobs['quotes'] = b''.join(encoded_quotes)
+    blobs['quotes/offsets'] = quote_offsets.tobytes()
+    blobs['quotes/locations'] = quote_locations.tobytes()
+    blobs['quotes/scenes'] = scene_starts.tobytes()
+
+    blobs['stats'] = encode(stats)
+    all_data = [{'season_id': season, 'episodes': episodes} for season, episodes in seasons.items()]
+    blobs['all'] = encode(all_data)
+    blobs['episodes'] = encode([
+        {'season_id': season, 'episodes': [{key: value for key, value in episode.items() if key != 'scenes'}
+                                           for episode in episodes]}
+        for season, episodes in seasons.items()
+    ])
+    blobs['characters'] = encode(character_data)
+    blobs.update(build_search_blobs(season_episode_data))
+
+    for character_id, data in character_data.items():
+        blobs[f'character/{character_id}'] = encode({**data, 'quotes': character_quotes[character_id]})
+        blobs[f'character/{character_id}/ids'] = character_ids[character_id].tobytes()
+        blobs[f'character/{character_id}/scenes'] = character_scenes[character_id].tobytes()
+
+    index: Dict[str, List] = OrderedDict()
+    offset = 0
+    for name, blob in blobs.items():
+        index[name] = [offset, len(blob), hash_bytes(blob)]
+        offset += len(blob)
+    encoded_index = json.dumps({'version': STORE_VERSION, 'blobs': index}, separators=(',', ':')).encode('utf-8')
+
+    with open(path + '.part', 'wb') as store_file:
+        store_file.write(struct.pack('<8sQ', STORE_MAGIC, len(encoded_index)))
+        store_file.write(encoded_index)
+        for blob in blobs.values():
+            store_file.write(blob)
+    os.replace(path + '.part', path)
+
+
+def app_episode_files(path: str, extension: str = '.json') -> List[str]:
+    """The path of every episode file (`NN/NN.json`) in a `build app` output directory, in series order."""
+    files: List[str] = []
+    for season_dir in sorted(filter(str.isdigit, os.listdir(path)), key=int):
+        # Hashed copies & precompressed siblings have more than one dot in their names
+        files += [os.path.join(path, season_dir, filename)
+                  for filename in sorted(os.listdir(os.path.join(path, season_dir)))
+                  if filename.endswith(extension) and filename.count('.') == 1]
+    return files
+
+
+def app_assets(path: str) -> List[str]:
+    """Every file making up the application data in a `build app` output directory, including columnar episodes."""
+    files = [os.path.join(path, name) for name in ['episodes.json', 'characters.json', LAYOUT_JSON]]
+    files += sorted(app_episode_files(path) + app_episode_files(path, '.bin'))
+    character_dir = os.path.join(path, 'character')
+    if os.path.isdir(character_dir):
+        files += [os.path.join(character_dir, filename) for filename in sorted(os.listdir(character_dir))
+                  if filename.endswith('.json') and filename.count('.') == 1]
+    return [file for file in files if os.path.exists(file)]
+
+
+def publish_assets(root: str, files: List[str]) -> None:
+    """Writes hashed copies & precompressed siblings of every file, skipping those unchanged since the last time."""
+    if brotli is None:
+        logger.warning('brotli is not installed; only gzip siblings will be written.')
+    assets = AssetManifest(root)
+    result = assets.publish(files)
+    assets.save()
+    logger.info(f'{result.published} assets published, {result.unchanged} unchanged & {result.removed} removed.')
 
 
 @build.command('app')
 @click.option('--path', type=str, default=BUILD_DIR, help='The output path for the application data files.')
 @click.option('--mega', type=click.Path(file_okay=False, exists=True), default=None, help='The output path for the "mega episode file".')
+@click.option('--store', type=click.Path(file_okay=False, exists=True), default=None,
+              help='The output path for the episode store (including the search index) served by the API.')
 @click.option('--make-dir', is_flag=True, help='Create the output directory if it does not exist.')
-def app(path: str, mega: str, make_dir: bool) -> None:
+@click.option('--force', is_flag=True, help='Rebuild every episode, even if its inputs have not changed.')
+@click.option('--from-truth', is_flag=True,
+              help='Build straight from the truth files and speaker mappings, skipping the compiled files.')
+@click.option('--write-compile', is_flag=True, help='With --from-truth, also write the compiled files.')
+@click.option('--assets', is_flag=True,
+              help='Also write content-hashed copies & gzip/brotli siblings of every file, listed in assets.json.')
+@click.pass_obj
+def app(obj: dict, path: str, mega: str, store: str, make_dir: bool, force: bool, from_truth: bool,
+        write_compile: bool, assets: bool) -> None:
     """Build the data files used by the application."""
     logger.debug('Build process called for "app".')
     logger.debug(f'Output Directory: "{os.path.relpath(path, os.getcwd())}"')
@@ -650,7 +1283,7 @@ def app(path: str, mega: str, make_dir: bool) -> None:
 
     if not os.path.exists(path):
         if path == BUILD_DIR or make_dir:
-            os.makedirs(BUILD_DIR)
+            os.makedirs(path)
             logger.debug('Build directory did not exist; it has been created.')
         else:
             logger.error('The output directory given does not exist.',
@@ -659,135 +1292,144 @@ def app(path: str, mega: str, make_dir: bool) -> None:
         logger.error("The output directory given is not a directory.",
                      click.BadOptionUsage("path", "Path supplied is not a directory."))
 
-    episode_files = os.listdir(COMPILE_DIR)
-    logger.debug(f'Beginning processing of {len(episode_files)} compiled episode directories.')
+    if write_compile and not from_truth:
+        raise click.BadOptionUsage('write_compile', '--write-compile can only be used with --from-truth.')
+
+    # Only the episodes in the layout are built, in series order; stray files of episodes no longer there are ignored.
+    layout = load_layout()
+    source_dir = EPISODES_DIR if from_truth else COMPILE_DIR
+    available = {episode_key(file): file for file in os.listdir(source_dir) if not file.endswith('.part')}
+    for season, episode in layout.episodes():
+        if (season, episode) not in available:
+            logger.warning(f'Season {season}, episode {episode} has no {"truth" if from_truth else "compiled"} file.')
+        elif episode_description(episode_desc, season, episode) is None:
+            logger.warning(f'Season {season}, episode {episode} has no description.')
+    episode_files = [available[key] for key in layout.episodes() if key in available]
+    logger.debug(f'Beginning processing of {len(episode_files)} {"truth" if from_truth else "compiled"} episode files.')
 
     progress = Progress(SpinnerColumn('dots10'), *Progress.get_default_columns(), MofNCompleteColumn(),
                         TimeElapsedColumn())
 
-    all_season_data: List[List[dict]] = [[] for _ in episode_desc]
+    # (season, episode) -> episode data
+    built: Dict[Tuple[int, int], dict] = {}
 
     no_char_data = OrderedDict()
     all_appearances = Counter()
 
-    with progress:
-        for episodeFile in progress.track(episode_files, description='Building Episodes', update_period=0.01):
-            with open(os.path.join(COMPILE_DIR, episodeFile), 'r') as ep_file:
-                episode_root: etree.ElementBase = etree.parse(ep_file)
-
-            seasonNum, episodeNum = map(int, re.match(r'(\d+)-(\d+)\.xml', episodeFile).groups())
-            description = episode_desc[seasonNum - 1][episodeNum - 1]
-
-            # Count character appearances
-            characters = Counter()
-            all_characters = episode_root.xpath('./Scene/Quote/Speaker/Characters/Character')
-            for character in all_characters:
-                character_type = character.attrib['type']
-                if character_type in ['main', 'recurring']:
-                    characters[character.text] += 1
-
-            episode_characters: Dict[str, Dict[str, Union[str, int]]] = {}
-            for character_id, count in sorted(characters.items(), key=lambda item: item[1], reverse=True):
-                if character_id in character_desc.keys():
-                    character_name = character_desc[character_id]['name']
-                else:
-                    print(f'No character description: {character_id}')
-                    character_name = f'\"{character_id.capitalize()}\"'
-                    no_char_data[character_id] = None
-
-                episode_characters[character_id] = {
-                    'name': character_name,
-                    'appearances': count
-                }
-
-            scenes = []
-            for scene in episode_root.xpath('./Scene'):
-                quotes = []
-
-                for quote in scene.xpath('./Quote'):
-                    speaker_text = quote.xpath('./Speaker/SpeakerText')[0]
-                    is_annotated = speaker_text.attrib['annotated'] == 'true'
-                    quote_text = quote.find('QuoteText').text
-
-                    quote_json = {
-                        'speaker': speaker_text.text,
-                        'text': quote_text,
-                        "isAnnotated": is_annotated
-                    }
-
-                    if is_annotated:
-                        character_elements = quote.xpath('./Speaker/Characters/Character')
-                        split_speaker_text: List[str] = re.split(r'({[^}]+})', speaker_text.text)
-                        if len(split_speaker_text[0]) == 0: del split_speaker_text[0]
-                        if len(split_speaker_text[-1]) == 0: del split_speaker_text[-1]
-                        text_start: int = 0 if split_speaker_text[0].startswith('{') else 1
-
-                        # {Jim}, {Dwight}, and {Andy}'s Computer
-                        # [jim, dwight, andy]
-                        # -> {jim}, {dwight}, and {andy}'s Computer
-
-                        quote_json['characters'] = {
-                            character.text: None for character in character_elements
-                        }
-
-                        for i, character in enumerate(character_elements):
-                            index = text_start + (i * 2)
-                            quote_json['characters'][character.text] = split_speaker_text[index][1:-1]
-                            split_speaker_text[index] = '{' + character.text + '}'
-
-                        quote_json['speaker'] = ''.join(split_speaker_text)
-                    else:
-                        quote_json['character'] = quote.xpath('./Speaker/Characters/Character/text()')[0]
-
-                    quotes.append(quote_json)
-                scenes.append({'quotes': quotes})
-
-            all_season_data[seasonNum - 1].append({
-                'title': description['title'],
-                'description': description['description'],
-                'characters': episode_characters,
-                'seasonNumber': seasonNum,
-                'episodeNumber': episodeNum,
-                "scenes": scenes
-            })
-
-            all_appearances += characters
-
-    season_episode_data: List[Tuple[int, int, Any]] = []
-    for season_data in all_season_data:
-        for episode_data in season_data:
-            season, episode = episode_data['seasonNumber'], episode_data['episodeNumber']
-            season_episode_data.append((season, episode, episode_data))
-
-    mega_file_data: List[List[Any]] = [[None for _ in range(count)] for count in EPISODE_COUNTS]
+    manifest = BuildManifest.load(ConstantPaths.BUILD_MANIFEST)
+    manifest.artifact(ConstantPaths.EP_DESC)
+    character_desc_digest = manifest.artifact(ConstantPaths.CHAR_DESC)
+    episode_digests: Dict[str, str] = {}
+
+    # Building from truth files depends on the speakers each episode resolves, just like compiling does.
+    speaker_fingerprints: Dict[str, str] = {}
+    truth_digests: Dict[str, str] = {}
+    if from_truth:
+        if write_compile and not os.path.exists(COMPILE_DIR):
+            os.makedirs(COMPILE_DIR)
+        speaker_fingerprints = load_speaker_table().fingerprints()
+        manifest.artifact(ConstantPaths.SPEAKER_MAPPING)
+        manifest.artifact(ConstantPaths.IDENTIFIERS)
+
+    def truth_digest(file: str, episode_speakers: List[str]) -> str:
+        return hash_strings(truth_digests[file], *(speaker_fingerprints.get(speaker, '') for speaker in episode_speakers))
+
+    def record_key(file: str) -> str:
+        """Records are kept per output file, so builds to other paths (or in another mode) keep their own."""
+        season, episode = episode_key(file)
+        return os.path.join(os.path.abspath(path), f'{season:02}', f'{episode:02}.json')
+
+    def episode_digest(file: str, description: dict, episode_speakers: Optional[List[str]] = None) -> str:
+        if from_truth:
+            source = 'truth:' + truth_digest(file, episode_speakers) + (':compile' if write_compile else '')
+        else:
+            source = manifest.hash_file(os.path.join(COMPILE_DIR, file))
+        return hash_strings(os.path.abspath(path), source, json.dumps(description, sort_keys=True),
+                            character_desc_digest)
 
     with progress:
-        for season, episode, episode_data in progress.track(season_episode_data, description='Saving episode data...',
-                                                            update_period=0.1):
-            mega_file_data[season - 1][episode - 1] = episode_data
-
-            season_directory = os.path.join(path, f'{season:02}')
-            if not os.path.exists(season_directory):
-                os.makedirs(season_directory)
+        for episodeFile in progress.track(episode_files, description='Checking Episodes', update_period=0.01):
+            seasonNum, episodeNum = episode_key(episodeFile)
+            description = describe_episode(episode_desc, seasonNum, episodeNum)
+
+            episode_path = os.path.join(path, f'{seasonNum:02}', f'{episodeNum:02}.json')
+            outputs = [episode_path]
+            record = manifest.get('app', record_key(episodeFile))
+            if from_truth:
+                truth_digests[episodeFile] = manifest.hash_file(os.path.join(EPISODES_DIR, episodeFile))
+                if write_compile:
+                    outputs.append(os.path.join(COMPILE_DIR, episodeFile))
+                if record is None or 'speakers' not in record:
+                    episode_digests[episodeFile] = ''
+                    continue
+                digest = episode_digest(episodeFile, description, record['speakers'])
+            else:
+                digest = episode_digest(episodeFile, description)
 
-            episode_path = os.path.join(season_directory, f'{episode:02}.json')
+            # Unchanged episodes are read back from their previous output instead of being rebuilt.
+            if not force and manifest.is_fresh('app', record_key(episodeFile), digest, outputs):
+                with open(episode_path, 'r') as episode_file:
+                    built[(seasonNum, episodeNum)] = json.load(episode_file)
+            else:
+                episode_digests[episodeFile] = digest
+
+    for result in map_tasks(build_episode, episode_digests.keys(), obj['jobs'], 'Building Episodes',
+                            initializer=init_app_worker, initargs=(path, from_truth, write_compile)):
+        if result.error is not None:
+            logger.error(f"Failed while processing `{result.item}`", exc_info=result.error)
+            manifest.discard('app', record_key(result.item))
+            if write_compile:
+                manifest.discard('compile', result.item)
+            continue
+
+        episode_data, missing_characters, episode_speakers = result.value
+        for character_id in missing_characters:
+            print(f'No character description: {character_id}')
+            no_char_data[character_id] = None
+
+        built[(episode_data['seasonNumber'], episode_data['episodeNumber'])] = episode_data
+        if from_truth:
+            description = describe_episode(episode_desc, episode_data['seasonNumber'], episode_data['episodeNumber'])
+            manifest.record('app', record_key(result.item), episode_digest(result.item, description, episode_speakers),
+                            speakers=episode_speakers)
+            # Compiled files written along the way are as good as the compile stage's own.
+            if write_compile:
+                manifest.record('compile', result.item, truth_digest(result.item, episode_speakers),
+                                speakers=episode_speakers)
+        else:
+            manifest.record('app', record_key(result.item), episode_digests[result.item])
 
-            with open(episode_path, 'w') as episode_file:
-                json.dump(episode_data, episode_file)
+    manifest.prune('app', map(record_key, episode_files), prefix=os.path.join(os.path.abspath(path), ''))
+    manifest.save()
+    logger.debug(f'{len(episode_digests)} episodes built, {len(episode_files) - len(episode_digests)} unchanged '
+                 f'episodes skipped.')
 
+    season_episode_data: List[Tuple[int, int, Any]] = []
+    for season, episode in layout.episodes():
+        if (season, episode) not in built:
+            continue
+        episode_data = built[(season, episode)]
+        season_episode_data.append((season, episode, episode_data))
+        all_appearances.update({character_id: character['appearances']
+                                for character_id, character in episode_data['characters'].items()})
+
+    # Only episodes that were built are in the application's layout, so it never links to a missing episode.
+    app_layout = Layout.from_episodes(built.keys())
+    app_layout.save(os.path.join(path, LAYOUT_JSON))
+
+    # Both are grouped by season, each season listing only the episodes it has.
     if mega is not None:
         with open(os.path.join(mega, 'data.json'), 'w') as mega_file:
-            json.dump(mega_file_data, mega_file)
+            json.dump(app_layout.group(built), mega_file)
         logger.debug('Mega data file written.')
 
     episodes_path = os.path.join(path, 'episodes.json')
     included: List[str] = ['characters', 'description', 'title', 'episodeNumber', 'seasonNumber']
-    basic_episode_data = [[None for _ in range(count)] for count in EPISODE_COUNTS]
-    for season, episode, episode_data in season_episode_data:
-        basic_episode_data[season - 1][episode - 1] = {key: episode_data[key] for key in included}
+    basic_episode_data = {key: {field: episode_data[field] for field in included}
+                          for key, episode_data in built.items()}
 
     with open(episodes_path, 'w') as episodes_file:
-        json.dump(basic_episode_data, episodes_file)
+        json.dump(app_layout.group(basic_episode_data), episodes_file)
 
     character_path = os.path.join(path, 'characters.json')
     character_folder = os.path.join(path, 'character')
@@ -812,62 +1454,186 @@ def app(path: str, mega: str, make_dir: bool) -> None:
         with open(character_path, 'w') as file:
             json.dump(data, file)
 
+    if store is not None:
+        write_episode_store(os.path.join(store, Constants.EPISODE_STORE), season_episode_data, character_data)
+        logger.debug('Episode store written.')
+
+    if assets:
+        publish_assets(path, app_assets(path))
+
+
+def read_app_episodes(path: str) -> List[Tuple[int, int, dict]]:
+    """Reads back every episode file written by `build app`, in series order."""
+    season_episode_data: List[Tuple[int, int, dict]] = []
+    for episode_path in app_episode_files(path):
+        with open(episode_path, 'r') as file:
+            episode_data = json.load(file)
+        season_episode_data.append((episode_data['seasonNumber'], episode_data['episodeNumber'], episode_data))
+    return season_episode_data
+
+
+@build.command('algolia')
+@click.option('--path', type=click.Path(file_okay=False, exists=True), default=BUILD_DIR,
+              help='The application data built by `build app`.')
+@click.option('-o', '--output', type=click.Path(file_okay=False), default=os.path.join(BUILD_DIR, 'algolia'),
+              help='The output path for the exported records, changes & export state.')
+@click.option('--chunk-size', type=int, default=10000, help='Records per NDJSON file.')
+@click.option('--full', is_flag=True, help='Ignore the previous export, treating every record as changed.')
+@click.option('--push', is_flag=True, help='Send the changes to the index instead of only writing them.')
+@click.option('--index', type=str, default=lambda: os.getenv('ALGOLIA_INDEX', 'prod_THEOFFICEQUOTES'),
+              help='The index changes are pushed to.')
+@click.option('--batch-size', type=int, default=1000, help='Operations sent per batch request.')
+@click.option('-c', '--concurrency', type=int, default=4, help='Number of batch requests sent at once.')
+@click.option('--retries', type=int, default=3, help='Retries for failed or throttled batches, with backoff.')
+@click.option('--api-url', type=str, default=lambda: os.getenv('ALGOLIA_API_URL'),
+              help='Base URL of the Algolia API (by default, that of the application), or a stand-in server '
+                   'implementing the batch route.')
+def algolia(path: str, output: str, chunk_size: int, full: bool, push: bool, index: str, batch_size: int,
+            concurrency: int, retries: int, api_url: Optional[str]) -> None:
+    """
+    Export a search record per quote as NDJSON, along with the changes since the previous export.
+
+    records-*.ndjson always holds every record; changes-*.ndjson holds batch operations for only the records added,
+    changed or removed since the previous export or, when pushing, since the index last acknowledged them.
+    """
+    os.makedirs(output, exist_ok=True)
+    season_episode_data = read_app_episodes(path)
+    records = [(record, encode_record(record)) for record in quote_records(season_episode_data)]
+    logger.debug(f'{len(records)} records flattened from {len(season_episode_data)} episodes.')
+
+    # Exports are diffed against the previous export, pushes against what the index last acknowledged.
+    exported = ExportState.load(os.path.join(output, 'export.json'))
+    pushed_state = ExportState.load(os.path.join(output, 'pushed.json'))
+    baseline = pushed_state if push else exported
+    if full:
+        baseline.digests = {}
+
+    diff, digests = diff_records(records, baseline.digests)
+    record_files = write_chunks((encoded for _, encoded in records), output, 'records', chunk_size)
+    change_files = write_chunks((encode_record(operation) for operation in diff.operations), output, 'changes',
+                                chunk_size)
+    exported.digests = digests
+    exported.save()
+    logger.info(f'{len(records)} records written to {len(record_files)} files; {diff.added} added, {diff.updated} '
+                f'changed, {diff.deleted} removed & {diff.unchanged} unchanged ({len(change_files)} change files).')
+
+    if not push:
+        return
+    if len(diff.operations) == 0:
+        logger.info('Nothing to push.')
+        return
+
+    app_id = os.getenv('ALGOLIA_APP_ID')
+    if api_url is None:
+        if app_id is None:
+            raise click.UsageError('ALGOLIA_APP_ID must be set (or --api-url given) to push records.')
+        api_url = f'https://{app_id}.algolia.net'
+    client = AlgoliaClient(app_id, os.getenv('ALGOLIA_ADMIN_API_KEY'), api_url, concurrency=concurrency,
+                           retries=retries)
+
+    batches = [diff.operations[i:i + batch_size] for i in range(0, len(diff.operations), batch_size)]
+    pushed, failed = 0, 0
+    try:
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            futures = {pool.submit(client.batch, index, batch): batch for batch in batches}
+            for future in track(as_completed(futures), f'Pushing {len(batches)} batches...', total=len(batches)):
+                batch = futures[future]
+                try:
+                    future.result()
+                    pushed_state.apply(batch, digests)
+                    pushed += len(batch)
+                except Exception as e:
+                    logger.error(f'Failed to push a batch of {len(batch)} operations', exc_info=e)
+                    failed += len(batch)
+    finally:
+        # Only delivered operations are recorded, so anything that failed is part of the next push.
+        pushed_state.save()
+        client.close()
+
+    logger.info(f'{pushed} operations pushed to "{index}", {failed} failed.')
+
+
+@build.command('columnar')
+@click.option('--path', type=click.Path(file_okay=False, exists=True), default=BUILD_DIR,
+              help='The application data built by `build app`.')
+@click.option('-o', '--output', type=click.Path(file_okay=False), default=None,
+              help='The output path for the columnar episode files, by default alongside the JSON files.')
+@click.option('--compare', is_flag=True, help='Report the size & parse time of both formats.')
+@click.option('--assets', is_flag=True,
+              help='Also write content-hashed copies & gzip/brotli siblings of every file, as `build app --assets`.')
+def columnar(path: str, output: Optional[str], compare: bool, assets: bool) -> None:
+    """Write every episode built by `build app` in the compact columnar format (see columnar.py)."""
+    output = output or path
+    sizes = {'json': [0, 0], 'columnar': [0, 0]}
+    parse_times = {'json': 0.0, 'columnar': 0.0}
+
+    for episode_path in app_episode_files(path):
+        output_path = os.path.join(output, os.path.relpath(episode_path, path))[:-len('.json')] + '.bin'
+        os.makedirs(os.path.dirname(output_path), exist_ok=True)
+        with open(episode_path, 'rb') as file:
+            encoded_json = file.read()
+        encoded_columnar = encode_episode(json.loads(encoded_json))
+        with open(output_path, 'wb') as file:
+            file.write(encoded_columnar)
+
+        if compare:
+            for name, data, load in [('json', encoded_json, json.loads),
+                                     ('columnar', encoded_columnar, decode_episode)]:
+                sizes[name][0] += len(data)
+                sizes[name][1] += len(gzip.compress(data))
+                start = time.perf_counter()
+                load(data)
+                parse_times[name] += time.perf_counter() - start
+
+    if compare:
+        table = Table('Format', 'Size', 'Gzipped', 'Parse Time')
+        for name, label in [('json', 'JSON'), ('columnar', 'Columnar')]:
+            table.add_row(label, f'{sizes[name][0] / (1024 * 1024):.2f} MB',
+                          f'{sizes[name][1] / (1024 * 1024):.2f} MB', f'{parse_times[name] * 1000:.0f} ms')
+        Console().print(table)
+
+    if assets:
+        publish_assets(output, app_assets(output))
+
 
 @build.command('media')
 @click.option('--suppress/--no-suppress', default=True, help='Disable stdout suppression for image magick commandline output.')
 @click.option('--copy/--no-copy', default=True, help='Complete the copying stage.')
 @click.option('--thumbnail/--no-thumbnail', default=True, help='Complete the thumbnailing stage.')
+@click.option('--variants/--no-variants', default=True,
+              help='Complete the responsive variants stage, listing every variant in variants.json.')
+@click.option('--widths', default=','.join(map(str, VARIANT_WIDTHS)), show_default=True,
+              help='Comma separated widths of the responsive variants.')
+@click.option('--format', 'formats', type=click.Choice(list(VARIANT_FORMATS.keys())), multiple=True,
+              default=list(VARIANT_FORMATS.keys()), show_default=True, help='Formats of the responsive variants.')
+@click.option('--force', is_flag=True, help='Run every operation, even if its output is already up to date.')
+@click.option('--backend', type=click.Choice(BACKENDS), default='magick',
+              help='Spawn `magick` for every output, or process each source image once in-process with Pillow.')
+@click.option('--compare', is_flag=True,
+              help='Run every operation through both backends into scratch directories and report time & size.')
+@click.option('--assets', is_flag=True, help='Also write content-hashed copies of every image, listed in assets.json.')
 @click.argument('path', type=click.Path(file_okay=False))
-def media(path: str, suppress: bool, copy: bool, thumbnail: bool) -> None:
-    def get_fullsize_args(input_path: str, output_path: str) -> List[str]:
-        return ['magick',
-                input_path,
-                '-gravity', 'Center',
-                '-crop', '1:1+0+0',
-                '+repage',
-                '-quality', '95',
-                '-interlace', 'none',
-                '-colorspace', 'sRGB',
-                '-strip',
-                output_path]
-
-    def get_thumbnailing_args(input_path: str, output_path: str, geometry: str = '156') -> List[str]:
-        return [
-            'magick',
-            input_path,
-            '-gravity', 'Center',
-            '-crop', '1:1+0+0',
-            '+repage',
-            '-filter', 'Triangle',
-            '-define', 'filter:support=2',
-            '-thumbnail', geometry,
-            '-unsharp', '0.25x0.25+8+0.065',
-            '-dither', 'None',
-            '-posterize', '136',
-            '-quality', '82',
-            '-define', 'jpeg:fancy-upsampling=off',
-            '-define', 'png:compression-filter=5',
-            '-define', 'png:compression-level=9',
-            '-define', 'png:compression-strategy=1',
-            '-define', 'png:exclude-chunk=all',
-            '-interlace', 'none',
-            '-colorspace', 'sRGB',
-            '-strip',
-            output_path,
-        ]
-
-    if not (copy or thumbnail):
-        logger.error('Both copy and thumbnail stages are disabled. Quitting early.')
+@click.pass_obj
+def media(obj: dict, path: str, suppress: bool, copy: bool, thumbnail: bool, variants: bool, widths: str,
+          formats: Tuple[str, ...], force: bool, backend: str, compare: bool, assets: bool) -> None:
+    if not (copy or thumbnail or variants):
+        logger.error('The copy, thumbnail and variants stages are all disabled. Quitting early.')
         return
 
+    try:
+        variant_widths = [int(width) for width in widths.split(',')]
+    except ValueError:
+        raise click.BadParameter(f'"{widths}" is not a comma separated list of widths.', param_hint='--widths')
+    os.makedirs(path, exist_ok=True)
+
     with open(ConstantPaths.CHAR_DESC, 'r') as character_desc_file:
         descriptions = json.load(character_desc_file)
 
     character_ids = list(descriptions.keys())
-    operations: List[Tuple[str, str, List[str]]] = []
+    operations: List[ImageOperation] = []
 
     # /img/episode/03/04/full.jpeg
-    all_episodes: List[Tuple[int, int]] = [(season + 1, episode + 1) for season in range(9) for episode in range(EPISODE_COUNTS[season])]
+    all_episodes: List[Tuple[int, int]] = image_episodes()
 
     progress = Progress(SpinnerColumn('dots10'), *Progress.get_default_columns(), MofNCompleteColumn(),
                         TimeElapsedColumn())
@@ -876,9 +1642,11 @@ def media(path: str, suppress: bool, copy: bool, thumbnail: bool) -> None:
         for season, episode in progress.track(all_episodes, description='Preparing epsiode image operations...'):
             # Find what images are available, select the one with the lowest integer
             episode_dir = os.path.join(IMG_EPISODES_DIR, f'{season:02}', f'{episode:02}')
-            if not os.path.exists(episode_dir):
-                os.makedirs(episode_dir)
-            images_available = os.listdir(episode_dir)
+            images_available = [file for file in os.listdir(episode_dir) if not file.endswith('.part')] \
+                if os.path.exists(episode_dir) else []
+            if len(images_available) == 0:
+                logger.warning(f'No stills fetched for season {season}, episode {episode}; skipping its images.')
+                continue
             images_available.sort(key=lambda x: int(x.split('.')[0]))
 
             input_path: str = os.path.join(episode_dir, images_available[0])
@@ -891,13 +1659,13 @@ def media(path: str, suppress: bool, copy: bool, thumbnail: bool) -> None:
             output_thumb_path: str = os.path.join(output_dir, 'thumbnail.jpeg')
 
             if copy:
-                args = get_fullsize_args(input_path, output_full_path)
-                operations.append((input_path, output_full_path, args))
+                operations.append(fullsize_operation(input_path, output_full_path))
             if thumbnail:
-                args = get_thumbnailing_args(input_path, output_thumb_path)
-                operations.append((input_path, output_thumb_path, args))
+                operations.append(thumbnail_operation(input_path, output_thumb_path))
+            if variants:
+                operations.extend(variant_operations(input_path, output_dir, 'full', variant_widths, list(formats)))
 
-    character_folders: List[str] = abslistdir(IMG_CHARACTERS_DIR)
+    character_folders: List[str] = abslistdir(IMG_CHARACTERS_DIR) if os.path.exists(IMG_CHARACTERS_DIR) else []
     filetype_preference: List[str] = ['jpeg', 'jpg', 'png', 'webp', 'gif', 'bmp']
 
     def select_by_preference(x: str) -> int:
@@ -974,49 +1742,82 @@ def media(path: str, suppress: bool, copy: bool, thumbnail: bool) -> None:
                 output_full_path: str = os.path.join(output_dir, 'full.jpeg')
                 output_face_path: str = os.path.join(output_dir, 'face.jpeg')
 
-                full_args = get_fullsize_args(full_file, output_full_path)
-                face_args = get_fullsize_args(face_file, output_face_path)
-
-                operations.append((full_file, output_full_path, full_args))
-                operations.append((face_file, output_face_path, face_args))
+                operations.append(fullsize_operation(full_file, output_full_path))
+                operations.append(fullsize_operation(face_file, output_face_path))
 
             if thumbnail:
                 output_full_thumb_path: str = os.path.join(output_dir, 'full_thumb.jpeg')
                 output_face_thumb_path: str = os.path.join(output_dir, 'face_thumb.jpeg')
 
-                full_thumb_args = get_thumbnailing_args(full_file, output_full_thumb_path)
-                face_thumb_args = get_thumbnailing_args(face_file, output_face_thumb_path)
-
-                operations.append((full_file, output_full_thumb_path, full_thumb_args))
-                operations.append((face_file, output_face_thumb_path, face_thumb_args))
+                operations.append(thumbnail_operation(full_file, output_full_thumb_path))
+                operations.append(thumbnail_operation(face_file, output_face_thumb_path))
+
+            if variants:
+                operations.extend(variant_operations(full_file, output_dir, 'full', variant_widths, list(formats)))
+                operations.extend(variant_operations(face_file, output_dir, 'face', variant_widths, list(formats)))
+
+    if compare:
+        logger.info(f'Comparing backends over {len(operations)} operations.')
+        kinds = ['full', 'thumbnail', 'variant']
+        table = Table('Backend', 'Time', 'Completed', 'Failed', *(kind.capitalize() for kind in kinds), 'Total')
+        for report in compare_backends(operations, path, jobs=obj['jobs'], suppress=suppress):
+            sizes = [report.sizes.get(kind, 0) for kind in kinds]
+            table.add_row(report.backend, f'{report.elapsed:.2f}s', str(report.completed), str(report.failed),
+                          *(f'{size / (1024 * 1024):.2f} MB' for size in sizes),
+                          f'{sum(sizes) / (1024 * 1024):.2f} MB')
+        Console().print(table)
+        return
 
     logger.debug(f'Starting {len(operations)} operations.')
-    sp_kwargs = {'capture_output': True, 'text': True} if suppress else {}
+    manifest = BuildManifest.load(ConstantPaths.BUILD_MANIFEST)
+    started = time.perf_counter()
 
     with progress:
         logger.debug('Beginning "smart copying"...')
         task = progress.add_task(description='Wait...', total=len(operations))
 
-        for input, output, args in operations:
-            try:
-                rel_output = os.path.relpath(output, start=path)
-                progress.update(task, description=rel_output, advance=1)
-                completed = subprocess.run(args, **sp_kwargs, check=True)
-            except Exception as e:
-                logger.error('Failed to process operation.', exc_info=e)
-                logger.error(f'Input: "{input}"')
-                logger.error(f'Output: "{output}"')
-                logger.error(f'Args: "{" ".join(args)}"')
-                if type(e) is subprocess.CalledProcessError:
-                    logger.error(f'Stdout: "{e.stdout.rstrip()}"')
-                    logger.error(f'Stderr: "{e.stderr.rstrip()}"')
-
-    with progress:
-        output_paths = [y for x, y, z in operations]
+        def advance(result: OperationResult) -> None:
+            rel_output = os.path.relpath(result.operation.output, start=path)
+            progress.update(task, description=rel_output, advance=1)
 
-        file_sizes = []
-        for path in progress.track(output_paths, description='Acquiring sizes...'):
-            file_sizes.append(os.stat(path).st_size)
+        try:
+            results = run_operations(operations, manifest, jobs=obj['jobs'], force=force, suppress=suppress,
+                                     backend=backend, on_complete=advance)
+        finally:
+            manifest.save()
+
+    elapsed = time.perf_counter() - started
+    completed = [result for result in results if not result.skipped and result.error is None]
+    failed = [result for result in results if result.error is not None]
+    skipped = len(results) - len(completed) - len(failed)
+
+    for result in failed:
+        operation, e = result.operation, result.error
+        logger.error('Failed to process operation.', exc_info=e)
+        logger.error(f'Input: "{operation.input}"')
+        logger.error(f'Output: "{operation.output}"')
+        logger.error(f'Args: "{" ".join(operation.args)}"')
+        if type(e) is subprocess.CalledProcessError and e.stdout is not None:
+            logger.error(f'Stdout: "{e.stdout.rstrip()}"')
+            logger.error(f'Stderr: "{e.stderr.rstrip()}"')
+
+    operation_time = sum(result.duration for result in completed)
+    output_size = sum(os.stat(result.operation.output).st_size for result in completed)
+    logger.info(f'{len(completed)} operations completed, {skipped} up to date, {len(failed)} failed '
+                f'in {elapsed:.2f}s with {obj["jobs"]} {backend} workers.')
+    if completed:
+        slowest = max(completed, key=lambda result: result.duration)
+        logger.info(f'{operation_time:.2f}s of operation time, {operation_time / len(completed):.3f}s on average; '
+                    f'slowest was {os.path.relpath(slowest.operation.output, start=path)} '
+                    f'({slowest.duration:.2f}s). {output_size / (1024 * 1024):.2f} MB written.')
+
+    if variants:
+        variant_manifest = write_variant_manifest(path, operations)
+        image_count = sum(len(images) for images in variant_manifest['images'].values())
+        logger.info(f'{image_count} images with responsive variants listed in {VARIANT_MANIFEST_JSON}.')
+
+    if assets:
+        publish_assets(path, [operation.output for operation in operations if os.path.exists(operation.output)])
 
 
 if __name__ == '__main__':
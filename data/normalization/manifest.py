@@ -0,0 +1,108 @@
+import hashlib
+import json
+import os
+from typing import Dict, Iterable, List, Optional
+
+
+def hash_bytes(data: bytes) -> str:
+    """Returns a short, stable hex digest for the given bytes."""
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+def hash_strings(*values: str) -> str:
+    """Returns a digest over many strings, each terminated so that ('ab', 'c') and ('a', 'bc') differ."""
+    hasher = hashlib.blake2b(digest_size=16)
+    for value in values:
+        hasher.update(value.encode('utf-8'))
+        hasher.update(b'\0')
+    return hasher.hexdigest()
+
+
+class BuildManifest:
+    """
+    Records the content hashes of the inputs used to produce each output of a stage.
+
+    Each stage keeps a record per key (usually an episode filename) holding the digest of every input that went into
+    it, alongside any stage specific data needed to re-check the record later. File hashes are cached by size and
+    modification time so unchanged files are never re-read.
+    """
+    VERSION = 2
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self.root = os.path.dirname(os.path.abspath(path))
+        self.files: Dict[str, List] = {}
+        self.artifacts: Dict[str, str] = {}
+        self.stages: Dict[str, Dict[str, dict]] = {}
+
+    @classmethod
+    def load(cls, path: str) -> 'BuildManifest':
+        """Loads a manifest from disk, starting empty if it does not exist or is from an older version."""
+        manifest = cls(path)
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as manifest_file:
+                try:
+                    data = json.load(manifest_file)
+                except ValueError:
+                    data = {}
+
+            if data.get('version') == cls.VERSION:
+                manifest.files = data.get('files', {})
+                manifest.artifacts = data.get('artifacts', {})
+                manifest.stages = data.get('stages', {})
+        return manifest
+
+    def save(self) -> None:
+        with open(self.path, 'w', encoding='utf-8') as manifest_file:
+            json.dump({
+                'version': self.VERSION,
+                'files': self.files,
+                'artifacts': self.artifacts,
+                'stages': self.stages
+            }, manifest_file, indent=1, sort_keys=True)
+
+    def _key(self, path: str) -> str:
+        return os.path.relpath(os.path.abspath(path), self.root).replace(os.sep, '/')
+
+    def hash_file(self, path: str) -> str:
+        """Returns the content hash of a file, only reading it if its size or modification time changed."""
+        key = self._key(path)
+        stat = os.stat(path)
+        cached = self.files.get(key)
+        if cached is not None and cached[0] == stat.st_size and cached[1] == stat.st_mtime_ns:
+            return cached[2]
+
+        with open(path, 'rb') as file:
+            digest = hash_bytes(file.read())
+        self.files[key] = [stat.st_size, stat.st_mtime_ns, digest]
+        return digest
+
+    def artifact(self, path: str) -> str:
+        """Hashes a shared artifact (mappings, descriptions) and records it as such."""
+        digest = self.hash_file(path)
+        self.artifacts[self._key(path)] = digest
+        return digest
+
+    def get(self, stage: str, key: str) -> Optional[dict]:
+        return self.stages.get(stage, {}).get(key)
+
+    def is_fresh(self, stage: str, key: str, digest: str, outputs: Iterable[str]) -> bool:
+        """True if the record for this key was built from identical inputs and all of its outputs still exist."""
+        record = self.get(stage, key)
+        if record is None or record.get('digest') != digest:
+            return False
+        return all(os.path.exists(output) for output in outputs)
+
+    def record(self, stage: str, key: str, digest: str, **extra) -> None:
+        self.stages.setdefault(stage, {})[key] = {'digest': digest, **extra}
+
+    def discard(self, stage: str, key: str) -> None:
+        self.stages.get(stage, {}).pop(key, None)
+
+    def prune(self, stage: str, keys: Iterable[str], prefix: str = '') -> None:
+        """Drops records for keys that no longer exist in the stage's inputs, only among keys starting with a prefix."""
+        keep = set(keys)
+        records = self.stages.get(stage, {})
+        for key in list(records.keys()):
+            if key.startswith(prefix) and key not in keep:
+                del records[key]
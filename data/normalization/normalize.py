@@ -0,0 +1,37 @@
+"""
+normalize.py
+
+Fast transcript text normalization, producing exactly what helpers.char_filter does.
+
+char_filter decides what every character becomes independently of the others, so the decision is made once per
+codepoint and kept in a translation table that is filled in lazily, leaving `str.translate` to do the rest.
+"""
+import re
+import unicodedata
+
+import unidecode
+
+LATIN = re.compile('[a-zA-Z]+')
+
+
+class CleanTable(dict):
+    """A `str.translate` table mapping each codepoint to its replacement, computed the first time it is seen."""
+
+    def __missing__(self, codepoint: int) -> str:
+        char = chr(codepoint)
+        decoded = unidecode.unidecode(char)
+        # Characters transliterating to letters (accented letters, mostly) are kept as they are.
+        replacement = char if LATIN.match(decoded) else decoded
+        self[codepoint] = replacement
+        return replacement
+
+
+CLEAN_TABLE = CleanTable()
+
+
+def clean_string(s: str) -> str:
+    """Returns a clean string, devoid of ugly Unicode characters."""
+    # ASCII is left alone by both NFC normalization and unidecode.
+    if s.isascii():
+        return s
+    return unicodedata.normalize('NFC', s).translate(CLEAN_TABLE)
@@ -0,0 +1,66 @@
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Any, Callable, Iterable, List, NamedTuple, Optional, Tuple
+
+from rich.progress import track
+
+import profiling
+
+
+class TaskResult(NamedTuple):
+    """The outcome of a single per-episode task. Exactly one of `value` and `error` is meaningful."""
+    item: Any
+    value: Any
+    error: Optional[BaseException]
+
+
+def resolve_jobs(jobs: int) -> int:
+    """Translates a --jobs value into a worker count; zero or less means one worker per core."""
+    if jobs <= 0:
+        return os.cpu_count() or 1
+    return jobs
+
+
+def map_tasks(func: Callable[[Any], Any], items: Iterable[Any], jobs: int = 1, description: str = 'Working...',
+              initializer: Optional[Callable[..., None]] = None, initargs: Tuple = ()) -> List[TaskResult]:
+    """
+    Runs `func` over every item, in worker processes if more than one job is requested.
+
+    The initializer runs once per worker (or once in-process for a single job) and is where shared state such as
+    speaker mappings should be loaded. Results are returned in the same order as the items were given, and exceptions
+    are captured per item rather than aborting the remaining work. When profiling, every task is timed where it runs.
+    """
+    items = list(items)
+    results: List[Optional[TaskResult]] = [None] * len(items)
+
+    profiler = profiling.active_profiler
+    if profiler is not None:
+        func = profiling.ProfiledTask(func)
+
+    def result(index: int, value: Any) -> TaskResult:
+        if profiler is not None:
+            value, task = value
+            profiler.task(items[index], task)
+        return TaskResult(items[index], value, None)
+
+    if jobs <= 1 or len(items) <= 1:
+        if initializer is not None:
+            initializer(*initargs)
+
+        for index, item in enumerate(track(items, description)):
+            try:
+                results[index] = result(index, func(item))
+            except Exception as e:
+                results[index] = TaskResult(item, None, e)
+        return results
+
+    with ProcessPoolExecutor(max_workers=min(jobs, len(items)), initializer=initializer, initargs=initargs) as pool:
+        futures = {pool.submit(func, item): index for index, item in enumerate(items)}
+        for future in track(as_completed(futures), description, total=len(items)):
+            index = futures[future]
+            try:
+                results[index] = result(index, future.result())
+            except Exception as e:
+                results[index] = TaskResult(items[index], None, e)
+
+    return results
@@ -0,0 +1,288 @@
+"""
+profiling.py
+
+Opt-in profiling of the pipeline, enabled by `--profile`.
+
+Every command run is a stage, timed (wall & CPU) and measured (peak memory) as a whole, including stages invoked by
+other commands, such as `run_all`. Per-episode tasks run through parallel.map_tasks are each timed in whichever process
+runs them, split into parse, transform & serialize phases, along with the bytes of every file read & written.
+
+The report is written as JSON, keyed by stage & episode so that reports from different runs can be compared directly,
+and summarized as a table against the previous report.
+"""
+import json
+import os
+import platform
+import sys
+import time
+from collections import OrderedDict
+from contextlib import contextmanager, nullcontext
+from functools import wraps
+from typing import Any, Callable, ContextManager, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import click
+from rich.table import Table
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+REPORT_VERSION = 1
+# Transform is whatever part of a task is neither parsing nor serializing.
+PHASES = ['parse', 'transform', 'serialize']
+
+NO_PHASE = nullcontext()
+
+
+class TaskProfile:
+    """The time spent on one per-episode task & the files it read and wrote, by extension."""
+
+    def __init__(self) -> None:
+        self.wall = 0.0
+        self.cpu = 0.0
+        self.phases: Dict[str, float] = {'parse': 0.0, 'serialize': 0.0}
+        self.read: Dict[str, int] = {}
+        self.written: Dict[str, int] = {}
+        self.peak_rss = 0
+
+    def to_json(self) -> dict:
+        phases = {**self.phases, 'transform': max(self.wall - sum(self.phases.values()), 0.0)}
+        return {'wall': self.wall, 'cpu': self.cpu, 'phases': {name: phases[name] for name in PHASES},
+                'read': self.read, 'written': self.written, 'peak_rss': self.peak_rss}
+
+
+# The task being profiled in this process, if any.
+current_task: Optional[TaskProfile] = None
+# The profiler of this invocation; only ever set in the main process.
+active_profiler: Optional['Profiler'] = None
+
+
+def peak_rss(who: str = 'self') -> int:
+    """The peak resident memory in bytes of this process, or of its largest finished child process."""
+    if resource is None:
+        return 0
+    usage = resource.getrusage(resource.RUSAGE_SELF if who == 'self' else resource.RUSAGE_CHILDREN)
+    # Linux reports kilobytes, macOS bytes.
+    return usage.ru_maxrss * (1 if sys.platform == 'darwin' else 1024)
+
+
+def children_cpu() -> float:
+    if resource is None:
+        return 0.0
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime
+
+
+@contextmanager
+def timed_phase(task: TaskProfile, name: str) -> Iterator[None]:
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        task.phases[name] += time.perf_counter() - start
+
+
+def phase(name: str) -> ContextManager:
+    """Attributes the time spent within to a phase (`parse` or `serialize`) of the current task, if profiling."""
+    if current_task is None:
+        return NO_PHASE
+    return timed_phase(current_task, name)
+
+
+def timed(iterable: Iterable, name: str) -> Iterable:
+    """Attributes the time spent producing each item of an iterable (such as a streaming parser) to a phase."""
+    if current_task is None:
+        return iterable
+
+    def generate(task: TaskProfile, iterator: Iterator) -> Iterator:
+        while True:
+            start = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+            finally:
+                task.phases[name] += time.perf_counter() - start
+            yield item
+
+    return generate(current_task, iter(iterable))
+
+
+def count_file(path: str, written: bool = False) -> None:
+    """Counts the size of a file read (or written) by the current task, if profiling."""
+    if current_task is None:
+        return
+    counts = current_task.written if written else current_task.read
+    extension = os.path.splitext(path)[1][1:] or 'other'
+    counts[extension] = counts.get(extension, 0) + os.path.getsize(path)
+
+
+class ProfiledTask:
+    """Wraps a per-episode task to return its value along with its TaskProfile. Picklable, for worker processes."""
+
+    def __init__(self, func: Callable[[Any], Any]) -> None:
+        self.func = func
+
+    def __call__(self, item: Any) -> Tuple[Any, TaskProfile]:
+        global current_task
+        task = current_task = TaskProfile()
+        wall, cpu = time.perf_counter(), time.process_time()
+        try:
+            value = self.func(item)
+        finally:
+            current_task = None
+        task.wall = time.perf_counter() - wall
+        task.cpu = time.process_time() - cpu
+        task.peak_rss = peak_rss()
+        return value, task
+
+
+def activate(profiler: 'Profiler', group: click.MultiCommand) -> None:
+    """Profiles every command under the group & every task run through parallel.map_tasks from now on."""
+    global active_profiler
+    active_profiler = profiler
+    instrument(group, profiler)
+
+
+class Profiler:
+    """Collects the stages & tasks of one invocation into a report."""
+
+    def __init__(self, command: str, jobs: int) -> None:
+        self.command = command
+        self.jobs = jobs
+        self.started = time.time()
+        self.stages: Dict[str, dict] = OrderedDict()
+        self.stack: List[str] = []
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        self.stack.append(name)
+        path = '/'.join(self.stack)
+        stage = self.stages[path] = {'wall': 0.0, 'cpu': 0.0, 'children_cpu': 0.0, 'peak_rss': 0, 'tasks': {}}
+        wall, cpu, child_cpu = time.perf_counter(), time.process_time(), children_cpu()
+        try:
+            yield
+        finally:
+            stage['wall'] = time.perf_counter() - wall
+            stage['cpu'] = time.process_time() - cpu
+            stage['children_cpu'] = children_cpu() - child_cpu
+            stage['peak_rss'] = max(peak_rss(), peak_rss('children'))
+            self.stack.pop()
+
+    def task(self, item: Any, task: TaskProfile) -> None:
+        """Records a finished task against the innermost running stage."""
+        if len(self.stack) > 0:
+            self.stages['/'.join(self.stack)]['tasks'][str(item)] = task.to_json()
+
+    def report(self) -> dict:
+        stages = OrderedDict()
+        for path, stage in self.stages.items():
+            tasks = stage['tasks'].values()
+            totals = {
+                'count': len(tasks),
+                'wall': sum(task['wall'] for task in tasks),
+                'cpu': sum(task['cpu'] for task in tasks),
+                'phases': {name: sum(task['phases'][name] for task in tasks) for name in PHASES},
+                'read': merge_counts(task['read'] for task in tasks),
+                'written': merge_counts(task['written'] for task in tasks)
+            }
+            stages[path] = {**stage, 'totals': totals}
+
+        return {
+            'version': REPORT_VERSION,
+            'command': self.command,
+            'started': time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(self.started)),
+            'environment': {'python': platform.python_version(), 'platform': platform.platform(),
+                            'cpus': os.cpu_count(), 'jobs': self.jobs},
+            'stages': stages
+        }
+
+
+def merge_counts(counts: Iterable[Dict[str, int]]) -> Dict[str, int]:
+    merged: Dict[str, int] = {}
+    for count in counts:
+        for key, value in count.items():
+            merged[key] = merged.get(key, 0) + value
+    return dict(sorted(merged.items()))
+
+
+def instrument(group: click.MultiCommand, profiler: Profiler, prefix: str = '') -> None:
+    """Makes every command under the group a stage of the profiler (named like `build app`), however it is invoked."""
+    for name, command in group.commands.items():
+        if isinstance(command, click.MultiCommand):
+            instrument(command, profiler, f'{prefix}{name} ')
+        elif command.callback is not None:
+            command.callback = staged(command.callback, prefix + name, profiler)
+
+
+def staged(callback: Callable, name: str, profiler: Profiler) -> Callable:
+    @wraps(callback)
+    def wrapper(*args, **kwargs):
+        with profiler.stage(name):
+            return callback(*args, **kwargs)
+
+    return wrapper
+
+
+def load_report(path: str) -> Optional[dict]:
+    """Reads a previous report, if there is one from this version."""
+    if not os.path.exists(path):
+        return None
+    with open(path, 'r', encoding='utf-8') as report_file:
+        try:
+            report = json.load(report_file)
+        except ValueError:
+            return None
+    return report if report.get('version') == REPORT_VERSION else None
+
+
+def save_report(report: dict, path: str) -> None:
+    with open(path + '.part', 'w', encoding='utf-8') as report_file:
+        json.dump(report, report_file, indent=1)
+    os.replace(path + '.part', path)
+
+
+def format_bytes(count: int) -> str:
+    if count < 1024 * 1024:
+        return f'{count / 1024:.1f} KB'
+    return f'{count / (1024 * 1024):.1f} MB'
+
+
+def summary_table(report: dict, previous: Optional[dict] = None) -> Table:
+    """Every stage's time, phases, I/O & memory, with the change in wall time since a previous report."""
+    table = Table('Stage', 'Wall', 'CPU', 'Tasks', *(name.capitalize() for name in PHASES), 'Read', 'Written',
+                  'Peak', 'Δ Wall', title=f'Profile of `{report["command"]}`')
+    previous_stages = previous['stages'] if previous is not None else {}
+    if previous is not None:
+        table.caption = f'Δ against `{previous["command"]}` at {previous["started"]}'
+    for path, stage in report['stages'].items():
+        totals = stage['totals']
+        change = ''
+        if path in previous_stages and previous_stages[path]['wall'] > 0:
+            ratio = stage['wall'] / previous_stages[path]['wall'] - 1
+            change = f'{ratio:+.1%}'
+        table.add_row(
+            '  ' * path.count('/') + path.rsplit('/', 1)[-1],
+            f'{stage["wall"]:.2f}s',
+            f'{stage["cpu"] + stage["children_cpu"]:.2f}s',
+            str(totals['count']) if totals['count'] > 0 else '',
+            *((f'{totals["phases"][name]:.2f}s' if totals['count'] > 0 else '') for name in PHASES),
+            format_bytes(sum(totals['read'].values())) if totals['read'] else '',
+            format_bytes(sum(totals['written'].values())) if totals['written'] else '',
+            format_bytes(stage['peak_rss']),
+            change
+        )
+    return table
+
+
+def slowest_table(report: dict, count: int = 5) -> Optional[Table]:
+    """The slowest tasks of every stage, or None if no stage ran any."""
+    tasks = [(path, item, task) for path, stage in report['stages'].items() for item, task in stage['tasks'].items()]
+    if len(tasks) == 0:
+        return None
+
+    table = Table('Stage', 'Episode', 'Wall', *(name.capitalize() for name in PHASES), title='Slowest Episodes')
+    for path, item, task in sorted(tasks, key=lambda entry: entry[2]['wall'], reverse=True)[:count]:
+        table.add_row(path, item, f'{task["wall"]:.3f}s', *(f'{task["phases"][name]:.3f}s' for name in PHASES))
+    return table
@@ -0,0 +1,99 @@
+import json
+import math
+import re
+from array import array
+from collections import OrderedDict
+from typing import Dict, List, Tuple
+
+from normalize import clean_string
+from unidecode import unidecode
+
+# The search index format, see data/search.py. Bump TOKENIZER whenever tokenize() or the layout of the index changes.
+TOKENIZER = 2
+TOKEN = re.compile(r"[a-z0-9]+(?:'[a-z0-9]+)*")
+
+# BM25 parameters
+K1 = 1.2
+B = 0.75
+
+
+def tokenize(text: str) -> List[str]:
+    """Splits quote text into lowercase ASCII words, keeping contractions whole (That's -> that's)."""
+    return TOKEN.findall(unidecode(clean_string(text)).lower())
+
+
+def build_search_blobs(season_episode_data: List[Tuple[int, int, dict]]) -> Dict[str, bytes]:
+    """
+    Builds the positional inverted index over every quote, as blobs for the episode store.
+
+    Quotes are numbered in series order, the same as their global IDs in the store. Each term has its quote numbers,
+    frequencies, BM25 weights and offsets into the term's positions; every array is stored flat, with each term's range
+    in the vocabulary. Season & episode numbers are unsigned shorts, like the store's quote locations, as episodes are
+    numbered however the raw files are.
+    """
+    postings: Dict[str, Dict[int, List[int]]] = {}
+    lengths = array('H')
+    seasons, episodes = array('H'), array('H')
+    character_offsets, quote_characters, primary_characters = array('I', [0]), array('H'), array('H')
+    characters: Dict[str, int] = OrderedDict()
+
+    doc = 0
+    for season, episode, episode_data in season_episode_data:
+        for scene in episode_data['scenes']:
+            for quote in scene['quotes']:
+                tokens = tokenize(quote['text'])
+                for position, token in enumerate(tokens):
+                    postings.setdefault(token, {}).setdefault(doc, []).append(position)
+
+                lengths.append(min(len(tokens), 0xFFFF))
+                seasons.append(season)
+                episodes.append(episode)
+                speakers = quote['characters'].keys() if quote['isAnnotated'] else [quote['character']]
+                speaker_ids = [characters.setdefault(character_id, len(characters)) for character_id in speakers]
+                primary_characters.append(speaker_ids[0])
+                quote_characters.extend(speaker_ids)
+                character_offsets.append(len(quote_characters))
+                doc += 1
+
+    # Every term's BM25 weight in every quote it appears in is fixed, so it is worked out here once.
+    average_length = sum(lengths) / max(doc, 1)
+    vocabulary: Dict[str, List[int]] = {}
+    docs, frequencies, position_offsets, positions = array('I'), array('I'), array('I'), array('I')
+    impacts = array('f')
+    for term in sorted(postings.keys()):
+        start = len(docs)
+        idf = math.log(1 + (doc - len(postings[term]) + 0.5) / (len(postings[term]) + 0.5))
+        for term_doc, term_positions in postings[term].items():
+            frequency = len(term_positions)
+            norm = K1 * (1 - B + B * lengths[term_doc] / average_length)
+            docs.append(term_doc)
+            frequencies.append(frequency)
+            impacts.append(idf * frequency * (K1 + 1) / (frequency + norm))
+            position_offsets.append(len(positions))
+            positions.extend(term_positions)
+        vocabulary[term] = [start, len(docs)]
+
+    meta = {
+        'tokenizer': TOKENIZER,
+        'count': doc,
+        'average_length': average_length,
+        'characters': list(characters.keys()),
+        # Quotes are in series order, so each season is one run of quote numbers: [season, first quote] pairs
+        'seasons': [[season, seasons.index(season)] for season in sorted(set(seasons))],
+        'vocabulary': vocabulary
+    }
+
+    return OrderedDict([
+        ('search/meta', json.dumps(meta, separators=(',', ':')).encode('utf-8')),
+        ('search/docs', docs.tobytes()),
+        ('search/frequencies', frequencies.tobytes()),
+        ('search/impacts', impacts.tobytes()),
+        ('search/position_offsets', position_offsets.tobytes()),
+        ('search/positions', positions.tobytes()),
+        ('search/lengths', lengths.tobytes()),
+        ('search/seasons', seasons.tobytes()),
+        ('search/episodes', episodes.tobytes()),
+        ('search/character_offsets', character_offsets.tobytes()),
+        ('search/characters', quote_characters.tobytes()),
+        ('search/primary_characters', primary_characters.tobytes()),
+    ])
@@ -0,0 +1,241 @@
+import json
+import os
+import re
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from lxml import etree
+from manifest import hash_bytes, hash_strings
+
+
+class SpeakerResolution(NamedTuple):
+    """Everything a truth speaker resolves to once mapped & identified: the displayed text and its characters."""
+    text: str
+    annotated: bool
+    characters: Tuple[Tuple[str, Optional[str]], ...]  # (identifier, type)
+
+
+def parse_speaker_mapping(path: str) -> Tuple[Dict[str, str], List[str]]:
+    """Parses a speaker mapping file into Source -> Destination, along with every Source that appeared twice."""
+    mapping: Dict[str, str] = OrderedDict()
+    duplicates: List[str] = []
+    with open(path, 'r') as speaker_mapping_file:
+        speaker_mapping_root: etree.ElementBase = etree.parse(speaker_mapping_file)
+        for mapping_element in speaker_mapping_root.xpath('//SpeakerMappings/Mapping'):
+            source = mapping_element.xpath('./Source/text()')[0]
+            destination = mapping_element.xpath('./Destination/text()')[0]
+            if source in mapping:
+                duplicates.append(source)
+            mapping[source] = destination
+    return mapping, duplicates
+
+
+def close_mapping(mapping: Dict[str, str]) -> Tuple[Dict[str, str], List[List[str]]]:
+    """
+    Collapses chained mappings (A -> B, B -> C) so every source maps straight to its final destination.
+
+    Each chain is only walked once; every speaker along it is pointed at the end as it is resolved. Speakers mapping to
+    themselves are final. Sources that are part of (or lead into) a cycle are left out of the closure, and each cycle
+    is returned in the order it was walked.
+    """
+    closure: Dict[str, Optional[str]] = {}
+    cycles: List[List[str]] = []
+
+    for start in mapping:
+        path: List[str] = []
+        on_path: Dict[str, int] = {}
+        speaker = start
+        while True:
+            if speaker in closure:
+                final = closure[speaker]
+                break
+            destination = mapping.get(speaker)
+            if destination is None or destination == speaker:
+                final = speaker
+                if destination is not None:
+                    closure[speaker] = speaker
+                break
+            if speaker in on_path:
+                cycles.append(path[on_path[speaker]:])
+                final = None
+                break
+            on_path[speaker] = len(path)
+            path.append(speaker)
+            speaker = destination
+
+        for speaker in path:
+            closure[speaker] = final
+
+    return OrderedDict((source, closure[source]) for source in mapping if closure[source] is not None), cycles
+
+
+class Identifier(NamedTuple):
+    """A single <Speaker> of identifiers.xml, as written (so that problems with it can still be reported)."""
+    raw_text: str
+    annotation: Optional[str]
+    annotated_text: Optional[str]
+    characters: Tuple[Tuple[str, Optional[str]], ...]
+
+    @classmethod
+    def from_element(cls, speaker: etree.ElementBase) -> 'Identifier':
+        annotated_text = speaker.find('AnnotatedText')
+        if speaker.find('Characters') is not None:
+            character_elements = speaker.xpath('./Characters/Character')
+        else:
+            character_elements = [element for element in [speaker.find('Character')] if element is not None]
+
+        return cls(speaker.find('RawText').text, speaker.attrib.get('annotated'),
+                   annotated_text.text if annotated_text is not None else None,
+                   tuple((character.text, character.attrib.get('type')) for character in character_elements))
+
+    def resolution(self) -> Optional[SpeakerResolution]:
+        """What this identifier displays as, or None if it is missing the text or characters to do so."""
+        annotated = self.annotation == 'true'
+        text = self.annotated_text if annotated else self.raw_text
+        if text is None or len(self.characters) == 0:
+            return None
+        return SpeakerResolution(text, annotated, self.characters)
+
+
+class SpeakerTable:
+    """
+    The speaker mapping and identifiers, loaded once into every truth speaker's resolution.
+
+    Tables are cached on disk by the hash of the files they were built from, so that every stage after the first
+    reads a small JSON file instead of parsing and walking both XML files again.
+    """
+    __slots__ = ('key', 'mapping', 'identifiers', 'duplicates', 'closure', 'cycles', 'resolutions')
+    VERSION = 1
+
+    def __init__(self, key: str, mapping: Dict[str, str], identifiers: Dict[str, Identifier],
+                 duplicates: Tuple[str, ...] = ()) -> None:
+        self.key = key
+        self.mapping = mapping
+        self.identifiers = identifiers
+        self.duplicates = duplicates
+        self.closure, self.cycles = close_mapping(mapping)
+
+        # Speakers sharing a destination share a resolution, which speaker_fields caches on.
+        identified = {raw_text: identifier.resolution() for raw_text, identifier in identifiers.items()}
+        self.resolutions: Dict[str, SpeakerResolution] = {}
+        for source, destination in self.closure.items():
+            resolution = identified.get(destination)
+            if resolution is not None:
+                self.resolutions[source] = resolution
+
+    @classmethod
+    def parse(cls, key: str, speaker_mapping_path: str, identifiers_path: str) -> 'SpeakerTable':
+        """Builds a table from the speaker mapping and identifiers files."""
+        mapping, duplicates = parse_speaker_mapping(speaker_mapping_path)
+
+        identifiers: Dict[str, Identifier] = OrderedDict()
+        with open(identifiers_path, 'r') as identifier_file:
+            speaker_list_root: etree.ElementBase = etree.parse(identifier_file)
+            for speaker in speaker_list_root.xpath('//SpeakerList/Speaker'):
+                identifier = Identifier.from_element(speaker)
+                identifiers[identifier.raw_text] = identifier
+
+        return cls(key, mapping, identifiers, tuple(duplicates))
+
+    @classmethod
+    def load(cls, path: str, speaker_mapping_path: str, identifiers_path: str) -> 'SpeakerTable':
+        """Loads the table cached at `path`, rebuilding (and caching) it if either file has changed since."""
+        with open(speaker_mapping_path, 'rb') as speaker_mapping_file, open(identifiers_path, 'rb') as identifier_file:
+            key = hash_strings(hash_bytes(speaker_mapping_file.read()), hash_bytes(identifier_file.read()))
+
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as table_file:
+                try:
+                    data = json.load(table_file)
+                except ValueError:
+                    data = {}
+
+            if data.get('version') == cls.VERSION and data.get('key') == key:
+                identifiers = OrderedDict()
+                for raw_text, annotation, annotated_text, characters in data['identifiers']:
+                    identifiers[raw_text] = Identifier(raw_text, annotation, annotated_text,
+                                                       tuple(tuple(character) for character in characters))
+                return cls(key, OrderedDict(data['mapping']), identifiers, tuple(data['duplicates']))
+
+        table = cls.parse(key, speaker_mapping_path, identifiers_path)
+        table.save(path)
+        return table
+
+    def save(self, path: str) -> None:
+        with open(path, 'w', encoding='utf-8') as table_file:
+            json.dump({
+                'version': self.VERSION,
+                'key': self.key,
+                'mapping': list(self.mapping.items()),
+                'duplicates': list(self.duplicates),
+                'identifiers': list(self.identifiers.values())
+            }, table_file)
+
+    def resolve(self, speaker: str) -> SpeakerResolution:
+        """Returns what a truth speaker resolves to, raising a KeyError naming the missing mapping or identifier."""
+        resolution = self.resolutions.get(speaker)
+        if resolution is not None:
+            return resolution
+
+        if speaker not in self.mapping:
+            raise KeyError(f'`{speaker}` has no speaker mapping')
+        if speaker not in self.closure:
+            raise KeyError(f'`{speaker}` is part of, or leads into, a speaker mapping cycle')
+        destination = self.closure[speaker]
+        if destination not in self.identifiers:
+            raise KeyError(f'`{speaker}` maps to `{destination}`, which has no identifier')
+        raise KeyError(f'`{speaker}` maps to `{destination}`, whose identifier is incomplete')
+
+    def unresolved(self) -> List[Tuple[str, str]]:
+        """Every mapping whose final destination has no usable identifier. Cycles are left to `cycles`."""
+        return [(source, destination) for source, destination in self.closure.items()
+                if source not in self.resolutions]
+
+    def fingerprints(self) -> Dict[str, str]:
+        """
+        A fingerprint of everything each truth speaker resolves to, so that editing one mapping or identifier only
+        invalidates the episodes that speaker appears in.
+        """
+        fingerprints: Dict[str, str] = {}
+        for source, destination in self.closure.items():
+            identifier = self.identifiers.get(destination)
+            fingerprints[source] = hash_strings(source, destination, json.dumps(identifier))
+        return fingerprints
+
+
+@lru_cache(maxsize=None)
+def speaker_fields(resolution: SpeakerResolution) -> Tuple[str, Optional[Tuple[Tuple[str, str], ...]]]:
+    """
+    Returns the application's speaker text for a resolution, along with each annotated character's displayed name.
+
+    Annotated speakers have their character names swapped for identifiers, with the names kept alongside:
+    {Jim}, {Dwight}, and {Andy}'s Computer -> {jim}, {dwight}, and {andy}'s Computer
+    """
+    if not resolution.annotated:
+        return resolution.text, None
+
+    split_speaker_text: List[str] = re.split(r'({[^}]+})', resolution.text)
+    if len(split_speaker_text[0]) == 0: del split_speaker_text[0]
+    if len(split_speaker_text[-1]) == 0: del split_speaker_text[-1]
+    text_start: int = 0 if split_speaker_text[0].startswith('{') else 1
+
+    names: Dict[str, Optional[str]] = {character_id: None for character_id, _ in resolution.characters}
+    for i, (character_id, _) in enumerate(resolution.characters):
+        index = text_start + (i * 2)
+        names[character_id] = split_speaker_text[index][1:-1]
+        split_speaker_text[index] = '{' + character_id + '}'
+
+    return ''.join(split_speaker_text), tuple(names.items())
+
+
+def quote_json(text: str, resolution: SpeakerResolution) -> dict:
+    """Builds a quote as it appears in the application's episode data."""
+    speaker, names = speaker_fields(resolution)
+    quote = {'speaker': speaker, 'text': text, 'isAnnotated': resolution.annotated}
+    if names is None:
+        quote['character'] = resolution.characters[0][0]
+    else:
+        quote['characters'] = dict(names)
+    return quote
+
@@ -0,0 +1,173 @@
+"""
+synthetic.py
+
+Generates a made-up show's raw transcripts, in exactly the format of raw/ (see transcripts.py), so the pipeline can be
+run over archives far larger than nine seasons.
+
+Everything is drawn from a seeded generator, so the same options always give the same corpus. The defaults roughly
+match the real corpus: about 48 scenes an episode, 6 or 7 quotes a scene and 11 words a quote, with speakers following
+a Zipf distribution, so a handful of main characters speak most lines while most speakers appear only a few times.
+"""
+import json
+import os
+import random
+from typing import Dict, List, NamedTuple, Tuple
+
+from helpers import valuify
+
+ONSETS = ['b', 'br', 'ch', 'd', 'dr', 'f', 'g', 'gr', 'h', 'j', 'k', 'l', 'm', 'n', 'p', 'r', 's', 'sh', 'st', 't',
+          'tr', 'v', 'w', 'z']
+VOWELS = ['a', 'e', 'i', 'o', 'u', 'ai', 'ea', 'ou']
+CODAS = ['', '', 'n', 'r', 'l', 's', 'm', 'ck', 'nd', 'st']
+FILLERS = ['Uh', 'Um', 'Oh', 'Okay', 'Yeah', 'No', 'Well', 'Wait', 'Hey', 'Right']
+ROLES = ['Woman', 'Man', 'Guy', 'Waiter', 'Customer', 'Reporter', 'Officer', 'Kid', 'Nurse', 'Driver']
+# Joins the parts of a compound speaker, as the split patterns of `ids` expect.
+COMPOUND_JOINS = [' & ', ' and ', ', ', '/']
+
+# Written beside a synthetic corpus' inputs with the options it was generated with, marking it as synthetic.
+SYNTHETIC_JSON = 'synthetic.json'
+
+# Unicode the raw transcripts really contain (typographic punctuation, accents, decomposed accents, non-breaking
+# spaces) along with scripts they don't, which clean_string transliterates.
+NOISE = ['\u2019', '\u201c', '\u201d', '\u2026', '\u2014', '\u00e9', 'e\u0301', '\u00a0', '\u00f1', '\u00fc',
+         '\u0416\u0443\u043a', '\u65e5\u672c', '\u03a9', '\u00df']
+
+
+class CorpusOptions(NamedTuple):
+    """The shape of a synthetic corpus. Scene & quote counts are means, drawn per episode & per scene."""
+    seasons: int = 9
+    episodes: int = 22
+    scenes: float = 48
+    quotes: float = 6.5
+    words: float = 11
+    speakers: int = 800
+    zipf: float = 1.1
+    compound: float = 0.01
+    deleted: float = 0.05
+    noise: float = 0.02
+    seed: int = 0
+
+
+DEFAULT_OPTIONS = CorpusOptions()
+
+
+def syllables(rng: random.Random, count: int) -> str:
+    return ''.join(rng.choice(ONSETS) + rng.choice(VOWELS) + rng.choice(CODAS) for _ in range(count))
+
+
+def speaker_names(rng: random.Random, count: int) -> List[str]:
+    """A cast of distinct speakers: named characters, some with surnames, and numbered background roles."""
+    names: List[str] = []
+    seen = set()
+    while len(names) < count:
+        roll = rng.random()
+        if roll < 0.15:
+            name = f'{rng.choice(ROLES)} #{rng.randint(1, 9)}'
+        elif roll < 0.35:
+            name = f'{syllables(rng, rng.randint(1, 2)).capitalize()} {syllables(rng, 2).capitalize()}'
+        else:
+            name = syllables(rng, rng.randint(1, 3)).capitalize()
+        if name not in seen:
+            seen.add(name)
+            names.append(name)
+    return names
+
+
+def zipf_weights(count: int, exponent: float) -> List[float]:
+    return [1 / (rank ** exponent) for rank in range(1, count + 1)]
+
+
+class Generator:
+    def __init__(self, options: CorpusOptions) -> None:
+        self.options = options
+        self.rng = random.Random(options.seed)
+        self.speakers = speaker_names(self.rng, options.speakers)
+        self.cumulative_weights = []
+        total = 0.0
+        for weight in zipf_weights(len(self.speakers), options.zipf):
+            total += weight
+            self.cumulative_weights.append(total)
+        self.words = [syllables(self.rng, self.rng.randint(1, 3)) for _ in range(2000)]
+        self.word_weights = zipf_weights(len(self.words), 1.0)
+
+    def count(self, mean: float) -> int:
+        """A count of at least one with the given mean, long tailed like the lengths of real scenes & quotes."""
+        if mean <= 1:
+            return 1
+        return 1 + int(self.rng.expovariate(1 / (mean - 1)))
+
+    def speaker(self) -> str:
+        if self.rng.random() < self.options.compound:
+            first, second = self.rng.choices(self.speakers[:50], k=2)
+            return first + self.rng.choice(COMPOUND_JOINS) + second
+        return self.rng.choices(self.speakers, cum_weights=self.cumulative_weights)[0]
+
+    def text(self) -> str:
+        words = self.rng.choices(self.words, weights=self.word_weights, k=self.count(self.options.words))
+        if self.rng.random() < 0.2:
+            words.insert(0, self.rng.choice(FILLERS) + ',')
+        if self.rng.random() < 0.15:
+            position = self.rng.randrange(len(words) + 1)
+            words.insert(position, f'[{" ".join(self.rng.choices(self.words, k=self.rng.randint(1, 3)))}]')
+        if self.rng.random() < self.options.noise:
+            position = self.rng.randrange(len(words))
+            words[position] += self.rng.choice(NOISE)
+
+        text = ' '.join(words)
+        return text[0].upper() + text[1:] + self.rng.choice(['.', '.', '.', '?', '!', '\u2026'])
+
+    def scene(self) -> List[str]:
+        return [f'{self.speaker()}|{self.text()}' for _ in range(self.count(self.options.quotes))]
+
+    def episode(self) -> str:
+        """One episode's raw transcript: its scenes, then any deleted scenes."""
+        scene_count = max(1, round(self.rng.gauss(self.options.scenes, self.options.scenes / 4)))
+        deleted_count = sum(self.rng.random() < self.options.deleted for _ in range(scene_count))
+        transcript = '\n-\n'.join('\n'.join(self.scene()) for _ in range(scene_count))
+        for number in range(1, deleted_count + 1):
+            transcript += f'\n-!{number}\n' + '\n'.join(self.scene())
+        return transcript + '\n'
+
+    def full_name(self) -> str:
+        return f'{syllables(self.rng, 2).capitalize()} {syllables(self.rng, 2).capitalize()}'
+
+    def description(self, season: int, episode: int) -> Dict[str, str]:
+        return {'title': ' '.join(self.rng.choices(self.words, k=self.rng.randint(1, 4))).title(),
+                'description': f'Season {season}, episode {episode}. ' + self.text()}
+
+
+def generate_corpus(output: str, options: CorpusOptions) -> Tuple[int, int]:
+    """
+    Writes a synthetic corpus into a data directory: a raw transcript for every episode, the episode & character
+    descriptions `build app` needs, which every other input of the pipeline is built from, and the options used.
+
+    Returns the number of episodes and quotes written.
+    """
+    generator = Generator(options)
+    raw_dir = os.path.join(output, 'raw')
+    os.makedirs(raw_dir, exist_ok=True)
+
+    quote_count = 0
+    descriptions: List[List[Dict[str, str]]] = []
+    for season in range(1, options.seasons + 1):
+        descriptions.append([])
+        for episode in range(1, options.episodes + 1):
+            transcript = generator.episode()
+            quote_count += transcript.count('|')
+            with open(os.path.join(raw_dir, f'{season}-{episode:02}.txt'), 'w', encoding='utf-8') as raw_file:
+                raw_file.write(transcript)
+            descriptions[-1].append(generator.description(season, episode))
+
+    with open(os.path.join(output, 'episode_descriptions.json'), 'w', encoding='utf-8') as episode_desc_file:
+        json.dump(descriptions, episode_desc_file, indent=4)
+
+    # Only the main characters are described, as in the real corpus.
+    characters = {valuify(name): {'name': name, 'summary': generator.text(), 'actor': generator.full_name()}
+                  for name in generator.speakers[:20] if '#' not in name}
+    with open(os.path.join(output, 'character_descriptions.json'), 'w', encoding='utf-8') as character_desc_file:
+        json.dump(characters, character_desc_file, indent=4)
+
+    with open(os.path.join(output, SYNTHETIC_JSON), 'w', encoding='utf-8') as options_file:
+        json.dump(options._asdict(), options_file, indent=4)
+
+    return options.seasons * options.episodes, quote_count
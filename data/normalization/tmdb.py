@@ -0,0 +1,134 @@
+import json
+import os
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+API_URL = 'https://api.themoviedb.org/3'
+
+
+class RateLimiter:
+    """Spaces out calls across every thread so no more than `rate` happen per second. A rate of zero disables it."""
+
+    def __init__(self, rate: float) -> None:
+        self.interval = 1 / rate if rate > 0 else 0
+        self.next_slot = 0.0
+        self.lock = threading.Lock()
+
+    def wait(self) -> None:
+        if self.interval == 0:
+            return
+
+        with self.lock:
+            now = time.monotonic()
+            slot = max(now, self.next_slot)
+            self.next_slot = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+class StillManifest:
+    """
+    A record of every downloaded still: where it came from, its size and ETag.
+
+    A still whose local file still matches the recorded size for the same remote path is considered downloaded without
+    asking the server again. Paths are stored relative to the manifest so the image directory can move.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self.root = os.path.dirname(os.path.abspath(path))
+        self.entries: Dict[str, dict] = {}
+        self.lock = threading.Lock()
+
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as manifest_file:
+                self.entries = json.load(manifest_file)
+
+    def _key(self, image_path: str) -> str:
+        return os.path.relpath(os.path.abspath(image_path), self.root).replace(os.sep, '/')
+
+    def is_current(self, image_path: str, file_path: str) -> bool:
+        """True if the image on disk was downloaded from the given remote path and is complete."""
+        entry = self.entries.get(self._key(image_path))
+        if entry is None or entry['file_path'] != file_path or not os.path.exists(image_path):
+            return False
+        return os.stat(image_path).st_size == entry['size']
+
+    def record(self, image_path: str, file_path: str, size: int, etag: Optional[str]) -> None:
+        with self.lock:
+            self.entries[self._key(image_path)] = {'file_path': file_path, 'size': size, 'etag': etag}
+
+    def save(self) -> None:
+        with self.lock:
+            with open(self.path, 'w', encoding='utf-8') as manifest_file:
+                json.dump(self.entries, manifest_file, indent=4, sort_keys=True)
+
+
+class TMDBClient:
+    """
+    A small themoviedb.org client sharing one pooled, retrying session between threads.
+
+    `api_url` may point at any server implementing the same routes, which is how the downloader is exercised without
+    touching the real API; image URLs are then taken from that server's own configuration response.
+    """
+
+    def __init__(self, api_key: Optional[str], api_url: str = API_URL, concurrency: int = 8, rate: float = 0,
+                 retries: int = 3, backoff: float = 0.5, timeout: float = 30) -> None:
+        self.api_key = api_key
+        self.api_url = api_url.rstrip('/')
+        self.timeout = timeout
+        self.limiter = RateLimiter(rate)
+
+        retry = Retry(total=retries, backoff_factor=backoff, status_forcelist=[429, 500, 502, 503, 504])
+        adapter = HTTPAdapter(pool_connections=concurrency, pool_maxsize=concurrency, max_retries=retry)
+        self.session = requests.Session()
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def close(self) -> None:
+        self.session.close()
+
+    def get_json(self, route: str, **params) -> dict:
+        self.limiter.wait()
+        response = self.session.get(self.api_url + route, params={'api_key': self.api_key, **params},
+                                    timeout=self.timeout)
+        response.raise_for_status()
+        return response.json()
+
+    def configuration(self) -> dict:
+        return self.get_json('/configuration')
+
+    def episode_stills(self, tv_id: int, season: int, episode: int) -> List[dict]:
+        route = f'/tv/{tv_id}/season/{season}/episode/{episode}/images'
+        return self.get_json(route).get('stills', [])
+
+    def head(self, url: str) -> Tuple[int, Optional[str]]:
+        """Returns the remote size and ETag of a file."""
+        self.limiter.wait()
+        response = self.session.head(url, timeout=self.timeout, allow_redirects=True)
+        response.raise_for_status()
+        return int(response.headers['Content-Length']), response.headers.get('ETag')
+
+    def download(self, url: str, path: str) -> Tuple[int, Optional[str]]:
+        """
+        Streams a file to disk, returning its size and ETag.
+
+        The file is written beside its destination and only moved into place once complete, so an interrupted run
+        never leaves a truncated image behind.
+        """
+        self.limiter.wait()
+        partial_path = path + '.part'
+        with self.session.get(url, stream=True, timeout=self.timeout) as response:
+            response.raise_for_status()
+            with open(partial_path, 'wb') as file:
+                for chunk in response.iter_content(chunk_size=64 * 1024):
+                    file.write(chunk)
+            etag = response.headers.get('ETag')
+
+        os.replace(partial_path, path)
+        return os.stat(path).st_size, etag
@@ -0,0 +1,154 @@
+"""
+transcripts.py
+
+A streaming parser for raw transcripts & the writer turning them into truth files.
+
+A raw transcript is a list of scenes, each started by a line beginning with `-` (except the first). A scene whose first
+line is `!<number>` is a deleted scene, from the deleted scenes collection of that number. Every other line is a quote,
+`Speaker|Text`.
+
+Only one scene is held in memory at a time, however long the transcript.
+"""
+import os
+import re
+from collections import Counter
+from typing import Iterable, Iterator, List, NamedTuple, Optional, TextIO, Tuple, Union
+
+from lxml import etree
+
+from normalize import clean_string
+from profiling import phase
+
+INDENT = ' ' * 4
+# Control characters lxml refuses to write, found here so they are reported with their position.
+XML_INVALID = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f]')
+
+
+class TranscriptError(ValueError):
+    """A malformed line in a raw transcript, with its exact position."""
+
+    def __init__(self, path: str, line: int, message: str, content: str) -> None:
+        # Passed on as-is so the error survives being pickled back from a worker process.
+        super().__init__(path, line, message, content)
+        self.path = path
+        self.line = line
+        self.message = message
+        self.content = content
+
+    def __str__(self) -> str:
+        return f'{self.path}:{self.line}: {self.message} "{self.content}"'
+
+
+class Scene(NamedTuple):
+    line: int
+    deleted: Optional[str]
+
+
+class Quote(NamedTuple):
+    line: int
+    speaker: str
+    text: str
+
+
+def sections(file: TextIO) -> Iterator[Tuple[int, str]]:
+    """
+    Splits a raw transcript into the text of each scene & the line it starts on, one scene at a time.
+
+    Equivalent to `re.split('^-', data, flags=re.MULTILINE)`: the `-` is dropped, the rest of its line kept.
+    """
+    start, lines = 1, []
+    for number, line in enumerate(file, start=1):
+        if line.startswith('-'):
+            yield start, ''.join(lines)
+            start, lines = number, [line[1:]]
+        else:
+            lines.append(line)
+    yield start, ''.join(lines)
+
+
+def transcript_strings(paths: Iterable[str]) -> List[str]:
+    """Every speaker & line of text in the given raw transcripts, uncleaned, exactly as parse_transcript splits them."""
+    strings: List[str] = []
+    for path in paths:
+        with open(path, 'r', encoding='utf-8') as file:
+            for _, section in sections(file):
+                for line in section.strip().split('\n'):
+                    if '|' in line:
+                        strings.extend(line.split('|', 1))
+    return strings
+
+
+def parse_transcript(path: str) -> Iterator[Union[Scene, Quote]]:
+    """Parses a raw transcript into a Scene event followed by its Quote events, for every scene in order."""
+    with open(path, 'r', encoding='utf-8') as file:
+        for start, section in sections(file):
+            # Whitespace around each scene is ignored, so find the line its first quote is really on.
+            number = start + section[:len(section) - len(section.lstrip())].count('\n')
+            lines = section.strip().split('\n')
+
+            if lines[0].startswith('!'):
+                deleted = re.search(r'!(\d+)', lines[0])
+                if deleted is None:
+                    raise TranscriptError(path, number, 'Deleted scene marker has no number:', lines[0])
+                yield Scene(number, deleted.group(1))
+                lines.pop(0)
+                number += 1
+            else:
+                yield Scene(number, None)
+
+            for number, line in enumerate(lines, start=number):
+                if '|' not in line:
+                    raise TranscriptError(path, number, 'Quote has no speaker separator:', line)
+                speaker, text = line.split('|', 1)
+                speaker, text = clean_string(speaker), clean_string(text)
+
+                if len(speaker) <= 1:
+                    raise TranscriptError(path, number, 'Speaker text had less than two characters:', line)
+                elif len(text) <= 1:
+                    raise TranscriptError(path, number, 'Quote text had less than two characters:', line)
+                elif XML_INVALID.search(speaker) or XML_INVALID.search(text):
+                    raise TranscriptError(path, number, 'Quote has control characters:', repr(line)[1:-1])
+                yield Quote(number, speaker, text)
+
+
+def write_truth(events: Iterable[Union[Scene, Quote]], output_path: str) -> Counter:
+    """
+    Writes parsed scenes & quotes into a truth file one scene at a time, returning the speakers seen.
+
+    The file is only put in place once every event has been written, so a malformed transcript leaves no partial file.
+    Its content is identical to indenting & pretty printing the whole tree at once.
+    """
+    speakers = Counter()
+    try:
+        with open(output_path + '.part', 'wb') as truth_file:
+            with etree.xmlfile(truth_file, encoding='utf-8') as xf:
+                with xf.element('SceneList'):
+                    scene: Optional[etree._Element] = None
+
+                    def flush() -> None:
+                        with phase('serialize'):
+                            etree.indent(scene, space=INDENT, level=1)
+                            xf.write('\n' + INDENT, scene)
+
+                    for event in events:
+                        if isinstance(event, Scene):
+                            if scene is not None:
+                                flush()
+                            scene = etree.Element('Scene')
+                            if event.deleted is not None:
+                                scene.attrib['deleted'] = event.deleted
+                        else:
+                            speakers[event.speaker] += 1
+                            quote = etree.SubElement(scene, 'Quote')
+                            etree.SubElement(quote, 'Speaker').text = event.speaker
+                            etree.SubElement(quote, 'Text').text = event.text
+                    if scene is not None:
+                        flush()
+                    xf.write('\n')
+            truth_file.write(b'\n')
+        os.replace(output_path + '.part', output_path)
+    except BaseException:
+        if os.path.exists(output_path + '.part'):
+            os.remove(output_path + '.part')
+        raise
+    return speakers
@@ -0,0 +1,32 @@
+"""
+responses.py
+
+Pre-encoded JSON responses for API routes whose data does not change while the server runs.
+"""
+import hashlib
+from typing import Any, NamedTuple
+
+from flask import Response, current_app, json, request
+
+
+class EncodedJSON(NamedTuple):
+    """A JSON response body, encoded once, and the ETag identifying it."""
+    body: bytes
+    etag: str
+
+
+def encoded(body: bytes) -> EncodedJSON:
+    """Wraps an already encoded body, hashing it for its ETag."""
+    return EncodedJSON(body, hashlib.blake2b(body, digest_size=16).hexdigest())
+
+
+def encode(value: Any) -> EncodedJSON:
+    """Serializes a value the way `jsonify` would."""
+    return encoded(json.dumps(value, separators=(',', ':')).encode('utf-8'))
+
+
+def respond(encoded: EncodedJSON, mimetype: str = 'application/json') -> Response:
+    """Serves an encoded body, answering with 304 Not Modified if the client already has it."""
+    response = current_app.response_class(encoded.body, mimetype=mimetype)
+    response.set_etag(encoded.etag)
+    return response.make_conditional(request)
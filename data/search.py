@@ -0,0 +1,149 @@
+"""
+search.py
+
+Full-text quote search over the positional inverted index kept in the episode store (see normalization/search_index.py).
+
+Every array is read straight out of the memory-mapped store. Quotes are matched when they contain every word of the
+query (and every "quoted phrase", in order), narrowed down by speaker, season & episode facets, and ranked by BM25
+using the weights worked out when the index was built.
+"""
+import heapq
+import json
+import re
+import unicodedata
+from bisect import bisect_left
+from collections import Counter
+from functools import lru_cache
+from operator import itemgetter
+from typing import Dict, List, NamedTuple, Optional, Set, Tuple
+
+from unidecode import unidecode
+
+from server.store import EpisodeStore
+
+# Must match the tokenizer & format the index was built with.
+TOKENIZER = 2
+TOKEN = re.compile(r"[a-z0-9]+(?:'[a-z0-9]+)*")
+PHRASE = re.compile(r'"([^"]*)"')
+
+
+def tokenize(text: str) -> List[str]:
+    """Splits text into lowercase ASCII words exactly as quote text was when indexed."""
+    return TOKEN.findall(unidecode(unicodedata.normalize('NFC', text)).lower())
+
+
+class Query(NamedTuple):
+    terms: List[str]
+    phrases: List[List[str]]
+    speaker: Optional[str] = None
+    season: Optional[int] = None
+    episode: Optional[int] = None
+
+    @classmethod
+    def parse(cls, text: str, **facets) -> 'Query':
+        phrases = [tokenize(phrase) for phrase in PHRASE.findall(text)]
+        phrases = [phrase for phrase in phrases if len(phrase) > 1]
+        return cls(tokenize(text), phrases, **facets)
+
+
+class SearchResults(NamedTuple):
+    total: int
+    hits: List[Tuple[int, float]]  # (quote ID, score)
+    facets: Dict[str, List[list]]  # [value, count] pairs, most relevant first
+
+
+class SearchIndex:
+    def __init__(self, store: EpisodeStore) -> None:
+        self.store = store
+        meta = json.loads(store.read('search/meta'))
+        if meta['tokenizer'] != TOKENIZER:
+            raise ValueError('The search index was built with a different tokenizer or format.')
+
+        self.count: int = meta['count']
+        self.characters: List[str] = meta['characters']
+        self.character_ids: Dict[str, int] = {character: i for i, character in enumerate(self.characters)}
+        self.vocabulary: Dict[str, List[int]] = meta['vocabulary']
+        self.season_ranges: List[Tuple[int, int, int]] = [
+            (season, start, meta['seasons'][i + 1][1] if i + 1 < len(meta['seasons']) else self.count)
+            for i, (season, start) in enumerate(meta['seasons'])
+        ]
+
+        self.docs = store.array('search/docs', 'I')
+        self.frequencies = store.array('search/frequencies', 'I')
+        self.impacts = store.array('search/impacts', 'f')
+        self.position_offsets = store.array('search/position_offsets', 'I')
+        self.positions = store.array('search/positions', 'I')
+        self.seasons = store.array('search/seasons', 'H')
+        self.episodes = store.array('search/episodes', 'H')
+        self.character_offsets = store.array('search/character_offsets', 'I')
+        self.quote_characters = store.array('search/characters', 'H')
+        self.primary_characters = store.array('search/primary_characters', 'H')
+
+        # Counted for every match, so kept as a list rather than read through the memoryview.
+        self.primary_list: List[int] = self.primary_characters.tolist()
+
+        # Quotes spoken by more than one character need their other characters looked up separately.
+        self.shared_quotes: Set[int] = {doc for doc in range(self.count)
+                                        if self.character_offsets[doc + 1] - self.character_offsets[doc] > 1}
+
+    @lru_cache(maxsize=256)
+    def postings(self, term: str) -> Dict[int, float]:
+        """Every quote a term appears in, with the term's (precomputed) BM25 weight in that quote."""
+        start, stop = self.vocabulary[term]
+        return dict(zip(self.docs[start:stop].tolist(), self.impacts[start:stop].tolist()))
+
+    def term_positions(self, term: str, doc: int) -> List[int]:
+        start, stop = self.vocabulary[term]
+        index = bisect_left(self.docs, doc, start, stop)
+        position = self.position_offsets[index]
+        return self.positions[position:position + self.frequencies[index]].tolist()
+
+    def has_phrase(self, phrase: List[str], doc: int) -> bool:
+        candidates = set(self.term_positions(phrase[0], doc))
+        for offset, term in enumerate(phrase[1:], start=1):
+            candidates &= {position - offset for position in self.term_positions(term, doc)}
+            if len(candidates) == 0:
+                return False
+        return True
+
+    def doc_characters(self, doc: int) -> List[int]:
+        return self.quote_characters[self.character_offsets[doc]:self.character_offsets[doc + 1]].tolist()
+
+    def search(self, query: Query, offset: int = 0, limit: int = 10, facet_size: int = 10) -> SearchResults:
+        terms = list(dict.fromkeys(query.terms))
+        if len(terms) == 0 or any(term not in self.vocabulary for term in terms):
+            return SearchResults(0, [], {'season': [], 'speaker': []})
+
+        # Intersect from the rarest term up, so the candidate set only ever shrinks.
+        terms.sort(key=lambda term: self.vocabulary[term][1] - self.vocabulary[term][0])
+        scores: Dict[int, float] = dict(self.postings(terms[0]))
+        for term in terms[1:]:
+            postings = self.postings(term)
+            scores = {doc: score + postings[doc] for doc, score in scores.items() if doc in postings}
+
+        if query.season is not None:
+            scores = {doc: score for doc, score in scores.items() if self.seasons[doc] == query.season}
+        if query.episode is not None:
+            scores = {doc: score for doc, score in scores.items() if self.episodes[doc] == query.episode}
+        if query.speaker is not None:
+            character = self.character_ids.get(query.speaker)
+            scores = {doc: score for doc, score in scores.items()
+                      if self.primary_characters[doc] == character
+                      or (doc in self.shared_quotes and character in self.doc_characters(doc))}
+        for phrase in query.phrases:
+            scores = {doc: score for doc, score in scores.items() if self.has_phrase(phrase, doc)}
+
+        # Scores are kept in quote order, so ties go to the earlier quote.
+        hits = heapq.nlargest(offset + limit, scores.items(), key=itemgetter(1))[offset:]
+
+        matched = list(scores.keys())
+        seasons = [[season, bisect_left(matched, stop) - bisect_left(matched, start)]
+                   for season, start, stop in self.season_ranges]
+        speakers = Counter(map(self.primary_list.__getitem__, matched))
+        for doc in self.shared_quotes.intersection(matched):
+            speakers.update(self.doc_characters(doc)[1:])
+        facets = {
+            'season': [[season, count] for season, count in seasons if count > 0],
+            'speaker': [[self.characters[character], count] for character, count in speakers.most_common(facet_size)]
+        }
+        return SearchResults(len(scores), hits, facets)
@@ -0,0 +1,180 @@
+"""
+store.py
+
+Read access to the episode store written by `build app --store`: every API response, pre-encoded, in one file.
+
+The file is an 8 byte magic, the length of the index as a little-endian uint64, the index itself (UTF-8 JSON) and then
+every blob back to back. The index maps each blob's name to its offset (from the end of the index), length and ETag.
+Blobs are JSON bodies, apart from a few packed arrays of numbers and `episode/<season>/<episode>/columnar`, each
+episode in the columnar format (see normalization/columnar.py).
+
+Every quote has a dense global ID, numbered in series order. `quotes` holds each quote (with its ID & location)
+encoded back to back, `quotes/offsets` where each starts (uint32), `quotes/locations` the season, episode, scene and
+quote number of each ID (uint16, four per quote) and `quotes/scenes` the ID of the first quote of every scene (uint32,
+plus the total), with `quotes/meta` giving the first scene and scene count of each episode. Going between IDs,
+locations & bodies is only ever a lookup or two.
+
+Each character has a posting list of the IDs of their quotes, `character/<id>/ids`, and of the (global, zero-indexed)
+scenes they speak in, `character/<id>/scenes`, both sorted uint32 arrays. Their quotes are paged, and filtered by
+season or by the scenes they share with another character, by bisecting these rather than reading every quote.
+
+The file is memory-mapped, so every worker process shares the same pages and only ever touches what it serves.
+"""
+import json
+import mmap
+import struct
+from bisect import bisect_left
+from functools import lru_cache
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from server.responses import EncodedJSON, encoded
+
+MAGIC = b'OFFSTORE'
+VERSION = 3
+HEADER = struct.Struct('<8sQ')
+
+
+class EpisodeStore:
+    def __init__(self, path: str) -> None:
+        with open(path, 'rb') as file:
+            self.buffer = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, index_length = HEADER.unpack_from(self.buffer)
+        if magic != MAGIC:
+            raise ValueError(f'{path} is not an episode store.')
+        index = json.loads(self.buffer[HEADER.size:HEADER.size + index_length])
+        if index['version'] != VERSION:
+            raise ValueError(f'{path} is from an unsupported version ({index["version"]}).')
+
+        self.start = HEADER.size + index_length
+        self.blobs: Dict[str, Tuple[int, int, str]] = {name: tuple(blob) for name, blob in index['blobs'].items()}
+
+        # Parsed episodes are only kept for the few most recently used
+        self.episode = lru_cache(maxsize=32)(self._episode)
+
+        meta = json.loads(self.read('quotes/meta'))
+        self.quote_count: int = meta['count']
+        # (season, episode) -> (index of its first scene, scene count)
+        self.episode_scenes: Dict[Tuple[int, int], Tuple[int, int]] = {
+            (season, episode): (first_scene, scene_count)
+            for season, episode, first_scene, scene_count in meta['episodes']
+        }
+        self.quote_offsets = self.array('quotes/offsets', 'I')
+        self.quote_locations = self.array('quotes/locations', 'H')
+        self.scene_starts = self.array('quotes/scenes', 'I')
+        self.quotes = self.array('quotes', 'B')
+
+        # season -> (first quote ID, last quote ID + 1)
+        self.season_quotes: Dict[int, Tuple[int, int]] = {}
+        for (season, _), (first_scene, scene_count) in self.episode_scenes.items():
+            start, stop = self.season_quotes.get(season, (self.quote_count, 0))
+            self.season_quotes[season] = (min(start, self.scene_starts[first_scene]),
+                                          max(stop, self.scene_starts[first_scene + scene_count]))
+
+    def close(self) -> None:
+        self.buffer.close()
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.blobs
+
+    def read(self, name: str) -> bytes:
+        offset, length, _ = self.blobs[name]
+        return self.buffer[self.start + offset:self.start + offset + length]
+
+    def array(self, name: str, format: str) -> memoryview:
+        """A blob of packed numbers, read in place."""
+        offset, length, _ = self.blobs[name]
+        start = self.start + offset
+        return memoryview(self.buffer)[start:start + length].cast(format)
+
+    def get(self, name: str) -> Optional[EncodedJSON]:
+        """Returns a blob ready to be served, or None if there is no such blob."""
+        if name not in self.blobs:
+            return None
+        return EncodedJSON(self.read(name), self.blobs[name][2])
+
+    def _episode(self, season: int, episode: int) -> Optional[dict]:
+        name = f'episode/{season}/{episode}'
+        return json.loads(self.read(name)) if name in self.blobs else None
+
+    def scene_quotes(self, season: int, episode: int, scene: int) -> Optional[List[dict]]:
+        """The quotes of a scene, all one-indexed."""
+        episode_data = self.episode(season, episode)
+        if episode_data is None or not 1 <= scene <= len(episode_data['scenes']):
+            return None
+        return episode_data['scenes'][scene - 1]['quotes']
+
+    def character_ids(self, character: str) -> Optional[memoryview]:
+        """The IDs of every quote a character speaks, in order, or None if there is no such character."""
+        name = f'character/{character}/ids'
+        return self.array(name, 'I') if name in self.blobs else None
+
+    def character_quotes(self, character: str, cursor: int = 0, limit: int = 10, skip: int = 0,
+                         season: Optional[int] = None, co_speaker: Optional[str] = None
+                         ) -> Optional[Tuple[List[int], Optional[int]]]:
+        """
+        A page of a character's quote IDs, from the quote ID `cursor` on (after skipping `skip` matching quotes).
+
+        Quotes can be limited to a season, or to scenes where `co_speaker` also speaks. Returns the page and the
+        cursor for the next page (None if this is the last), or None if there is no such character.
+        """
+        ids = self.character_ids(character)
+        if ids is None:
+            return None
+
+        start, stop = 0, len(ids)
+        if season is not None:
+            first, last = self.season_quotes.get(season, (0, 0))
+            start, stop = bisect_left(ids, first), bisect_left(ids, last)
+        start = max(start, bisect_left(ids, cursor, start, stop))
+
+        # One extra quote is found to know where the next page starts.
+        wanted = skip + limit + 1
+        if co_speaker is None:
+            page = ids[start:min(start + wanted, stop)].tolist()
+        else:
+            page = []
+            scenes_name = f'character/{co_speaker}/scenes'
+            co_scenes = self.array(scenes_name, 'I') if scenes_name in self.blobs else []
+            # Walk the scenes both speak in, taking the character's quotes within each.
+            scene = bisect_left(co_scenes, bisect_left(self.scene_starts, ids[start] + 1) - 1) if start < stop else 0
+            while start < stop and scene < len(co_scenes) and len(page) < wanted:
+                scene_start = self.scene_starts[co_scenes[scene]]
+                scene_stop = self.scene_starts[co_scenes[scene] + 1]
+                first = bisect_left(ids, scene_start, start, stop)
+                last = bisect_left(ids, scene_stop, first, stop)
+                page.extend(ids[first:min(last, first + wanted - len(page))].tolist())
+                start = last
+                scene += 1
+
+        page = page[skip:]
+        return page[:limit], page[limit] if len(page) > limit else None
+
+    def quote(self, quote_id: int) -> bytes:
+        """The encoded quote with the given ID, which must be valid."""
+        return self.quotes[self.quote_offsets[quote_id]:self.quote_offsets[quote_id + 1]].tobytes()
+
+    def quote_location(self, quote_id: int) -> Tuple[int, int, int, int]:
+        """The season, episode, scene & quote number of a quote ID, all one-indexed."""
+        return tuple(self.quote_locations[quote_id * 4:quote_id * 4 + 4])
+
+    def quote_id(self, season: int, episode: int, scene: int, quote: int) -> Optional[int]:
+        """The global ID of a quote, or None if there is no such quote."""
+        first_scene, scene_count = self.episode_scenes.get((season, episode), (0, 0))
+        if not 1 <= scene <= scene_count or quote < 1:
+            return None
+
+        quote_id = self.scene_starts[first_scene + scene - 1] + quote - 1
+        return quote_id if quote_id < self.scene_starts[first_scene + scene] else None
+
+    def quote_list(self, quote_ids: Sequence[int]) -> bytes:
+        """A JSON list of the given quotes, joined without parsing them."""
+        return b'[' + b','.join(self.quote(quote_id) for quote_id in quote_ids) + b']'
+
+    def neighbors(self, quote_id: int, distance: int) -> EncodedJSON:
+        """The quotes either side of a quote, running across scene & episode boundaries."""
+        above = range(max(quote_id - distance, 0), quote_id)
+        below = range(quote_id + 1, min(quote_id + 1 + distance, self.quote_count))
+        body = b'{"above":' + self.quote_list(above) + b',"below":' + self.quote_list(below) + \
+               b',"quote":' + self.quote(quote_id) + b'}'
+        return encoded(body)
@@ -42,7 +42,18 @@ export const surrounding = functions.https.onRequest(
             quoteData = JSON.parse(content[0].toString("utf-8"));
         }
 
-        const sceneData: never[] = quoteData[params.season - 1][params.episode - 1]["scenes"][params.scene - 1].quotes;
+        // Seasons only list the episodes they have, so episodes are found by number rather than by position.
+        const season = quoteData.find(
+            (episodes: any[]) => episodes.length > 0 && episodes[0].seasonNumber === params.season);
+        const episode = season?.find((episodeData: any) => episodeData.episodeNumber === params.episode);
+        const scene = episode?.scenes[params.scene - 1];
+        if (scene == undefined) {
+            response.status(404)
+                .send(`No scene ${params.scene} in season ${params.season}, episode ${params.episode}.`).end();
+            return;
+        }
+
+        const sceneData: never[] = scene.quotes;
         const surrounding = {center: sceneData[params.quote - 1], above: [], below: []};
         const quoteIndex = params.quote - 1;
 
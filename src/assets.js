@@ -0,0 +1,33 @@
+// Resolves files to the content-hashed names listed in the assets.json written by `build app --assets` and
+// `build media --assets`, which can be cached indefinitely. Enabled with VUE_APP_HASHED_ASSETS=true.
+import axios from "axios";
+
+const enabled = process.env.VUE_APP_HASHED_ASSETS === "true";
+const manifests = {};
+
+// Load the manifest for a directory once; without one, files keep their own names.
+export function loadAssets(root) {
+    if (!enabled)
+        return Promise.resolve();
+
+    if (manifests[root] === undefined) {
+        manifests[root] = axios.get(`${root}/assets.json`)
+            .then((res) => {
+                const urls = {};
+                for (const [name, entry] of Object.entries(res.data.files))
+                    urls[name] = entry.url;
+                manifests[root] = urls;
+            })
+            .catch(() => {
+                manifests[root] = {};
+            });
+    }
+    return Promise.resolve(manifests[root]);
+}
+
+// The URL of a file, hashed if its directory's manifest has been loaded and lists it.
+export function assetUrl(root, name) {
+    const urls = manifests[root];
+    const url = urls !== undefined && !(urls instanceof Promise) && urls[name] !== undefined ? urls[name] : name;
+    return `${root}/${url}`;
+}
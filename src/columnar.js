@@ -0,0 +1,65 @@
+// Decodes the compact columnar episode format written by `build columnar` (see data/normalization/columnar.py)
+// back into the same object as the episode's JSON file.
+
+const MAGIC = "OFC1";
+const NO_STRING = 0xFFFF;
+const FLAG_ANNOTATED = 1;
+
+const decoder = new TextDecoder();
+
+export function decodeEpisode(buffer) {
+    const view = new DataView(buffer);
+    if (decoder.decode(new Uint8Array(buffer, 0, 4)) !== MAGIC)
+        throw new Error("Not a columnar episode file.");
+
+    const headerLength = view.getUint32(4, true);
+    const episode = JSON.parse(decoder.decode(new Uint8Array(buffer, 8, headerLength)));
+    const meta = episode.columnar;
+    const strings = meta.strings;
+    delete episode.columnar;
+
+    // Columns are little-endian, as typed arrays are on every platform the site runs on.
+    let position = 8 + headerLength;
+    const column = (Type, length) => {
+        const array = new Type(buffer, position, length);
+        position += array.byteLength;
+        return array;
+    };
+    const sceneLengths = column(Uint16Array, meta.scenes);
+    const textLengths = column(Uint16Array, meta.quotes);
+    const speakers = column(Uint16Array, meta.quotes);
+    const characterIds = column(Uint16Array, meta.references);
+    const characterNames = column(Uint16Array, meta.references);
+    const characterCounts = column(Uint8Array, meta.quotes);
+    const flags = column(Uint8Array, meta.quotes);
+    const text = new Uint8Array(buffer, position);
+
+    let quote = 0, textOffset = 0, reference = 0;
+    episode.scenes = Array.from(sceneLengths, (sceneLength) => {
+        const quotes = [];
+        for (const end = quote + sceneLength; quote < end; quote++) {
+            const data = {
+                speaker: strings[speakers[quote]],
+                text: decoder.decode(text.subarray(textOffset, textOffset + textLengths[quote])),
+                isAnnotated: (flags[quote] & FLAG_ANNOTATED) !== 0
+            };
+            textOffset += textLengths[quote];
+
+            if (characterNames[reference] === NO_STRING)
+                data.character = strings[characterIds[reference]];
+            else {
+                data.characters = {};
+                for (let i = reference; i < reference + characterCounts[quote]; i++)
+                    data.characters[strings[characterIds[i]]] = strings[characterNames[i]];
+            }
+            reference += characterCounts[quote];
+
+            if (meta.firstQuote !== undefined)
+                data.id = meta.firstQuote + quote;
+            quotes.push(data);
+        }
+        return {quotes: quotes};
+    });
+
+    return episode;
+}
@@ -8,6 +8,9 @@ import VueScrollTo from "vue-scrollto";
 import App from "./App.vue";
 import router from "./router";
 import store from "./store";
+import {loadAssets} from "./assets";
+import {loadVariants} from "./variants";
+import {types} from "./mutation_types";
 
 
 Vue.use(VueProgressiveImage)
@@ -27,8 +30,12 @@ router.beforeEach((to, from, next) => {
     else next();
 });
 
-new Vue({
-    router,
-    store,
-    render: (h) => h(App),
-}).$mount("#app");
+// Image URLs are resolved synchronously while rendering, so their hashed names & variants must be known beforehand,
+// as must the seasons & episodes there are
+Promise.all([loadAssets("/img"), loadVariants("/img"), store.dispatch(types.LOAD_LAYOUT)]).then(() => {
+    new Vue({
+        router,
+        store,
+        render: (h) => h(App),
+    }).$mount("#app");
+});
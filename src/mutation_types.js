@@ -1,4 +1,6 @@
 export const types = {
+    LOAD_LAYOUT: 'LOAD_LAYOUT',
+    SET_LAYOUT: 'SET_LAYOUT',
     FETCH_EPISODE: 'FETCH_EPISODE',
     SET_EPISODE: 'SET_EPISODE',
     MERGE_EPISODE: 'MERGE_EPISODE',
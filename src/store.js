@@ -2,61 +2,100 @@ import Vue from "vue";
 import Vuex from "vuex";
 import axios from "axios";
 import {types} from "@/mutation_types";
+import {decodeEpisode} from "@/columnar";
+import {assetUrl, loadAssets} from "@/assets";
 
 Vue.use(Vuex);
 
-// Generate 'base' representing episode data
-const episodeCount = [6, 22, 23, 14, 26, 24, 24, 24, 23];
-const baseData = Array.from({length: 9}, (x, season) => {
-    // Array of null values representing each episode
-    const episodeData = Array.from({length: episodeCount[season]}, (x, episode) => {
-        return {episode_id: episode + 1, loaded: false}
-    })
-    return {season_id: season + 1, episodes: episodeData};
-})
+// Fetch episodes in the compact columnar format written by `build columnar` instead of JSON
+const columnar = process.env.VUE_APP_COLUMNAR === "true";
+
+// Look up a season or episode in the sparse layout; route parameters are strings, so numbers are compared as such
+function findSeason(state, season) {
+    return state.quoteData.find((seasonData) => seasonData.season_id === Number(season));
+}
+
+function findEpisode(state, season, episode) {
+    const seasonData = findSeason(state, season);
+    if (seasonData === undefined)
+        return undefined;
+    return seasonData.episodes.find((episodeData) => episodeData.episode_id === Number(episode));
+}
+
+// Build a layout from episodes.json, whose seasons may still hold nulls where episodes are missing
+function layoutFromEpisodes(seasons) {
+    const layout = {seasons: []};
+    for (const season of seasons) {
+        const episodes = season.filter((episode) => episode !== null);
+        if (episodes.length > 0)
+            layout.seasons.push({
+                season: episodes[0].seasonNumber,
+                episodes: episodes.map((episode) => episode.episodeNumber)
+            });
+    }
+    return layout;
+}
 
 export default new Vuex.Store({
     state: {
-        seasonCount: 9,
-        episodeCount: episodeCount,
-        quoteData: baseData,
+        // Every season & episode there is, from the layout written by `build app` (see data/normalization/layout.py)
+        quoteData: [],
         preloaded: {episodes: false, characters: false},
         characters_loaded: false,
         characters: {}
     },
     mutations: {
+        // Generate 'base' episode data for every episode in the layout
+        [types.SET_LAYOUT](state, layout) {
+            state.quoteData = layout.seasons.map((season) => {
+                const episodeData = season.episodes.map((episode) => {
+                    return {episode_id: episode, loaded: false}
+                })
+                return {season_id: season.season, episodes: episodeData};
+            })
+        },
         // Fully set episode data
         [types.SET_EPISODE](state, payload) {
-            state.quoteData[payload.season - 1].episodes[payload.episode - 1] = payload.episodeData
+            const seasonData = findSeason(state, payload.season);
+            const index = seasonData === undefined ? -1 :
+                seasonData.episodes.findIndex((episodeData) => episodeData.episode_id === Number(payload.episode));
+            if (index === -1) {
+                console.log(`Episode missing from layout`)
+                return;
+            }
+
+            seasonData.episodes[index] = payload.episodeData
         },
         // Merge many episodes data simultaneously
         [types.MERGE_EPISODES](state, payload) {
             for (const season of payload) {
                 for (const episode of season) {
-                    if (episode === null) {
-                        console.log(`Missing Episode`)
+                    // Older data leaves nulls in place of missing episodes
+                    if (episode === null)
+                        continue;
+
+                    const episodeData = findEpisode(state, episode.seasonNumber, episode.episodeNumber);
+                    if (episodeData === undefined) {
+                        console.log(`Episode missing from layout`)
                         continue;
                     }
 
-                    const s = episode.seasonNumber - 1;
-                    const e = episode.episodeNumber - 1;
-                    state.quoteData[s].episodes[e] = Object.assign(state.quoteData[s].episodes[e], episode);
+                    Object.assign(episodeData, episode);
 
                     // If scenes are included for some reason, mark as a fully loaded episode
                     if (episode.scenes !== undefined)
-                        state.quoteData[s].episodes[e].loaded = true;
+                        episodeData.loaded = true;
                 }
             }
         },
         // 'Merge' episode data, overwriting existing attributes as needed
         [types.MERGE_EPISODE](state, payload) {
-            const s = payload.season - 1;
-            const e = payload.episode - 1;
-            state.quoteData[s].episodes[e] = Object.assign(state.quoteData[s].episodes[e], payload.episodeData);
+            const episodeData = findEpisode(state, payload.season, payload.episode);
+            Object.assign(episodeData, payload.episodeData);
 
             // If the episodeData has scenes, it means that this is a full episode data merge - mark it as 'loaded'
             if (payload.episodeData.scenes !== undefined)
-                state.quoteData[s].episodes[e].loaded = true;
+                episodeData.loaded = true;
         },
         [types.SET_PRELOADED](state, payload) {
             state.preloaded[payload.type] = payload.status;
@@ -72,6 +111,23 @@ export default new Vuex.Store({
         },
     },
     actions: {
+        // Fetch the layout of seasons & episodes, which everything else is keyed by
+        [types.LOAD_LAYOUT]({commit}) {
+            return loadAssets("/json")
+                .then(() => axios.get(assetUrl("/json", "layout.json")))
+                .then((res) => res.data)
+                .catch((error) => {
+                    if (error.response === undefined || error.response.status !== 404)
+                        throw error;
+                    // Data built before layouts were written only has episodes.json, so derive the layout from it
+                    return axios.get(assetUrl("/json", "episodes.json")).then((res) => layoutFromEpisodes(res.data));
+                })
+                .then((layout) => commit(types.SET_LAYOUT, layout))
+                .catch((error) => {
+                    // eslint-disable-next-line no-console
+                    console.error(error);
+                })
+        },
         // Perform async API call to fetch specific Episode data
         [types.FETCH_EPISODE](context, payload) {
             return new Promise((resolve, reject) => {
@@ -81,14 +137,15 @@ export default new Vuex.Store({
                     return
                 }
 
-                const path = `/json/${payload.season.toString().padStart(2, "0")}/${payload.episode.toString().padStart(2, "0")}.json`;
-                axios.get(path)
+                const name = `${payload.season.toString().padStart(2, "0")}/${payload.episode.toString().padStart(2, "0")}.${columnar ? "bin" : "json"}`;
+                loadAssets("/json")
+                    .then(() => axios.get(assetUrl("/json", name), columnar ? {responseType: "arraybuffer"} : {}))
                     .then((res) => {
                         // Push episode data
                         context.commit(types.MERGE_EPISODE, {
                             season: payload.season,
                             episode: payload.episode,
-                            episodeData: res.data
+                            episodeData: columnar ? decodeEpisode(res.data) : res.data
                         })
                         resolve()
                     })
@@ -100,9 +157,8 @@ export default new Vuex.Store({
             })
         },
         [types.PRELOAD_EPISODES]({commit}) {
-            const path = `/json/episodes.json`;
-
-            axios.get(path)
+            loadAssets("/json")
+                .then(() => axios.get(assetUrl("/json", "episodes.json")))
                 .then((res) => {
                     commit(types.MERGE_EPISODES, res.data)
                     commit(types.SET_PRELOADED, {type: 'episodes', status: true});
@@ -116,10 +172,10 @@ export default new Vuex.Store({
             if (getters.checkPreloaded('characters'))
                 return
 
-            const path = `/json/characters.json`;
             let res = null;
             try {
-                res = await axios.get(path)
+                await loadAssets("/json")
+                res = await axios.get(assetUrl("/json", "characters.json"))
             } catch (error) {
                 console.error(error);
                 throw error
@@ -136,23 +192,30 @@ export default new Vuex.Store({
         },
         // Check whether a episode has been fetched yet
         isFetched: (state) => (season, episode) => {
-            const ep = state.quoteData[season - 1].episodes[episode - 1];
-            return ep.loaded;
+            const ep = findEpisode(state, season, episode);
+            return ep !== undefined && ep.loaded;
+        },
+        // Get a season & its episodes, if it exists
+        getSeason: (state) => (season) => {
+            return findSeason(state, season);
         },
         // Get the number of episodes present for a given season
         getEpisodeCount: (state) => (season) => {
-            return state.episodeCount[season - 1];
+            const seasonData = findSeason(state, season);
+            return seasonData === undefined ? 0 : seasonData.episodes.length;
         },
         // return Episode data if present
         getEpisode: (state, getters) => (season, episode) => {
             if (getters.isFetched(season, episode)) {
-                return state.quoteData[season - 1].episodes[episode - 1];
+                return findEpisode(state, season, episode);
             } else
                 return null
         },
-        // return true if a specific episode is valid
-        isValidEpisode: (state, getters) => (season, episode = 1) => {
-            return season >= 1 && season <= 9 && episode >= 1 && episode <= getters.getEpisodeCount(season)
+        // return true if a specific season (or episode of it) is valid
+        isValidEpisode: (state) => (season, episode) => {
+            if (episode === undefined)
+                return findSeason(state, season) !== undefined;
+            return findEpisode(state, season, episode) !== undefined;
         },
         getCharacter: (state) => (character_id) => {
             return state.characters[character_id];
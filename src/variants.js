@@ -0,0 +1,48 @@
+// Builds srcset attributes from the variants.json written by `build media`, which lists the responsive WebP & AVIF
+// variants of every episode still and character image. Without it, images are served as their full size JPEGs.
+import axios from "axios";
+import {assetUrl} from "@/assets";
+
+// A single black pixel, decoded only by browsers supporting AVIF
+const AVIF_PROBE = "data:image/avif;base64,AAAAIGZ0eXBhdmlmAAAAAGF2aWZtaWYxbWlhZk1BMUIAAADrbWV0YQAAAAAAAAAhaGRscgAAAAAAAAAAcGljdAAAAAAAAAAAAAAAAAAAAAAOcGl0bQAAAAAAAQAAAB5pbG9jAAAAAEQAAAEAAQAAAAEAAAETAAAAIAAAAChpaW5mAAAAAAABAAAAGmluZmUCAAAAAAEAAGF2MDFDb2xvcgAAAABqaXBycAAAAEtpcGNvAAAAFGlzcGUAAAAAAAAAAQAAAAEAAAAQcGl4aQAAAAADCAgIAAAADGF2MUOBAAwAAAAAE2NvbHJuY2x4AAEADQAGgAAAABdpcG1hAAAAAAAAAAEAAQQBAoMEAAAAKG1kYXQSAAoIGAAGiAhoNCAyEh7Hh4VZ3///4sAAAJA1jjx+rQ==";
+
+// The width of the image columns (cols="5" md="4" xl="3") on the episode & character lists
+export const IMAGE_SIZES = "(min-width: 1200px) 25vw, (min-width: 768px) 33vw, 42vw";
+
+let images = {};
+let preferred = ["image/webp"];
+
+function supportsAvif() {
+    return new Promise((resolve) => {
+        const image = new Image();
+        image.onload = () => resolve(image.width === 1);
+        image.onerror = () => resolve(false);
+        image.src = AVIF_PROBE;
+    });
+}
+
+// Load the variants of a directory's images & find which format to use, once before rendering.
+export function loadVariants(root) {
+    return Promise.all([
+        axios.get(`${root}/variants.json`).then((res) => res.data.images).catch(() => ({})),
+        supportsAvif()
+    ]).then(([loaded, avif]) => {
+        images = loaded;
+        if (avif)
+            preferred = ["image/avif", "image/webp"];
+    });
+}
+
+// The srcset of an image (e.g. `01/02` & `full`) in the best supported format, or undefined if it has no variants.
+export function variantSrcset(root, directory, name) {
+    const variants = images[directory] !== undefined ? images[directory][name] : undefined;
+    if (variants === undefined)
+        return undefined;
+
+    for (const type of preferred) {
+        const sources = variants.filter((variant) => variant.type === type);
+        if (sources.length > 0)
+            return sources.map((variant) => `${assetUrl(root, variant.url)} ${variant.width}w`).join(", ");
+    }
+    return undefined;
+}